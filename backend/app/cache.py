@@ -0,0 +1,207 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query string so trivially different inputs share a cache key."""
+    text = unicodedata.normalize("NFKC", query)
+    return " ".join(text.split()).lower()
+
+
+class SQLiteStore:
+    """On-disk key-value store backing a cache across restarts.
+
+    Writes are queued and applied by a background thread in batches, one
+    commit per batch, so callers on the event loop never wait for a disk
+    flush. The database is in WAL mode, so lookups on their own connection
+    aren't blocked by a write in progress either.
+    """
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = self._connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        self._conn.commit()
+        self._writer = self._connect(path)
+        self._rows = self._writer.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        self._pending: queue.Queue[tuple[Any, ...] | None] = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, name="cache-store", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        """Return the stored value and its expiry time, or None if absent."""
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires_at: float, max_rows: int) -> None:
+        """Queue a value to be stored, keeping the ``max_rows`` entries that expire last."""
+        self._pending.put(("set", key, value, expires_at, max_rows))
+
+    def delete(self, key: str) -> None:
+        self._pending.put(("delete", key))
+
+    def flush(self) -> None:
+        """Wait until all queued writes are applied."""
+        self._pending.join()
+
+    def close(self) -> None:
+        self._pending.put(None)
+        self._thread.join()
+        self._writer.close()
+        self._conn.close()
+
+    def _write_loop(self) -> None:
+        while True:
+            ops = [self._pending.get()]
+            while len(ops) < 256:
+                try:
+                    ops.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply([op for op in ops if op is not None])
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to persist cache entries: {e}")
+            finally:
+                for _ in ops:
+                    self._pending.task_done()
+            if None in ops:
+                return
+
+    def _apply(self, ops: list[tuple[Any, ...]]) -> None:
+        if not ops:
+            return
+        max_rows = 0
+        for op in ops:
+            if op[0] == "delete":
+                self._rows -= self._writer.execute(
+                    "DELETE FROM cache WHERE key = ?", (op[1],)
+                ).rowcount
+                continue
+            _, key, value, expires_at, max_rows = op
+            exists = self._writer.execute(
+                "SELECT 1 FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._writer.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at),
+            )
+            self._rows += exists is None
+        # Evict only once the table has grown past the bound
+        if max_rows and self._rows > max_rows:
+            self._writer.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY expires_at LIMIT ?)",
+                (self._rows - max_rows,),
+            )
+            self._rows = max_rows
+        self._writer.commit()
+
+
+class LRUCache:
+    """Bounded in-memory LRU cache with per-entry TTL and hit/miss counters.
+
+    If ``path`` is given, entries are also written to a SQLite file in the
+    background and looked up there on a memory miss, so the cache survives restarts.
+    Values must be JSON-serializable when a disk store is used.
+    """
+
+    def __init__(
+        self, maxsize: int, ttl_seconds: float, path: str | None = None
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._store = SQLiteStore(path) if path else None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any | None:
+        """Return the cached value for ``key``, or None on a miss or expiry."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None and self._store is not None:
+            entry = self._store.get(key)
+            # With maxsize <= 0 nothing is kept in memory; serve the stored value as is
+            if entry is not None and self.maxsize > 0:
+                self._remember(key, *entry)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at < now:
+            self.delete(key)
+            self.misses += 1
+            return None
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store ``value`` under ``key``, evicting the least recently used entry if full."""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, value, expires_at)
+        if self._store is not None:
+            self._store.set(key, value, expires_at, self.maxsize)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._store is not None:
+            self._store.delete(key)
+
+    def clear(self) -> None:
+        """Drop all in-memory entries. The disk store is left to expire by TTL."""
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """Return the current size and hit/miss counters."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._store is not None:
+            self._store.close()
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
@@ -4,16 +4,73 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     """Backend API settings."""
 
+    # Search backend: "elasticsearch" or "embedded" (memory-mapped sparse index files)
+    search_backend: str = "elasticsearch"
+    sparse_index_path: str = "data/sparse_index"
+
     # Elasticsearch
     elasticsearch_url: str = "http://localhost:9200"
-    elasticsearch_index: str = "cosense_pages"
+    elasticsearch_index: str = "cosense_pages"  # alias maintained by batch ingestion
+
+    # Retrieval mode: "sparse", "hybrid" (BM25 + sparse fused with RRF) or "bm25"
+    retrieval_mode: str = "sparse"
+    rrf_rank_window_size: int = 50
+    rrf_rank_constant: int = 60
+    # Latency budget for query encoding before falling back to BM25
+    encode_budget_ms: float = 1000.0
+    encoder_cooldown_seconds: float = 10.0
+
+    # Passage retrieval: hits fetched per requested page, passages kept per page
+    passage_candidates_per_page: int = 4
+    max_passages_per_page: int = 3
+    # Queries accepted by one /api/retrieve/batch request
+    retrieve_batch_max_queries: int = 256
+
+    # sparse_vector query-time token pruning (ES pruning_config)
+    es_query_pruning: bool = False
+    es_tokens_freq_ratio_threshold: float = 5.0
+    es_tokens_weight_threshold: float = 0.4
+    es_only_score_pruned_tokens: bool = False
 
     # Ollama
     ollama_base_url: str = "http://localhost:11434"
     ollama_model: str = "gemma3:1b"
+    ollama_keep_alive: str = "30m"  # how long the model stays loaded after a request
+    ollama_warm_up: bool = True  # load the model at startup
+    # Generation concurrency: requests beyond the queue get "reject" (429) or
+    # "retrieval_only" (sources without a generated answer)
+    llm_max_concurrency: int = 2
+    llm_max_queue: int = 8
+    llm_overload_action: str = "reject"
+    # Prompt context packing: token budget for retrieved text, tokenizer used to
+    # count it (HF repo id or tokenizer.json path; empty estimates from characters)
+    context_token_budget: int = 1536
+    llm_tokenizer: str = ""
+    context_dedup_threshold: float = 0.8  # shingle Jaccard above which passages are duplicates
 
     # Encoder API
     encoder_url: str = "http://localhost:8000"
+    splade_model: str = "hotchpotch/japanese-splade-v2"
+    # "binary" asks for token ids + float16 weights, "json" for token-keyed objects
+    encoder_wire_format: str = "binary"
+
+    # Query vector cache (an empty path keeps it in memory only), keyed on the
+    # encoder's query pruning settings, which are re-read at this interval
+    query_vector_cache_size: int = 1024
+    query_vector_cache_ttl_seconds: float = 24 * 60 * 60
+    query_vector_cache_path: str = ""
+    encoder_config_check_seconds: float = 10.0
+
+    # Search response cache, invalidated when the index generation changes
+    response_cache_size: int = 256
+    response_cache_ttl_seconds: float = 60 * 60
+    response_cache_path: str = ""
+    index_generation_check_seconds: float = 10.0
+
+    # Per-request profiling: requests with "X-Profile: 1" are run under pyinstrument
+    profiling_enabled: bool = False
+    profile_dir: str = "data/profiles"
+    profile_interval_ms: float = 1.0
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
@@ -0,0 +1,244 @@
+"""Pack retrieved passages into an LLM prompt under a token budget.
+
+Prompt prefill dominates answer latency for small models on the CPU, so
+instead of pasting every retrieved page, the context is assembled from the
+sentences most likely to matter:
+
+1. Passages are split into sentences (Cosense lines, further split at
+   Japanese sentence ends). Sentences repeated by overlapping passages are
+   kept once, and passages that are near-duplicates of a higher-ranked one
+   are dropped.
+2. Each page gets a share of the budget proportional to its retrieval
+   score, and spends it on its sentences that share the most character
+   bigrams with the query. Budget a page leaves unused goes to the best
+   remaining sentences of any page that overlap the query, so the budget is
+   an upper bound rather than a target.
+3. Selected sentences are emitted in their original order under the page
+   title, numbered by the page's rank in the search results.
+"""
+
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?])")
+_WIDE_CHAR = re.compile(r"[^\x00-\x7f]")
+_MAX_SENTENCE_CHARS = 200
+
+
+class TokenCounter:
+    """Counts tokens with the LLM's tokenizer, or estimates them without one.
+
+    ``settings.llm_tokenizer`` is a Hugging Face repository id or a local
+    ``tokenizer.json`` path, loaded with the optional ``tokenizers``
+    package. Without it, every non-ASCII character counts as one token and
+    ASCII text as one token per four characters, which overestimates for
+    most Japanese text and so stays within the budget.
+    """
+
+    def __init__(self, name: str | None = None) -> None:
+        name = settings.llm_tokenizer if name is None else name
+        self._tokenizer = None
+        if not name:
+            return
+        try:
+            from tokenizers import Tokenizer
+
+            if Path(name).is_file():
+                self._tokenizer = Tokenizer.from_file(name)
+            else:
+                self._tokenizer = Tokenizer.from_pretrained(name)
+            logger.info(f"Loaded tokenizer '{name}' for context packing")
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer '{name}' ({e}), estimating token counts")
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        wide = len(_WIDE_CHAR.findall(text))
+        return wide + (len(text) - wide + 3) // 4
+
+
+@dataclass
+class PackedContext:
+    """Context text for the prompt and what went into it."""
+
+    text: str
+    tokens: int
+    pages: int = 0
+    sentences: int = 0
+    dropped_duplicates: int = 0
+
+
+@dataclass
+class _Sentence:
+    page: int
+    position: tuple[int, int]
+    text: str
+    overlap: float
+    passage_score: float
+    tokens: int = 0
+    selected: bool = False
+
+
+def _normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split()).lower()
+
+
+def _bigrams(text: str) -> set[str]:
+    text = _normalize(text).replace(" ", "")
+    return {text[i : i + 2] for i in range(len(text) - 1)} or ({text} if text else set())
+
+
+def _shingles(text: str) -> set[str]:
+    text = _normalize(text)
+    return {text[i : i + 3] for i in range(max(1, len(text) - 2))}
+
+
+def _split_sentences(text: str) -> list[str]:
+    sentences: list[str] = []
+    for line in text.splitlines():
+        for sentence in _SENTENCE_END.split(line.strip()):
+            while len(sentence) > _MAX_SENTENCE_CHARS:
+                sentences.append(sentence[:_MAX_SENTENCE_CHARS])
+                sentence = sentence[_MAX_SENTENCE_CHARS:]
+            if sentence.strip():
+                sentences.append(sentence)
+    return sentences
+
+
+class ContextPacker:
+    """Selects the query-relevant sentences of retrieved pages within a token budget."""
+
+    def __init__(
+        self,
+        counter: TokenCounter | None = None,
+        budget: int | None = None,
+        dedup_threshold: float | None = None,
+    ) -> None:
+        self.counter = counter or TokenCounter()
+        self.budget = budget or settings.context_token_budget
+        self.dedup_threshold = (
+            settings.context_dedup_threshold if dedup_threshold is None else dedup_threshold
+        )
+
+    def pack(self, query: str, contexts: list[dict[str, Any]]) -> PackedContext:
+        """Build the context text for ``query`` from search results.
+
+        Args:
+            query: The user's question.
+            contexts: Search results in rank order, each with 'title',
+                'score' and either 'passages' or 'content'.
+        """
+        headers = [
+            f"### [{i}] {ctx.get('title', 'Unknown')}" for i, ctx in enumerate(contexts, 1)
+        ]
+        sentences, dropped = self._sentences(query, contexts)
+        for sentence in sentences:
+            sentence.tokens = self.counter.count(sentence.text) + 1
+        header_tokens = [self.counter.count(header) + 2 for header in headers]
+
+        remaining = self.budget
+        used_pages: set[int] = set()
+
+        def take(sentence: _Sentence, allowance: int) -> int:
+            cost = sentence.tokens
+            if sentence.page not in used_pages:
+                cost += header_tokens[sentence.page]
+            if cost > allowance or cost > remaining:
+                return 0
+            sentence.selected = True
+            used_pages.add(sentence.page)
+            return cost
+
+        by_priority = sorted(
+            sentences, key=lambda s: (-s.overlap, -s.passage_score, s.page, s.position)
+        )
+
+        # First pass: each page spends its score-proportional share
+        scores = [max(0.0, float(ctx.get("score") or 0.0)) for ctx in contexts]
+        total_score = sum(scores)
+        for page in range(len(contexts)):
+            share = scores[page] / total_score if total_score > 0 else 1 / len(contexts)
+            allowance = int(self.budget * share)
+            for sentence in by_priority:
+                if sentence.page == page and not sentence.selected:
+                    spent = take(sentence, allowance)
+                    allowance -= spent
+                    remaining -= spent
+
+        # Second pass: leftover budget goes to the best remaining sentences that
+        # mention the query at all; the rest would only lengthen the prefill
+        for sentence in by_priority:
+            if not sentence.selected and sentence.overlap > 0:
+                remaining -= take(sentence, remaining)
+
+        parts: list[str] = []
+        selected = [s for s in sentences if s.selected]
+        for page in sorted(used_pages):
+            lines = [s.text for s in sorted(selected, key=lambda s: s.position) if s.page == page]
+            parts.append(headers[page] + "\n" + "\n".join(lines))
+        text = "\n\n".join(parts)
+        return PackedContext(
+            text=text,
+            tokens=self.counter.count(text),
+            pages=len(used_pages),
+            sentences=len(selected),
+            dropped_duplicates=dropped,
+        )
+
+    def _sentences(
+        self, query: str, contexts: list[dict[str, Any]]
+    ) -> tuple[list[_Sentence], int]:
+        """Split passages into sentences, dropping duplicates and near-duplicate passages."""
+        query_bigrams = _bigrams(query)
+        kept_shingles: list[set[str]] = []
+        seen: set[str] = set()
+        sentences: list[_Sentence] = []
+        dropped = 0
+
+        for page, ctx in enumerate(contexts):
+            passages = ctx.get("passages") or [
+                {"text": ctx.get("content", ""), "score": ctx.get("score", 0.0), "chunk_index": 0}
+            ]
+            for passage in passages:
+                shingles = _shingles(passage["text"])
+                if any(
+                    len(shingles & other) / len(shingles | other) >= self.dedup_threshold
+                    for other in kept_shingles
+                ):
+                    dropped += 1
+                    continue
+                kept_shingles.append(shingles)
+
+                for line, text in enumerate(_split_sentences(passage["text"])):
+                    key = _normalize(text)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    overlap = (
+                        len(_bigrams(text) & query_bigrams) / len(query_bigrams)
+                        if query_bigrams
+                        else 0.0
+                    )
+                    sentences.append(
+                        _Sentence(
+                            page=page,
+                            position=(passage.get("chunk_index") or 0, line),
+                            text=text.strip(),
+                            overlap=overlap,
+                            passage_score=float(passage.get("score") or 0.0),
+                        )
+                    )
+        return sentences, dropped
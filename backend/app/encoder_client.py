@@ -1,27 +1,139 @@
+import asyncio
 import logging
+import time
+from typing import Any
 
 import httpx
 
+from app import wire
+from app.cache import LRUCache, normalize_query
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 
 class EncoderClient:
-    """Client for the Sparse Encoder API service."""
+    """Async client for the Sparse Encoder API service.
 
-    def __init__(self, base_url: str | None = None) -> None:
+    Query vectors are cached by normalized text, encoder model and the
+    encoder's query pruning settings, so repeated queries skip the network
+    hop and the SPLADE forward pass, and vectors pruned differently are not
+    served after the encoder's configuration changes.
+
+    With ``settings.encoder_wire_format == "binary"`` vectors are requested
+    in the compact format of ``app.wire``; the encoder falls back to JSON if
+    it doesn't support it, and both are handled.
+    """
+
+    def __init__(self, base_url: str | None = None, cache: LRUCache | None = None) -> None:
         self.base_url = base_url or settings.encoder_url
-        self._client = httpx.Client(base_url=self.base_url, timeout=60.0)
+        self.model = settings.splade_model
+        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=60.0)
+        self.cache = cache or LRUCache(
+            maxsize=settings.query_vector_cache_size,
+            ttl_seconds=settings.query_vector_cache_ttl_seconds,
+            path=settings.query_vector_cache_path or None,
+        )
+        self.binary = settings.encoder_wire_format == "binary"
+        self._vocab: list[str] = []
+        self._vocab_hash = ""
+        self._vocab_lock = asyncio.Lock()
+        self._pruning = ""
+        self._pruning_checked_at = float("-inf")
+
+    async def encode(self, text: str) -> dict[str, float]:
+        """Encode text to a sparse vector via the encoder API, using the cache when possible."""
+        key = self._key(text, await self.pruning())
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
 
-    def encode(self, text: str) -> dict[str, float]:
-        """Encode text to a sparse vector via the encoder API."""
-        response = self._client.post(
+        response = await self._client.post(
             "/api/encode",
-            json={"text": text},
+            json={"text": text, "kind": "query"},
+            headers={"Accept": wire.MEDIA_TYPE} if self.binary else None,
+        )
+        vector = (await self._vectors(response, "vector"))[0]
+        self.cache.set(key, vector)
+        return vector
+
+    async def encode_many(self, texts: list[str]) -> list[dict[str, float]]:
+        """Encode several query texts with a single /api/encode_batch call.
+
+        Cached texts are not sent, and texts that normalize to the same
+        query are encoded once.
+        """
+        pruning = await self.pruning()
+        keys = [self._key(text, pruning) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing: dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if not missing:
+            return vectors
+
+        response = await self._client.post(
+            "/api/encode_batch",
+            json={"texts": list(missing.values()), "kind": "query"},
+            headers={"Accept": wire.MEDIA_TYPE} if self.binary else None,
         )
+        encoded = dict(zip(missing, await self._vectors(response, "vectors")))
+        for key, vector in encoded.items():
+            self.cache.set(key, vector)
+        return [
+            vector if vector is not None else encoded[key] for key, vector in zip(keys, vectors)
+        ]
+
+    async def pruning(self) -> str:
+        """Return the encoder's query pruning settings as reported by its health endpoint.
+
+        The value is refreshed at most every ``settings.encoder_config_check_seconds``;
+        the last known value is kept while the encoder can't be reached.
+        """
+        now = time.monotonic()
+        if now - self._pruning_checked_at < settings.encoder_config_check_seconds:
+            return self._pruning
+
+        try:
+            response = await self._client.get("/api/health")
+            response.raise_for_status()
+            pruning = str(response.json().get("pruning", {}).get("query", ""))
+            if pruning != self._pruning:
+                if self._pruning:
+                    logger.info(f"Encoder query pruning changed to '{pruning}'")
+                self._pruning = pruning
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Failed to read encoder pruning settings: {e}")
+        self._pruning_checked_at = now
+        return self._pruning
+
+    def _key(self, text: str, pruning: str) -> str:
+        return f"{self.model}\0{pruning}\0{normalize_query(text)}"
+
+    async def _vectors(self, response: httpx.Response, key: str) -> list[dict[str, float]]:
+        """Decode the vectors of a binary or JSON (``key``: vector or vectors) response."""
         response.raise_for_status()
-        return response.json()["vector"]
+        if response.headers.get("content-type", "").startswith(wire.MEDIA_TYPE):
+            tokens = await self._vocabulary(response.headers.get(wire.VOCAB_HASH_HEADER, ""))
+            return wire.unpack_vectors(response.content, tokens)
+        data = response.json()[key]
+        return data if key == "vectors" else [data]
+
+    async def _vocabulary(self, vocab_hash: str) -> list[str]:
+        """Return the encoder vocabulary, fetching it again only if its hash changed."""
+        async with self._vocab_lock:
+            if vocab_hash != self._vocab_hash:
+                response = await self._client.get("/api/vocab")
+                response.raise_for_status()
+                data = response.json()
+                self._vocab, self._vocab_hash = data["tokens"], data["hash"]
+                logger.info(f"Loaded encoder vocabulary ({len(self._vocab)} tokens)")
+            return self._vocab
+
+    def cache_stats(self) -> dict[str, Any]:
+        return self.cache.stats()
 
-    def close(self) -> None:
-        self._client.close()
+    async def close(self) -> None:
+        await self._client.aclose()
+        self.cache.close()
@@ -1,51 +1,155 @@
 import logging
+import time
 from typing import Any
 
-from elasticsearch import Elasticsearch
+from elasticsearch import AsyncElasticsearch
 
 from app.config import settings
+from app.passages import group_passages
 
 logger = logging.getLogger(__name__)
 
 
 class ESClient:
-    """Elasticsearch client for searching documents."""
+    """Async Elasticsearch client for searching documents."""
+
+    supports_bm25 = True
 
     def __init__(self, url: str | None = None, index: str | None = None) -> None:
         self.url = url or settings.elasticsearch_url
         self.index = index or settings.elasticsearch_index
-        self._client = Elasticsearch(self.url)
+        self._client = AsyncElasticsearch(self.url)
+        self._generation = ""
+        self._generation_checked_at = 0.0
 
-    def search(
+    async def search(
         self, sparse_vector: dict[str, float], top_k: int = 5
     ) -> list[dict[str, Any]]:
-        """Search documents using sparse vector similarity."""
-        query = {
-            "query": {
-                "sparse_vector": {
-                    "field": "content_vector",
-                    "query_vector": sparse_vector,
-                }
-            },
-            "size": top_k,
-            "_source": ["title", "content", "source_url"],
-        }
+        """Search passages using sparse vector similarity and group them by page.
 
-        response = self._client.search(index=self.index, body=query)
-        hits = response["hits"]["hits"]
+        Returns up to ``top_k`` pages, each carrying its best-matching
+        passages (see ``group_passages``).
+        """
+        return await self._search({"query": self._sparse_query(sparse_vector)}, top_k)
+
+    async def search_bm25(self, text: str, top_k: int = 5) -> list[dict[str, Any]]:
+        """Search passages with BM25 over the kuromoji-analyzed title and content."""
+        return await self._search({"query": self._bm25_query(text)}, top_k)
+
+    async def search_hybrid(
+        self, text: str, sparse_vector: dict[str, float], top_k: int = 5
+    ) -> list[dict[str, Any]]:
+        """Search passages with BM25 and sparse vectors fused by reciprocal rank fusion.
 
+        Both rankings are computed and fused by Elasticsearch in one request.
+        """
+        return await self._search(self._hybrid_body(text, sparse_vector, top_k), top_k)
+
+    async def search_many(
+        self,
+        texts: list[str],
+        sparse_vectors: list[dict[str, float] | None],
+        top_k: int = 5,
+        hybrid: bool = False,
+    ) -> list[list[dict[str, Any]]]:
+        """Run one search per query in a single _msearch request.
+
+        A query whose vector is None is searched with BM25, the others with
+        their sparse vector, fused with BM25 when ``hybrid`` is set. Results
+        are grouped by page as in ``search`` and returned in query order.
+        """
+        searches: list[dict[str, Any]] = []
+        for text, sparse_vector in zip(texts, sparse_vectors):
+            if sparse_vector is None:
+                body = {"query": self._bm25_query(text)}
+            elif hybrid:
+                body = self._hybrid_body(text, sparse_vector, top_k)
+            else:
+                body = {"query": self._sparse_query(sparse_vector)}
+            searches.extend([{}, self._request_body(body, top_k)])
+
+        response = await self._client.msearch(index=self.index, searches=searches)
         results = []
-        for hit in hits:
-            results.append(
-                {
-                    "title": hit["_source"]["title"],
-                    "content": hit["_source"]["content"],
-                    "source_url": hit["_source"]["source_url"],
-                    "score": hit["_score"],
+        for text, item in zip(texts, response["responses"]):
+            if "error" in item:
+                raise RuntimeError(f"Search for '{text}' failed: {item['error']}")
+            results.append(self._group(item, top_k))
+        return results
+
+    async def _search(self, body: dict[str, Any], top_k: int) -> list[dict[str, Any]]:
+        response = await self._client.search(index=self.index, body=self._request_body(body, top_k))
+        return self._group(response, top_k)
+
+    @staticmethod
+    def _request_body(body: dict[str, Any], top_k: int) -> dict[str, Any]:
+        return {
+            **body,
+            "size": top_k * settings.passage_candidates_per_page,
+            "_source": ["title", "content", "source_url", "page_id", "chunk_index"],
+        }
+
+    @staticmethod
+    def _group(response: Any, top_k: int) -> list[dict[str, Any]]:
+        hits = [
+            {**hit["_source"], "score": hit["_score"]} for hit in response["hits"]["hits"]
+        ]
+        return group_passages(hits, top_k, settings.max_passages_per_page)
+
+    @classmethod
+    def _hybrid_body(
+        cls, text: str, sparse_vector: dict[str, float], top_k: int
+    ) -> dict[str, Any]:
+        candidates = top_k * settings.passage_candidates_per_page
+        return {
+            "retriever": {
+                "rrf": {
+                    "retrievers": [
+                        {"standard": {"query": cls._bm25_query(text)}},
+                        {"standard": {"query": cls._sparse_query(sparse_vector)}},
+                    ],
+                    "rank_window_size": max(candidates, settings.rrf_rank_window_size),
+                    "rank_constant": settings.rrf_rank_constant,
                 }
-            )
+            }
+        }
 
-        return results
+    @staticmethod
+    def _sparse_query(sparse_vector: dict[str, float]) -> dict[str, Any]:
+        sparse_query: dict[str, Any] = {
+            "field": "content_vector",
+            "query_vector": sparse_vector,
+        }
+        if settings.es_query_pruning:
+            sparse_query["prune"] = True
+            sparse_query["pruning_config"] = {
+                "tokens_freq_ratio_threshold": settings.es_tokens_freq_ratio_threshold,
+                "tokens_weight_threshold": settings.es_tokens_weight_threshold,
+                "only_score_pruned_tokens": settings.es_only_score_pruned_tokens,
+            }
+        return {"sparse_vector": sparse_query}
+
+    @staticmethod
+    def _bm25_query(text: str) -> dict[str, Any]:
+        return {"multi_match": {"query": text, "fields": ["title^2", "content"]}}
+
+    async def generation(self) -> str:
+        """Return the index generation marker written by the batch ingestion.
+
+        The marker is read from the mapping's _meta and refreshed at most
+        every ``settings.index_generation_check_seconds``.
+        """
+        now = time.monotonic()
+        if now - self._generation_checked_at < settings.index_generation_check_seconds:
+            return self._generation
+
+        try:
+            response = await self._client.indices.get_mapping(index=self.index)
+            mappings = next(iter(response.body.values()), {}).get("mappings", {})
+            self._generation = str(mappings.get("_meta", {}).get("generation", ""))
+        except Exception as e:
+            logger.warning(f"Failed to read index generation: {e}")
+        self._generation_checked_at = now
+        return self._generation
 
-    def close(self) -> None:
-        self._client.close()
+    async def close(self) -> None:
+        await self._client.close()
@@ -1,8 +1,15 @@
+import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
+import httpx
 import ollama
 
+from app import metrics
 from app.config import settings
+from app.context_packer import ContextPacker, PackedContext
 
 logger = logging.getLogger(__name__)
 
@@ -17,18 +24,187 @@ SYSTEM_PROMPT = """あなたは質問応答アシスタントです。
 """
 
 
-def generate_answer(query: str, contexts: list[dict]) -> str:
-    """Generate an answer using Ollama Gemma3 with retrieved contexts.
+class LLMOverloaded(Exception):
+    """Raised when the generation queue is full and the request is shed."""
 
-    Args:
-        query: The user's question.
-        contexts: List of search results, each with 'title', 'content', 'source_url'.
 
-    Returns:
-        The generated answer string.
+class LLMClient:
+    """Async client for generating answers with Ollama.
+
+    At most ``settings.llm_max_concurrency`` generations run at once. Up to
+    ``settings.llm_max_queue`` more wait for a slot, and further requests
+    are rejected with ``LLMOverloaded`` instead of slowing everyone down.
     """
-    context_text = _build_context(contexts)
 
+    def __init__(
+        self,
+        base_url: str | None = None,
+        model: str | None = None,
+        packer: ContextPacker | None = None,
+    ) -> None:
+        self.base_url = base_url or settings.ollama_base_url
+        self.model = model or settings.ollama_model
+        # ollama builds its own httpx client; give it a transport we own so the
+        # connections can be closed without touching the client's internals
+        self._transport = httpx.AsyncHTTPTransport()
+        self._client = ollama.AsyncClient(host=self.base_url, transport=self._transport)
+        self.packer = packer or ContextPacker()
+        self.keep_alive = settings.ollama_keep_alive
+        self.max_concurrency = max(1, settings.llm_max_concurrency)
+        self.max_queue = settings.llm_max_queue
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.shed = 0
+
+    async def warm_up(self) -> None:
+        """Load the model into memory so the first request doesn't pay for it."""
+        try:
+            await self._client.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+            logger.info(f"Model '{self.model}' loaded (keep_alive={self.keep_alive})")
+        except Exception as e:
+            logger.warning(f"Model warm-up failed: {e}")
+
+    def check_capacity(self) -> None:
+        """Raise ``LLMOverloaded`` if a new request would exceed the wait queue."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.shed += 1
+            raise LLMOverloaded(
+                f"{self.active} generations running and {self.waiting} waiting"
+            )
+
+    @asynccontextmanager
+    async def _generation_slot(self, timings: dict[str, float] | None) -> AsyncIterator[None]:
+        """Wait for one of the generation slots, or shed the request if the queue is full."""
+        self.check_capacity()
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        if timings is not None:
+            timings["llm_queue_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "shed": self.shed,
+        }
+
+    def pack_context(self, query: str, contexts: list[dict]) -> PackedContext:
+        """Select the parts of the search results that go into the prompt.
+
+        Args:
+            query: The user's question.
+            contexts: List of search results, each with 'title', 'score' and 'passages'.
+
+        Returns:
+            The packed context and its token count.
+        """
+        context = self.packer.pack(query, contexts)
+        logger.info(
+            f"Packed {context.sentences} sentences from {context.pages}/{len(contexts)} pages "
+            f"into {context.tokens} {'' if self.packer.counter.exact else 'estimated '}tokens "
+            f"(budget {self.packer.budget}, "
+            f"{context.dropped_duplicates} duplicate passages dropped)"
+        )
+        return context
+
+    async def generate_answer(
+        self, query: str, context: PackedContext, timings: dict[str, float] | None = None
+    ) -> str:
+        """Generate an answer using Ollama Gemma3 with the packed context.
+
+        Args:
+            query: The user's question.
+            context: Retrieved context from ``pack_context``.
+            timings: If given, receives the queue, model load, prefill and
+                generation durations (``llm_*_ms``).
+
+        Returns:
+            The generated answer string.
+
+        Raises:
+            LLMOverloaded: If the generation queue is full.
+        """
+        async with self._generation_slot(timings):
+            try:
+                response = await self._client.chat(
+                    model=self.model,
+                    messages=_build_messages(query, context.text),
+                    keep_alive=self.keep_alive,
+                )
+                _record_usage(response, timings)
+                return response["message"]["content"]
+            except Exception as e:
+                logger.error(f"LLM generation failed: {e}")
+                raise
+
+    async def stream_answer(
+        self, query: str, context: PackedContext, timings: dict[str, float] | None = None
+    ) -> AsyncIterator[str]:
+        """Stream an answer token by token as Ollama produces it.
+
+        Args:
+            query: The user's question.
+            context: Retrieved context from ``pack_context``.
+            timings: If given, receives the queue, model load, prefill and
+                generation durations (``llm_*_ms``) once the stream ends.
+
+        Yields:
+            Chunks of the generated answer text.
+
+        Raises:
+            LLMOverloaded: If the generation queue is full.
+        """
+        async with self._generation_slot(timings):
+            try:
+                stream = await self._client.chat(
+                    model=self.model,
+                    messages=_build_messages(query, context.text),
+                    stream=True,
+                    keep_alive=self.keep_alive,
+                )
+                async for chunk in stream:
+                    content = chunk["message"]["content"]
+                    if content:
+                        yield content
+                    if chunk.get("done"):
+                        _record_usage(chunk, timings)
+            except Exception as e:
+                logger.error(f"LLM streaming failed: {e}")
+                raise
+
+    async def close(self) -> None:
+        await self._transport.aclose()
+
+
+def _record_usage(response: Any, timings: dict[str, float] | None) -> None:
+    """Record Ollama's own duration and token counts from a final response."""
+    if timings is not None:
+        for field, stage in (
+            ("load_duration", "llm_load"),
+            ("prompt_eval_duration", "llm_prefill"),
+            ("eval_duration", "llm_generation"),
+        ):
+            if response.get(field) is not None:
+                timings[f"{stage}_ms"] = round(response.get(field) / 1e6, 1)
+    metrics.LLM_TOKENS.labels("prompt").inc(response.get("prompt_eval_count") or 0)
+    metrics.LLM_TOKENS.labels("generated").inc(response.get("eval_count") or 0)
+
+
+def _build_messages(query: str, context_text: str) -> list[dict[str, str]]:
+    """Build the chat messages for a query and its packed context."""
     user_message = f"""## 質問
 {query}
 
@@ -36,30 +212,7 @@ def generate_answer(query: str, contexts: list[dict]) -> str:
 {context_text}
 """
 
-    client = ollama.Client(host=settings.ollama_base_url)
-
-    try:
-        response = client.chat(
-            model=settings.ollama_model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_message},
-            ],
-        )
-        return response["message"]["content"]
-    except Exception as e:
-        logger.error(f"LLM generation failed: {e}")
-        raise
-
-
-def _build_context(contexts: list[dict]) -> str:
-    """Build a formatted context string from search results."""
-    parts: list[str] = []
-    for i, ctx in enumerate(contexts, 1):
-        title = ctx.get("title", "Unknown")
-        content = ctx.get("content", "")
-        # Truncate very long content to fit in context window
-        if len(content) > 2000:
-            content = content[:2000] + "..."
-        parts.append(f"### [{i}] {title}\n{content}")
-    return "\n\n".join(parts)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_message},
+    ]
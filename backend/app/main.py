@@ -1,15 +1,25 @@
+import asyncio
+import json
 import logging
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from app import metrics
+from app.cache import LRUCache, normalize_query
 from app.config import settings
+from app.context_packer import PackedContext
 from app.encoder_client import EncoderClient
 from app.es_client import ESClient
-from app.llm_client import generate_answer
+from app.llm_client import LLMClient, LLMOverloaded
+from app.profiling import ProfilerMiddleware
+from app.retrieval import RetrievalResult, Retriever
+from app.sparse_index import EmbeddedSearchClient
 
 logger = logging.getLogger(__name__)
 
@@ -18,22 +28,43 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
 )
 
-es_client: ESClient | None = None
+es_client: ESClient | EmbeddedSearchClient | None = None
 encoder_client: EncoderClient | None = None
+llm_client: LLMClient | None = None
+response_cache: LRUCache | None = None
+retriever: Retriever | None = None
+
+RETRIEVAL_ONLY_ANSWER = "現在回答の生成が混み合っているため、関連するドキュメントのみを表示しています。"
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Manage application lifecycle."""
-    global es_client, encoder_client
-    es_client = ESClient()
+    global es_client, encoder_client, llm_client, response_cache, retriever
+    es_client = EmbeddedSearchClient() if settings.search_backend == "embedded" else ESClient()
     encoder_client = EncoderClient()
+    retriever = Retriever(encoder_client, es_client)
+    llm_client = LLMClient()
+    metrics.track_llm(lambda: llm_client.active, lambda: llm_client.waiting)
+    response_cache = LRUCache(
+        maxsize=settings.response_cache_size,
+        ttl_seconds=settings.response_cache_ttl_seconds,
+        path=settings.response_cache_path or None,
+    )
+    # Load the model in the background; requests arriving meanwhile just wait for it
+    warm_up = asyncio.create_task(llm_client.warm_up()) if settings.ollama_warm_up else None
     logger.info("Application started")
     yield
+    if warm_up:
+        warm_up.cancel()
     if es_client:
-        es_client.close()
+        await es_client.close()
     if encoder_client:
-        encoder_client.close()
+        await encoder_client.close()
+    if llm_client:
+        await llm_client.close()
+    if response_cache:
+        response_cache.close()
     logger.info("Application shutdown")
 
 
@@ -50,8 +81,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+if settings.profiling_enabled:
+    app.add_middleware(ProfilerMiddleware)
+
 
 # --- Request / Response Models ---
 
@@ -71,6 +106,41 @@ class SearchResponse(BaseModel):
     answer: str
     sources: list[SourceDocument]
     query: str
+    retrieval: str = "sparse"
+    context_tokens: int | None = None  # tokens of retrieved text in the prompt
+    retrieval_only: bool = False  # no answer was generated because the LLM was overloaded
+
+
+class RetrieveRequest(BaseModel):
+    query: str
+    top_k: int = 5
+    snippets: bool = False  # include each page's best passages
+
+
+class RetrieveBatchRequest(BaseModel):
+    queries: list[str]
+    top_k: int = 5
+    snippets: bool = False
+
+
+class Snippet(BaseModel):
+    text: str
+    score: float
+    chunk_index: int
+
+
+class RetrievedDocument(SourceDocument):
+    snippets: list[Snippet] | None = None
+
+
+class RetrieveResponse(BaseModel):
+    query: str
+    hits: list[RetrievedDocument]
+    retrieval: str
+
+
+class RetrieveBatchResponse(BaseModel):
+    results: list[RetrieveResponse]  # in the order of the queries
 
 
 # --- Endpoints ---
@@ -81,54 +151,407 @@ async def health_check() -> dict:
     """Health check endpoint."""
     return {
         "status": "ok",
+        "search_backend": settings.search_backend,
         "elasticsearch_url": settings.elasticsearch_url,
         "ollama_model": settings.ollama_model,
         "encoder_url": settings.encoder_url,
+        "query_vector_cache": encoder_client.cache_stats() if encoder_client else None,
+        "response_cache": response_cache.stats() if response_cache else None,
+        "retrieval": retriever.stats() if retriever else None,
+        "llm": llm_client.stats() if llm_client else None,
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Prometheus metrics."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+async def _response_cache_key(request: SearchRequest) -> str:
+    """Build the response cache key.
+
+    It covers the current index generation and the retrieval and context
+    packing settings, so answers built from other contexts are not served.
+    """
+    generation = await es_client.generation() if es_client else ""
+    retrieval = await retriever.settings_key() if retriever else []
+    return json.dumps(
+        [
+            normalize_query(request.query),
+            request.top_k,
+            settings.ollama_model,
+            settings.context_token_budget,
+            settings.context_dedup_threshold,
+            settings.llm_tokenizer,
+            retrieval,
+            generation,
+        ],
+        ensure_ascii=False,
+    )
+
+
 @app.post("/api/search", response_model=SearchResponse)
-async def search(request: SearchRequest) -> SearchResponse:
-    """Search for relevant documents and generate an answer."""
-    if not es_client or not encoder_client:
+async def search(request: SearchRequest, response: Response) -> SearchResponse:
+    """Search for relevant documents and generate an answer.
+
+    Stage durations are returned in the ``Server-Timing`` header.
+    """
+    if not retriever or not es_client or not llm_client:
         raise HTTPException(status_code=503, detail="Service not initialized")
 
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
+    outcome = "error"
     try:
-        # 1. Encode query to sparse vector via encoder API
-        logger.info(f"Encoding query: {request.query}")
-        query_vector = encoder_client.encode(request.query)
-
-        # 2. Search Elasticsearch
-        logger.info(f"Searching with top_k={request.top_k}")
-        results = es_client.search(query_vector, top_k=request.top_k)
-
-        if not results:
-            return SearchResponse(
-                answer="関連するドキュメントが見つかりませんでした。",
-                sources=[],
-                query=request.query,
+        cache_key = await _response_cache_key(request)
+        cached = response_cache.get(cache_key) if response_cache else None
+        timings["cache_ms"] = _ms_since(start)
+        if cached is not None:
+            logger.info(f"Response cache hit: {request.query}")
+            outcome = "cached"
+            return SearchResponse.model_validate(cached)
+
+        _shed_early()
+        result = await _search(request, timings)
+        outcome = "retrieval_only" if result.retrieval_only else "ok"
+        # Degraded BM25-only and retrieval-only answers are not cached
+        if (
+            response_cache
+            and result.retrieval != "bm25_fallback"
+            and not result.retrieval_only
+        ):
+            response_cache.set(cache_key, result.model_dump())
+        return result
+
+    except HTTPException as e:
+        outcome = "shed" if e.status_code == 429 else outcome
+        raise
+    except LLMOverloaded as e:
+        outcome = "shed"
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Search failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        timings["total_ms"] = _ms_since(start)
+        metrics.observe(timings)
+        metrics.REQUESTS.labels("search", outcome).inc()
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+
+
+async def _search(request: SearchRequest, timings: dict[str, float]) -> SearchResponse:
+    """Run encode, retrieval and answer generation for a search request."""
+    assert retriever and llm_client
+
+    # 1-2. Encode query and search Elasticsearch
+    logger.info(f"Retrieving with top_k={request.top_k}: {request.query}")
+    retrieval = await retriever.retrieve(request.query, request.top_k)
+    results = retrieval.results
+    timings.update(retrieval.timings)
+    metrics.RETRIEVALS.labels(retrieval.mode).inc()
+
+    if not results:
+        return SearchResponse(
+            answer="関連するドキュメントが見つかりませんでした。",
+            sources=[],
+            query=request.query,
+            retrieval=retrieval.mode,
+        )
+
+    # 3. Generate answer with LLM
+    logger.info(f"Generating answer from {len(results)} results")
+    context = _pack_context(request.query, results, timings)
+    retrieval_only = False
+    try:
+        answer = await llm_client.generate_answer(request.query, context, timings)
+    except LLMOverloaded:
+        if settings.llm_overload_action != "retrieval_only":
+            raise
+        answer, retrieval_only = RETRIEVAL_ONLY_ANSWER, True
+
+    # 4. Build response
+    sources = [
+        SourceDocument(
+            title=r["title"],
+            source_url=r["source_url"],
+            score=r["score"],
+        )
+        for r in results
+    ]
+
+    return SearchResponse(
+        answer=answer,
+        sources=sources,
+        query=request.query,
+        retrieval=retrieval.mode,
+        context_tokens=context.tokens,
+        retrieval_only=retrieval_only,
+    )
+
+
+def _ms_since(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _pack_context(
+    query: str, results: list[dict[str, Any]], timings: dict[str, float]
+) -> PackedContext:
+    assert llm_client
+    start = time.perf_counter()
+    context = llm_client.pack_context(query, results)
+    timings["context_ms"] = _ms_since(start)
+    metrics.CONTEXT_TOKENS.observe(context.tokens)
+    return context
+
+
+def _overloaded(e: LLMOverloaded) -> HTTPException:
+    logger.warning(f"Shedding request: {e}")
+    return HTTPException(
+        status_code=429, detail="Too many concurrent requests", headers={"Retry-After": "1"}
+    )
+
+
+def _shed_early() -> None:
+    """Reject before doing any retrieval work when the queue is full and rejection is configured."""
+    if llm_client and settings.llm_overload_action == "reject":
+        try:
+            llm_client.check_capacity()
+        except LLMOverloaded as e:
+            raise _overloaded(e)
+
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format a Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/search/stream")
+async def search_stream(request: SearchRequest) -> StreamingResponse:
+    """Search for relevant documents and stream the answer as Server-Sent Events.
+
+    Events are emitted in this order:
+        sources: the retrieved SourceDocument list, sent as soon as search returns.
+        token:   chunks of the generated answer as the LLM produces them.
+        done:    timing information in milliseconds and the prompt's context tokens.
+    An ``error`` event is sent instead if any step fails. Responses cached by
+    /api/search are replayed as a single token event, even under load: the
+    cache is checked before streaming starts. When the LLM is overloaded an
+    uncached request is rejected with 429 before streaming starts, or
+    answered from retrieval only, depending on ``settings.llm_overload_action``.
+
+    Headers are sent before any stage runs, so stage durations are reported
+    in the ``done`` event instead of a ``Server-Timing`` header.
+    """
+    if not retriever or not es_client or not llm_client:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
+
+    def elapsed_ms() -> float:
+        return _ms_since(start)
+
+    # Like /api/search, serve cached answers before shedding load
+    cache_key = await _response_cache_key(request)
+    cached = response_cache.get(cache_key) if response_cache else None
+    timings["cache_ms"] = elapsed_ms()
+    if cached is None:
+        try:
+            _shed_early()
+        except HTTPException:
+            metrics.REQUESTS.labels("search_stream", "shed").inc()
+            raise
+
+    async def event_stream() -> AsyncGenerator[str, None]:
+        outcome = "error"
+
+        try:
+            if cached is not None:
+                logger.info(f"Response cache hit: {request.query}")
+                outcome = "cached"
+                yield _sse_event("sources", cached["sources"])
+                yield _sse_event("token", {"text": cached["answer"]})
+                timings["total_ms"] = elapsed_ms()
+                yield _sse_event(
+                    "done", {"query": request.query, "timings": timings, "cached": True}
+                )
+                return
+
+            logger.info(f"Retrieving with top_k={request.top_k}: {request.query}")
+            retrieval = await retriever.retrieve(request.query, request.top_k)
+            results = retrieval.results
+            timings.update(retrieval.timings)
+            metrics.RETRIEVALS.labels(retrieval.mode).inc()
+
+            sources = [
+                SourceDocument(
+                    title=r["title"],
+                    source_url=r["source_url"],
+                    score=r["score"],
+                ).model_dump()
+                for r in results
+            ]
+            yield _sse_event("sources", sources)
+
+            answer_parts: list[str] = []
+            context_tokens = None
+            retrieval_only = False
+            if not results:
+                answer_parts.append("関連するドキュメントが見つかりませんでした。")
+                yield _sse_event("token", {"text": answer_parts[0]})
+            else:
+                logger.info(f"Streaming answer from {len(results)} results")
+                context = _pack_context(request.query, results, timings)
+                context_tokens = context.tokens
+                try:
+                    async for text in llm_client.stream_answer(
+                        request.query, context, timings
+                    ):
+                        if "first_token_ms" not in timings:
+                            timings["first_token_ms"] = elapsed_ms()
+                        answer_parts.append(text)
+                        yield _sse_event("token", {"text": text})
+                except LLMOverloaded as e:
+                    if settings.llm_overload_action != "retrieval_only":
+                        raise
+                    logger.warning(f"Answering from retrieval only: {e}")
+                    retrieval_only = True
+                    yield _sse_event("token", {"text": RETRIEVAL_ONLY_ANSWER})
+
+            if response_cache and retrieval.mode != "bm25_fallback" and not retrieval_only:
+                response_cache.set(
+                    cache_key,
+                    SearchResponse(
+                        answer="".join(answer_parts),
+                        sources=sources,
+                        query=request.query,
+                        retrieval=retrieval.mode,
+                        context_tokens=context_tokens,
+                    ).model_dump(),
+                )
+
+            outcome = "retrieval_only" if retrieval_only else "ok"
+            timings["total_ms"] = elapsed_ms()
+            yield _sse_event(
+                "done",
+                {
+                    "query": request.query,
+                    "timings": timings,
+                    "retrieval": retrieval.mode,
+                    "context_tokens": context_tokens,
+                    "retrieval_only": retrieval_only,
+                },
             )
 
-        # 3. Generate answer with LLM
-        logger.info(f"Generating answer from {len(results)} results")
-        answer = generate_answer(request.query, results)
+        except LLMOverloaded as e:
+            outcome = "shed"
+            logger.warning(f"Shedding request: {e}")
+            yield _sse_event("error", {"detail": "Too many concurrent requests", "status": 429})
+        except Exception as e:
+            logger.error(f"Streaming search failed: {e}")
+            yield _sse_event("error", {"detail": str(e)})
+        finally:
+            timings.setdefault("total_ms", elapsed_ms())
+            metrics.observe(timings)
+            metrics.REQUESTS.labels("search_stream", outcome).inc()
 
-        # 4. Build response
-        sources = [
-            SourceDocument(
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _retrieve_response(query: str, retrieval: RetrievalResult, snippets: bool) -> RetrieveResponse:
+    return RetrieveResponse(
+        query=query,
+        hits=[
+            RetrievedDocument(
                 title=r["title"],
                 source_url=r["source_url"],
                 score=r["score"],
+                snippets=[Snippet(**passage) for passage in r["passages"]] if snippets else None,
             )
-            for r in results
-        ]
+            for r in retrieval.results
+        ],
+        retrieval=retrieval.mode,
+    )
 
-        return SearchResponse(
-            answer=answer,
-            sources=sources,
-            query=request.query,
+
+@app.post("/api/retrieve", response_model=RetrieveResponse)
+async def retrieve(request: RetrieveRequest, response: Response) -> RetrieveResponse:
+    """Return ranked documents for a query without generating an answer.
+
+    Retrieval works as in /api/search, including the BM25 fallback when
+    the encoder is slow. Stage durations are returned in the
+    ``Server-Timing`` header.
+    """
+    if not retriever:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
+    outcome = "error"
+    try:
+        retrieval = await retriever.retrieve(request.query, request.top_k)
+        timings.update(retrieval.timings)
+        metrics.RETRIEVALS.labels(retrieval.mode).inc()
+        outcome = "ok"
+        return _retrieve_response(request.query, retrieval, request.snippets)
+    except Exception as e:
+        logger.error(f"Retrieval failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        timings["total_ms"] = _ms_since(start)
+        metrics.observe(timings)
+        metrics.REQUESTS.labels("retrieve", outcome).inc()
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+
+
+@app.post("/api/retrieve/batch", response_model=RetrieveBatchResponse)
+async def retrieve_batch(
+    request: RetrieveBatchRequest, response: Response
+) -> RetrieveBatchResponse:
+    """Return ranked documents for many queries, e.g. for relevance evaluation.
+
+    All queries are encoded in one encoder call and searched in one
+    Elasticsearch _msearch request. There is no BM25 fallback: the batch
+    waits for the encoder so every query is retrieved in the configured
+    mode. At most ``settings.retrieve_batch_max_queries`` queries are
+    accepted per request.
+    """
+    if not retriever:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    if len(request.queries) > settings.retrieve_batch_max_queries:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.retrieve_batch_max_queries} queries per request",
         )
+    if not request.queries:
+        return RetrieveBatchResponse(results=[])
 
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
+    outcome = "error"
+    try:
+        logger.info(f"Retrieving {len(request.queries)} queries with top_k={request.top_k}")
+        retrievals = await retriever.retrieve_many(request.queries, request.top_k)
+        timings.update(retrievals[0].timings)
+        metrics.RETRIEVALS.labels(retriever.mode).inc(len(retrievals))
+        outcome = "ok"
+        return RetrieveBatchResponse(
+            results=[
+                _retrieve_response(query, retrieval, request.snippets)
+                for query, retrieval in zip(request.queries, retrievals)
+            ]
+        )
     except Exception as e:
-        logger.error(f"Search failed: {e}")
+        logger.error(f"Batch retrieval failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Batch durations are not per-query stage latencies, so they only go in the header
+        timings["total_ms"] = _ms_since(start)
+        metrics.REQUESTS.labels("retrieve_batch", outcome).inc()
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
@@ -0,0 +1,77 @@
+"""Prometheus metrics for the search API.
+
+Request handlers collect per-stage durations in a ``timings`` dict of
+``<stage>_ms`` values. ``observe`` feeds them to the stage histogram and
+``server_timing`` renders them as a ``Server-Timing`` header.
+"""
+
+from typing import Callable
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Stage durations, in the order they happen
+STAGES = (
+    "cache",
+    "encode",
+    "retrieve",
+    "context",
+    "llm_queue",
+    "llm_load",
+    "llm_prefill",
+    "llm_generation",
+    "first_token",  # streaming only: time from request to first answer token
+    "total",
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each stage of a search request",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "rag_requests_total", "Search requests by endpoint and outcome", ["endpoint", "outcome"]
+)
+RETRIEVALS = Counter("rag_retrievals_total", "Retrievals by the mode actually used", ["mode"])
+CONTEXT_TOKENS = Histogram(
+    "rag_context_tokens",
+    "Tokens of retrieved text packed into the prompt",
+    buckets=(64, 128, 256, 512, 1024, 1536, 2048, 4096, 8192),
+)
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Tokens processed by the LLM", ["phase"])
+LLM_ACTIVE = Gauge("rag_llm_active_generations", "Generations currently running")
+LLM_WAITING = Gauge("rag_llm_waiting_generations", "Generations waiting for a slot")
+
+
+def observe(timings: dict[str, float]) -> None:
+    """Record the stage durations in ``timings`` (``<stage>_ms`` keys)."""
+    for stage in STAGES:
+        ms = timings.get(f"{stage}_ms")
+        if ms is not None:
+            STAGE_SECONDS.labels(stage).observe(ms / 1000)
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    """Render stage durations as a ``Server-Timing`` header value."""
+    return ", ".join(
+        f"{stage};dur={timings[f'{stage}_ms']}" for stage in STAGES if f"{stage}_ms" in timings
+    )
+
+
+def track_llm(active: Callable[[], int], waiting: Callable[[], int]) -> None:
+    """Report the LLM client's slot usage through the generation gauges."""
+    LLM_ACTIVE.set_function(active)
+    LLM_WAITING.set_function(waiting)
+
+
+def render() -> tuple[bytes, str]:
+    """Return the exposition-format metrics and their content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
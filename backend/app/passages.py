@@ -0,0 +1,45 @@
+from typing import Any
+
+
+def group_passages(
+    hits: list[dict[str, Any]], top_k: int, max_passages: int
+) -> list[dict[str, Any]]:
+    """Group passage hits by page, keeping pages in order of their best passage.
+
+    Each hit needs 'title', 'content', 'source_url' and 'score', and may have
+    'page_id' and 'chunk_index'. Hits without a page_id (page-level documents)
+    are grouped by source URL.
+
+    Returns:
+        Up to ``top_k`` pages, each with 'title', 'source_url', 'score' (the
+        best passage score), 'passages' (up to ``max_passages`` best passages
+        in page order) and 'content' (those passages joined).
+    """
+    pages: dict[str, dict[str, Any]] = {}
+    for hit in sorted(hits, key=lambda h: h["score"], reverse=True):
+        key = hit.get("page_id") or hit["source_url"]
+        page = pages.get(key)
+        if page is None:
+            if len(pages) >= top_k:
+                continue
+            page = pages[key] = {
+                "title": hit["title"],
+                "source_url": hit["source_url"],
+                "score": hit["score"],
+                "passages": [],
+            }
+        if len(page["passages"]) < max_passages:
+            page["passages"].append(
+                {
+                    "text": hit["content"],
+                    "score": hit["score"],
+                    "chunk_index": hit.get("chunk_index") or 0,
+                }
+            )
+
+    results = []
+    for page in pages.values():
+        page["passages"].sort(key=lambda p: p["chunk_index"])
+        page["content"] = "\n...\n".join(p["text"] for p in page["passages"])
+        results.append(page)
+    return results
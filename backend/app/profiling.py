@@ -0,0 +1,67 @@
+"""Opt-in sampling profiler for individual requests.
+
+When ``settings.profiling_enabled`` is set, a request sent with an
+``X-Profile: 1`` header runs under pyinstrument (the optional ``profiling``
+extra). Its HTML report is written to ``settings.profile_dir``, and the
+report path comes back in the ``X-Profile-Path`` response header. Other
+requests are not affected.
+
+This is plain ASGI middleware rather than ``BaseHTTPMiddleware``, so a
+streamed response is profiled until its last chunk is sent.
+"""
+
+import logging
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+
+Scope = dict[str, Any]
+Message = dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+class ProfilerMiddleware:
+    """Profiles requests that ask for it with the ``X-Profile`` header."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.dir = Path(settings.profile_dir)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or dict(scope["headers"]).get(PROFILE_HEADER) not in (
+            b"1",
+            b"true",
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        name = scope["path"].strip("/").replace("/", "_") or "root"
+        path = self.dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9}-{name}.html"
+
+        async def send_with_header(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-path", str(path).encode()),
+                ]
+            await send(message)
+
+        profiler = Profiler(interval=settings.profile_interval_ms / 1000, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            profiler.stop()
+            path.write_text(profiler.output_html(), encoding="utf-8")
+            logger.info(f"Profile of {scope['method']} {scope['path']} written to '{path}'")
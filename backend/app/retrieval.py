@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Literal
+
+import httpx
+
+from app.config import settings
+from app.encoder_client import EncoderClient
+from app.es_client import ESClient
+from app.sparse_index import EmbeddedSearchClient
+
+logger = logging.getLogger(__name__)
+
+RetrievalMode = Literal["sparse", "hybrid", "bm25"]
+
+
+@dataclass
+class RetrievalResult:
+    """Retrieved pages and how they were found."""
+
+    results: list[dict[str, Any]]
+    mode: str
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+class Retriever:
+    """Runs retrieval in the configured mode, falling back to BM25 when the encoder can't keep up.
+
+    The encoder call gets ``settings.encode_budget_ms``. If it times out or
+    fails, the query is answered with BM25 only, and the encoder is skipped
+    for ``settings.encoder_cooldown_seconds`` so an overloaded encoder is not
+    hit by every request while it recovers.
+    """
+
+    def __init__(
+        self,
+        encoder_client: EncoderClient,
+        es_client: ESClient | EmbeddedSearchClient,
+        mode: str | None = None,
+    ) -> None:
+        self.encoder_client = encoder_client
+        self.es_client = es_client
+        self.mode = mode or settings.retrieval_mode
+        if not es_client.supports_bm25 and self.mode != "sparse":
+            logger.warning(
+                f"Retrieval mode '{self.mode}' needs BM25, which {type(es_client).__name__} "
+                "doesn't support; using 'sparse'"
+            )
+            self.mode = "sparse"
+        self._encoder_skip_until = 0.0
+        self.fallbacks = 0
+
+    async def retrieve(self, query: str, top_k: int) -> RetrievalResult:
+        """Retrieve pages for ``query``, recording ``encode_ms`` and ``retrieve_ms`` durations."""
+        timings: dict[str, float] = {}
+        start = time.perf_counter()
+
+        def elapsed_ms() -> float:
+            return round((time.perf_counter() - start) * 1000, 1)
+
+        if self.mode == "bm25":
+            results = await self.es_client.search_bm25(query, top_k=top_k)
+            timings["retrieve_ms"] = elapsed_ms()
+            return RetrievalResult(results, "bm25", timings)
+
+        if self.es_client.supports_bm25:
+            query_vector = await self._encode(query)
+        else:
+            # Without BM25 there is nothing to fall back to, so wait for the encoder
+            query_vector = await self.encoder_client.encode(query)
+        timings["encode_ms"] = elapsed_ms()
+        start = time.perf_counter()
+
+        if query_vector is None:
+            self.fallbacks += 1
+            results = await self.es_client.search_bm25(query, top_k=top_k)
+            mode = "bm25_fallback"
+        elif self.mode == "hybrid":
+            results = await self.es_client.search_hybrid(query, query_vector, top_k=top_k)
+            mode = "hybrid"
+        else:
+            results = await self.es_client.search(query_vector, top_k=top_k)
+            mode = "sparse"
+        timings["retrieve_ms"] = elapsed_ms()
+        return RetrievalResult(results, mode, timings)
+
+    async def retrieve_many(self, queries: list[str], top_k: int) -> list[RetrievalResult]:
+        """Retrieve pages for several queries with one encoder call and one search request.
+
+        Unlike ``retrieve`` there is no latency budget or BM25 fallback: the
+        batch waits for the encoder, so every query is answered in the
+        configured mode. The batch's ``encode_ms`` and ``retrieve_ms`` are
+        shared by all results.
+        """
+        timings: dict[str, float] = {}
+        start = time.perf_counter()
+
+        def elapsed_ms() -> float:
+            return round((time.perf_counter() - start) * 1000, 1)
+
+        vectors: list[dict[str, float] | None] = [None] * len(queries)
+        if self.mode != "bm25":
+            vectors = list(await self.encoder_client.encode_many(queries))
+            timings["encode_ms"] = elapsed_ms()
+            start = time.perf_counter()
+
+        if isinstance(self.es_client, EmbeddedSearchClient):
+            # Always sparse mode (see __init__), so every query has a vector
+            results = await self.es_client.search_many(
+                [vector for vector in vectors if vector is not None], top_k=top_k
+            )
+        else:
+            results = await self.es_client.search_many(
+                queries, vectors, top_k=top_k, hybrid=self.mode == "hybrid"
+            )
+        timings["retrieve_ms"] = elapsed_ms()
+        return [RetrievalResult(pages, self.mode, dict(timings)) for pages in results]
+
+    async def _encode(self, query: str) -> dict[str, float] | None:
+        """Encode the query within the latency budget, or return None to fall back to BM25."""
+        if time.monotonic() < self._encoder_skip_until:
+            return None
+
+        try:
+            return await asyncio.wait_for(
+                self.encoder_client.encode(query), timeout=settings.encode_budget_ms / 1000
+            )
+        except (asyncio.TimeoutError, httpx.HTTPError) as e:
+            logger.warning(
+                f"Encoder unavailable ({type(e).__name__}: {e}), "
+                f"using BM25 for {settings.encoder_cooldown_seconds}s"
+            )
+            self._encoder_skip_until = time.monotonic() + settings.encoder_cooldown_seconds
+            return None
+
+    async def settings_key(self) -> list[Any]:
+        """The settings that decide which passages a query retrieves, for cache keys."""
+        key: list[Any] = [
+            self.mode,
+            settings.passage_candidates_per_page,
+            settings.max_passages_per_page,
+        ]
+        if self.mode != "bm25":
+            key.append(await self.encoder_client.pruning())
+        if self.mode == "hybrid":
+            key += [settings.rrf_rank_window_size, settings.rrf_rank_constant]
+        if isinstance(self.es_client, ESClient) and settings.es_query_pruning:
+            key += [
+                settings.es_tokens_freq_ratio_threshold,
+                settings.es_tokens_weight_threshold,
+                settings.es_only_score_pruned_tokens,
+            ]
+        return key
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "bm25_fallbacks": self.fallbacks,
+            "encoder_skipped": time.monotonic() < self._encoder_skip_until,
+        }
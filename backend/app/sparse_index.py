@@ -0,0 +1,174 @@
+"""Embedded sparse-vector search over the memory-mapped index written by batch ingestion.
+
+See ``batch/app/sparse_index.py`` for the on-disk format. Postings are
+stored in CSR layout with one row per token, so scoring a query only reads
+the rows of its tokens and accumulates them with a single ``np.bincount``.
+Documents stay in the memory-mapped ``docs.jsonl`` and only the hits of a
+query are decoded.
+"""
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from app.config import settings
+from app.passages import group_passages
+
+logger = logging.getLogger(__name__)
+
+CURRENT = "current"
+
+
+class SparseIndex:
+    """Read-only view of one index version, memory-mapped from disk."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with open(path / "vocab.json", encoding="utf-8") as f:
+            self.token_ids: dict[str, int] = {token: i for i, token in enumerate(json.load(f))}
+        self.indptr = np.load(path / "indptr.npy", mmap_mode="r")
+        self.doc_ids = np.load(path / "doc_ids.npy", mmap_mode="r")
+        self.weights = np.load(path / "weights.npy", mmap_mode="r")
+        with open(path / "docs.jsonl", "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if (path / "doc_offsets.npy").exists():
+            self._doc_offsets = np.load(path / "doc_offsets.npy", mmap_mode="r")
+        else:
+            # Versions written before the offsets file: find the line ends
+            # (JSON strings escape newlines)
+            ends = np.flatnonzero(np.frombuffer(self._docs, dtype=np.uint8) == ord("\n"))
+            self._doc_offsets = np.concatenate(([0], ends + 1))
+        with open(path / "meta.json", encoding="utf-8") as f:
+            self.meta: dict[str, Any] = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self._doc_offsets) - 1
+
+    def doc(self, doc_id: int) -> dict[str, Any]:
+        """Decode the stored fields of one document."""
+        return json.loads(self._docs[self._doc_offsets[doc_id] : self._doc_offsets[doc_id + 1]])
+
+    def top_k(self, sparse_vector: dict[str, float], k: int) -> list[tuple[int, float]]:
+        """Return the ``k`` best (document id, score) pairs by dot product."""
+        terms = [
+            (self.token_ids[token], weight)
+            for token, weight in sparse_vector.items()
+            if token in self.token_ids
+        ]
+        if not terms or not len(self):
+            return []
+
+        rows = np.fromiter((t for t, _ in terms), dtype=np.int64, count=len(terms))
+        query_weights = np.fromiter((w for _, w in terms), dtype=np.float32, count=len(terms))
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return []
+
+        # Positions of every posting of the query's tokens, without a Python loop
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        positions = offsets + np.arange(total)
+        scores = np.bincount(
+            self.doc_ids[positions],
+            weights=self.weights[positions] * np.repeat(query_weights, lengths),
+            minlength=len(self),
+        )
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in top]
+
+
+class EmbeddedSearchClient:
+    """In-process alternative to ``ESClient`` backed by the embedded sparse index.
+
+    The index is re-opened when batch ingestion points the ``current``
+    symlink at a new version. The new version is opened in a worker thread
+    while searches keep using the previous one, and replaces it once it is
+    ready. Only sparse retrieval is available, so the ``Retriever`` always
+    runs in sparse mode with this backend.
+    """
+
+    supports_bm25 = False
+
+    def __init__(self, path: str | None = None) -> None:
+        self.root = Path(path or settings.sparse_index_path)
+        self._index: SparseIndex | None = None
+        self._loading: asyncio.Task[SparseIndex] | None = None
+        self._checked_at = 0.0
+
+    async def _current(self) -> SparseIndex:
+        now = time.monotonic()
+        if self._index is not None and (
+            now - self._checked_at < settings.index_generation_check_seconds
+        ):
+            return self._index
+        self._checked_at = now
+        target = (self.root / CURRENT).resolve()
+        if self._index is not None and target == self._index.path:
+            return self._index
+        if self._loading is None:
+            self._loading = asyncio.create_task(self._load(target))
+        if self._index is not None:
+            return self._index
+        return await asyncio.shield(self._loading)
+
+    async def _load(self, target: Path) -> SparseIndex:
+        """Open ``target`` off the event loop and make it the current index."""
+        try:
+            if not target.exists():
+                raise RuntimeError(f"Sparse index not found at '{self.root / CURRENT}'")
+            index = await asyncio.to_thread(SparseIndex, target)
+        except Exception as e:
+            if self._index is None:
+                raise
+            logger.warning(f"Failed to load sparse index '{target}', keeping the previous: {e}")
+            return self._index
+        finally:
+            self._loading = None
+        self._index = index
+        logger.info(f"Loaded sparse index '{target}' ({len(index)} documents)")
+        return index
+
+    async def search(
+        self, sparse_vector: dict[str, float], top_k: int = 5
+    ) -> list[dict[str, Any]]:
+        """Search passages using sparse vector similarity and group them by page."""
+        index = await self._current()
+        hits = [
+            {**index.doc(doc_id), "score": score}
+            for doc_id, score in index.top_k(
+                sparse_vector, top_k * settings.passage_candidates_per_page
+            )
+        ]
+        return group_passages(hits, top_k, settings.max_passages_per_page)
+
+    async def search_many(
+        self, sparse_vectors: list[dict[str, float]], top_k: int = 5
+    ) -> list[list[dict[str, Any]]]:
+        """Search several query vectors, returning each query's pages in order."""
+        return [await self.search(vector, top_k) for vector in sparse_vectors]
+
+    async def generation(self) -> str:
+        """Return the generation marker of the current index version."""
+        try:
+            return str((await self._current()).meta.get("generation", ""))
+        except RuntimeError:
+            return ""
+
+    async def close(self) -> None:
+        if self._loading is not None:
+            self._loading.cancel()
+        self._index = None
@@ -0,0 +1,33 @@
+"""Decoding of the encoder service's binary sparse-vector wire format.
+
+Mirrors ``encoder/app/wire.py``, which documents the layout. Vectors arrive
+as token ids plus float16 weights; the vocabulary the ids index into is
+fetched once from the encoder's ``/api/vocab`` endpoint.
+"""
+
+import numpy as np
+
+MEDIA_TYPE = "application/x-sparse-vectors"
+VOCAB_HASH_HEADER = "X-Vocab-Hash"
+
+
+def unpack_vectors(data: bytes, tokens: list[str]) -> list[dict[str, float]]:
+    """Deserialize the binary format back into vectors keyed by token string."""
+    n = int(np.frombuffer(data, dtype="<u4", count=1)[0])
+    lengths = np.frombuffer(data, dtype="<u4", count=n, offset=4)
+    total = int(lengths.sum())
+    offset = 4 * (1 + n)
+    ids = np.frombuffer(data, dtype="<u4", count=total, offset=offset).tolist()
+    weights = (
+        np.frombuffer(data, dtype="<f2", count=total, offset=offset + 4 * total)
+        .astype(np.float32)
+        .tolist()
+    )
+
+    vectors: list[dict[str, float]] = []
+    start = 0
+    for length in lengths.tolist():
+        end = start + length
+        vectors.append(dict(zip([tokens[i] for i in ids[start:end]], weights[start:end])))
+        start = end
+    return vectors
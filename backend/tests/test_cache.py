@@ -0,0 +1,61 @@
+"""LRU cache with an optional SQLite store behind it."""
+
+import sqlite3
+from pathlib import Path
+
+from app.cache import LRUCache, SQLiteStore
+
+
+def rows(path: Path) -> list[str]:
+    with sqlite3.connect(path) as conn:
+        return [key for (key,) in conn.execute("SELECT key FROM cache ORDER BY expires_at")]
+
+
+def test_entries_survive_a_restart(tmp_path: Path) -> None:
+    path = tmp_path / "cache.sqlite"
+    cache = LRUCache(maxsize=4, ttl_seconds=60, path=str(path))
+    cache.set("a", {"x": 1})
+    cache.close()
+
+    reopened = LRUCache(maxsize=4, ttl_seconds=60, path=str(path))
+    assert reopened.get("a") == {"x": 1}
+    assert reopened.stats()["size"] == 1
+    reopened.close()
+
+
+def test_disk_hit_without_memory_cache(tmp_path: Path) -> None:
+    path = tmp_path / "cache.sqlite"
+    cache = LRUCache(maxsize=4, ttl_seconds=60, path=str(path))
+    cache.set("a", 1)
+    cache.close()
+
+    disk_only = LRUCache(maxsize=0, ttl_seconds=60, path=str(path))
+    assert disk_only.get("a") == 1
+    assert disk_only.get("a") == 1
+    assert disk_only.stats()["size"] == 0
+    disk_only.close()
+
+
+def test_store_evicts_beyond_max_rows(tmp_path: Path) -> None:
+    path = tmp_path / "cache.sqlite"
+    store = SQLiteStore(str(path))
+    for i in range(5):
+        store.set(f"k{i}", i, expires_at=1e12 + i, max_rows=3)
+    store.set("k4", 4, expires_at=1e12 + 4, max_rows=3)  # replacing doesn't grow the table
+    store.flush()
+    assert rows(path) == ["k2", "k3", "k4"]
+
+    store.delete("k3")
+    store.set("k5", 5, expires_at=1e12 + 5, max_rows=3)
+    store.flush()
+    assert rows(path) == ["k2", "k4", "k5"]
+    assert store.get("k5") == (5, 1e12 + 5)
+    store.close()
+
+
+def test_expired_entries_are_misses(tmp_path: Path) -> None:
+    cache = LRUCache(maxsize=4, ttl_seconds=-1, path=str(tmp_path / "cache.sqlite"))
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+    cache.close()
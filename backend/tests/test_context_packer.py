@@ -0,0 +1,96 @@
+"""Token-budgeted context packing."""
+
+import pytest
+
+from app.context_packer import ContextPacker, TokenCounter
+
+
+class CharCounter(TokenCounter):
+    """One token per character, so costs are easy to work out by hand."""
+
+    def __init__(self) -> None:
+        super().__init__("")
+
+    def count(self, text: str) -> int:
+        return len(text)
+
+
+def page(title: str, score: float, lines: list[str]) -> dict:
+    return {"title": title, "score": score, "content": "\n".join(lines)}
+
+
+def packed_lines(text: str) -> dict[str, list[str]]:
+    """Map each page header of a packed context to its sentences."""
+    pages = {}
+    for block in text.split("\n\n"):
+        header, *lines = block.split("\n")
+        pages[header] = lines
+    return pages
+
+
+def test_budget_is_shared_by_score_then_leftover_is_spent() -> None:
+    # Headers cost len("### [1] A") + 2 = 11 tokens and sentences 10 + 1 = 11
+    contexts = [
+        page("A", 3.0, [f"apple 0{i:03d}" for i in range(10)]),
+        page("B", 1.0, [f"apple 1{i:03d}" for i in range(10)]),
+    ]
+    packer = ContextPacker(CharCounter(), budget=100, dedup_threshold=1.0)
+    packed = packer.pack("apple", contexts)
+
+    # First pass: A's 75 tokens buy its header and 5 sentences (66), B's 25
+    # its header and 1 sentence (22). The 12 left buy one more sentence of A.
+    lines = packed_lines(packed.text)
+    assert lines["### [1] A"] == [f"apple 0{i:03d}" for i in range(6)]
+    assert lines["### [2] B"] == ["apple 1000"]
+    assert packed.pages == 2
+    assert packed.sentences == 7
+    assert packed.tokens <= 100
+
+
+def test_leftover_only_goes_to_sentences_overlapping_the_query() -> None:
+    contexts = [
+        page("A", 1.0, ["apple 0000"]),
+        page("B", 0.001, ["zzzzz 1000", "apple 1001"]),
+    ]
+    packed = ContextPacker(CharCounter(), budget=1000).pack("apple", contexts)
+    # B's share rounds down to nothing, so its sentence comes from the leftover
+    assert packed_lines(packed.text) == {
+        "### [1] A": ["apple 0000"],
+        "### [2] B": ["apple 1001"],
+    }
+
+
+def test_header_counts_against_the_budget() -> None:
+    contexts = [page("A", 1.0, ["apple 0000"])]
+    assert ContextPacker(CharCounter(), budget=21).pack("apple", contexts).text == ""
+    assert ContextPacker(CharCounter(), budget=22).pack("apple", contexts).sentences == 1
+
+
+def test_duplicates_are_kept_once() -> None:
+    shared = ["apple 0000", "apple 0001", "apple 0002"]
+    contexts = [
+        {
+            "title": "A",
+            "score": 2.0,
+            "passages": [
+                {"text": "\n".join(shared[:2]), "score": 2.0, "chunk_index": 0},
+                {"text": "\n".join([*shared[1:], "other text"]), "score": 1.0, "chunk_index": 1},
+            ],
+        },
+        page("B", 1.0, shared[:2]),  # the same text as A's first passage
+    ]
+    packed = ContextPacker(CharCounter(), budget=1000, dedup_threshold=0.8).pack(
+        "apple", contexts
+    )
+    assert packed.dropped_duplicates == 1
+    assert packed_lines(packed.text) == {"### [1] A": shared + ["other text"]}
+
+
+@pytest.mark.parametrize("budget", [40, 100, 250, 600])
+def test_estimated_tokens_stay_within_budget(budget: int) -> None:
+    contexts = [
+        page(f"ページ{n}", 1.0 / (n + 1), [f"りんごの品種{n}-{i}について。" * 2 for i in range(20)])
+        for n in range(5)
+    ]
+    packed = ContextPacker(TokenCounter(""), budget=budget).pack("りんごの品種", contexts)
+    assert 0 < packed.tokens <= budget
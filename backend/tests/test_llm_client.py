@@ -0,0 +1,87 @@
+"""Bounded LLM generation concurrency and load shedding."""
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.config import settings
+from app.context_packer import PackedContext
+from app.llm_client import LLMClient, LLMOverloaded
+
+CONTEXT = PackedContext(text="", tokens=0)
+
+
+class BlockingOllama:
+    """Chat endpoint that answers only once ``release`` is set."""
+
+    def __init__(self) -> None:
+        self.release = asyncio.Event()
+        self.running = 0
+        self.max_running = 0
+
+    async def chat(self, **kwargs: Any) -> dict[str, Any]:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.release.wait()
+        finally:
+            self.running -= 1
+        return {"message": {"content": "answer"}}
+
+
+@pytest.fixture
+def llm(monkeypatch: pytest.MonkeyPatch) -> LLMClient:
+    monkeypatch.setattr(settings, "llm_max_concurrency", 2)
+    monkeypatch.setattr(settings, "llm_max_queue", 1)
+    client = LLMClient(base_url="http://localhost:11434")
+    client._client = BlockingOllama()  # type: ignore[assignment]
+    return client
+
+
+def test_requests_beyond_the_queue_are_shed(llm: LLMClient) -> None:
+    ollama: BlockingOllama = llm._client  # type: ignore[assignment]
+
+    async def scenario() -> None:
+        timings: dict[str, float] = {}
+        tasks = [asyncio.create_task(llm.generate_answer("q", CONTEXT)) for _ in range(2)]
+        tasks.append(asyncio.create_task(llm.generate_answer("q", CONTEXT, timings)))
+        await asyncio.sleep(0.01)
+        assert (llm.active, llm.waiting) == (2, 1)
+
+        with pytest.raises(LLMOverloaded):
+            llm.check_capacity()
+        with pytest.raises(LLMOverloaded):
+            await llm.generate_answer("q", CONTEXT)
+        assert llm.stats()["shed"] == 2
+
+        ollama.release.set()
+        assert await asyncio.gather(*tasks) == ["answer"] * 3
+        assert ollama.max_running == 2
+        assert timings["llm_queue_ms"] > 0
+        assert (llm.active, llm.waiting) == (0, 0)
+        llm.check_capacity()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue(llm: LLMClient) -> None:
+    ollama: BlockingOllama = llm._client  # type: ignore[assignment]
+
+    async def scenario() -> None:
+        running = [asyncio.create_task(llm.generate_answer("q", CONTEXT)) for _ in range(2)]
+        waiter = asyncio.create_task(llm.generate_answer("q", CONTEXT))
+        await asyncio.sleep(0.01)
+        assert llm.waiting == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert llm.waiting == 0
+        llm.check_capacity()  # the freed queue place accepts a new request
+
+        ollama.release.set()
+        await asyncio.gather(*running)
+        assert llm.active == 0
+
+    asyncio.run(scenario())
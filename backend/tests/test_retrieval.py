@@ -0,0 +1,144 @@
+"""Retrieval modes, the BM25 fallback and the settings that key cached answers."""
+
+import asyncio
+from typing import Any
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.es_client import ESClient
+from app.retrieval import Retriever
+
+
+class FakeEncoder:
+    """Encodes a query as its words, after ``delay`` seconds or by raising ``error``."""
+
+    def __init__(
+        self, pruning: str = "top_n=100", delay: float = 0.0, error: Exception | None = None
+    ) -> None:
+        self._pruning = pruning
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def encode(self, text: str) -> dict[str, float]:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {word: 1.0 for word in text.split()}
+
+    async def pruning(self) -> str:
+        return self._pruning
+
+
+class FakeSearch:
+    """Search backend with BM25 that records which search ran."""
+
+    supports_bm25 = True
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    async def search(self, sparse_vector: dict[str, float], top_k: int = 5) -> list[Any]:
+        self.calls.append("sparse")
+        return [{"title": "sparse"}]
+
+    async def search_bm25(self, text: str, top_k: int = 5) -> list[Any]:
+        self.calls.append("bm25")
+        return [{"title": "bm25"}]
+
+    async def search_hybrid(
+        self, text: str, sparse_vector: dict[str, float], top_k: int = 5
+    ) -> list[Any]:
+        self.calls.append("hybrid")
+        return [{"title": "hybrid"}]
+
+
+@pytest.mark.parametrize("mode", ["sparse", "hybrid", "bm25"])
+def test_configured_mode(mode: str) -> None:
+    search = FakeSearch()
+    result = asyncio.run(Retriever(FakeEncoder(), search, mode=mode).retrieve("a b", top_k=3))
+    assert result.mode == mode
+    assert search.calls == [mode]
+    assert "retrieve_ms" in result.timings
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [{"delay": 1.0}, {"error": httpx.ConnectError("refused")}],
+    ids=["timeout", "error"],
+)
+def test_bm25_fallback_and_cooldown(
+    failure: dict[str, Any], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "encode_budget_ms", 20.0)
+    monkeypatch.setattr(settings, "encoder_cooldown_seconds", 0.2)
+    encoder = FakeEncoder(**failure)
+    search = FakeSearch()
+    retriever = Retriever(encoder, search, mode="hybrid")
+
+    async def scenario() -> None:
+        first = await retriever.retrieve("a", top_k=3)
+        assert first.mode == "bm25_fallback"
+        assert encoder.calls == 1
+
+        # The encoder is skipped during the cooldown
+        second = await retriever.retrieve("a", top_k=3)
+        assert second.mode == "bm25_fallback"
+        assert encoder.calls == 1
+        assert retriever.stats()["encoder_skipped"]
+
+        await asyncio.sleep(0.25)
+        encoder.delay, encoder.error = 0.0, None
+        third = await retriever.retrieve("a", top_k=3)
+        assert third.mode == "hybrid"
+        assert encoder.calls == 2
+
+    asyncio.run(scenario())
+    assert search.calls == ["bm25", "bm25", "hybrid"]
+    assert retriever.fallbacks == 2
+
+
+def test_hybrid_query_fuses_bm25_and_sparse_with_rrf(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "passage_candidates_per_page", 4)
+    monkeypatch.setattr(settings, "rrf_rank_window_size", 50)
+    monkeypatch.setattr(settings, "rrf_rank_constant", 60)
+
+    rrf = ESClient._hybrid_body("りんご", {"りんご": 1.5}, top_k=5)["retriever"]["rrf"]
+    assert [next(iter(r["standard"]["query"])) for r in rrf["retrievers"]] == [
+        "multi_match",
+        "sparse_vector",
+    ]
+    assert rrf["rank_window_size"] == 50
+    assert rrf["rank_constant"] == 60
+    # The window never drops below the candidates requested
+    wide = ESClient._hybrid_body("a", {"a": 1.0}, top_k=20)["retriever"]["rrf"]
+    assert wide["rank_window_size"] == 80
+
+
+def settings_key(retriever: Retriever) -> list:
+    return asyncio.run(retriever.settings_key())
+
+
+def test_settings_key_covers_retrieval_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    es = ESClient(url="http://localhost:9200", index="test")
+    sparse = Retriever(FakeEncoder(), es, mode="sparse")
+    hybrid = Retriever(FakeEncoder(), es, mode="hybrid")
+    base = settings_key(sparse)
+
+    assert settings_key(hybrid) != base
+    assert settings_key(Retriever(FakeEncoder("top_n=50"), es, mode="sparse")) != base
+
+    monkeypatch.setattr(settings, "max_passages_per_page", settings.max_passages_per_page + 1)
+    assert settings_key(sparse) != base
+
+    hybrid_key = settings_key(hybrid)
+    monkeypatch.setattr(settings, "rrf_rank_constant", settings.rrf_rank_constant + 1)
+    assert settings_key(hybrid) != hybrid_key
+
+    monkeypatch.setattr(settings, "es_query_pruning", True)
+    pruned = settings_key(sparse)
+    monkeypatch.setattr(settings, "es_tokens_weight_threshold", 0.9)
+    assert settings_key(sparse) != pruned
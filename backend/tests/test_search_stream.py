@@ -0,0 +1,53 @@
+"""Load shedding of /api/search/stream."""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.cache import LRUCache
+from app.config import settings
+from app.llm_client import LLMOverloaded
+
+
+class OverloadedLLM:
+    def check_capacity(self) -> None:
+        raise LLMOverloaded("queue full")
+
+
+class RetrieverStub:
+    async def settings_key(self) -> list[str]:
+        return ["sparse"]
+
+
+class IndexStub:
+    async def generation(self) -> str:
+        return "1"
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    monkeypatch.setattr(settings, "llm_overload_action", "reject")
+    monkeypatch.setattr(main, "llm_client", OverloadedLLM())
+    monkeypatch.setattr(main, "es_client", IndexStub())
+    monkeypatch.setattr(main, "retriever", RetrieverStub())
+    monkeypatch.setattr(main, "response_cache", LRUCache(maxsize=8, ttl_seconds=60))
+    return TestClient(main.app)
+
+
+def test_cached_answer_is_served_while_overloaded(client: TestClient) -> None:
+    request = main.SearchRequest(query="キャッシュ済み", top_k=5)
+    key = asyncio.run(main._response_cache_key(request))
+    main.response_cache.set(
+        key, main.SearchResponse(answer="回答", sources=[], query=request.query).model_dump()
+    )
+
+    response = client.post("/api/search/stream", json=request.model_dump())
+    assert response.status_code == 200
+    assert "event: token\ndata: {\"text\": \"回答\"}" in response.text
+
+
+def test_uncached_request_is_shed_while_overloaded(client: TestClient) -> None:
+    response = client.post("/api/search/stream", json={"query": "未キャッシュ", "top_k": 5})
+    assert response.status_code == 429
@@ -0,0 +1,171 @@
+"""Embedded sparse index: batch writer output read back by the backend.
+
+Indexes are written by ``batch/app/sparse_index.py`` itself, in a
+subprocess because both projects name their package ``app``.
+"""
+
+import asyncio
+import json
+import random
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.config import settings
+from app.retrieval import Retriever
+from app.sparse_index import CURRENT, EmbeddedSearchClient, SparseIndex
+
+BATCH_DIR = Path(__file__).resolve().parents[2] / "batch"
+
+WRITE_INDEX = """
+import json, sys
+from app.sparse_index import SparseIndexWriter
+
+root, entries = sys.argv[1], json.load(sys.stdin)
+writer = SparseIndexWriter(root)
+for doc, vector in entries:
+    writer.add(doc, vector)
+print(writer.commit())
+"""
+
+
+def write_index(root: Path, entries: list[tuple[dict[str, Any], dict[str, float]]]) -> Path:
+    """Write a new index version with the batch writer and return its directory."""
+    result = subprocess.run(
+        [sys.executable, "-c", WRITE_INDEX, str(root)],
+        cwd=BATCH_DIR,
+        input=json.dumps(entries),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return Path(result.stdout.strip().splitlines()[-1])
+
+
+def passage(page: str, chunk_index: int = 0) -> dict[str, Any]:
+    return {
+        "_id": f"{page}_{chunk_index}",
+        "page_id": page,
+        "chunk_index": chunk_index,
+        "title": page,
+        "content": f"{page} passage {chunk_index}",
+        "source_url": f"https://scrapbox.io/test/{page}",
+        "updated_at": 1_700_000_000_000,
+    }
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    entries = [
+        (passage("a", 0), {"りんご": 1.5, "果物": 0.25}),
+        (passage("a", 1), {"果物": 2.0}),
+        (passage("b", 0), {"バナナ": 0.75}),
+    ]
+    version = write_index(tmp_path, entries)
+
+    index = SparseIndex(version)
+    assert [index.doc(i) for i in range(len(index))] == [
+        {k: v for k, v in doc.items() if k != "_id"} for doc, _ in entries
+    ]
+    assert index.meta["documents"] == 3
+    assert index.meta["postings"] == 4
+    assert set(index.token_ids) == {"りんご", "果物", "バナナ"}
+    assert index.top_k({"果物": 1.0}, 5) == [(1, 2.0), (0, 0.25)]
+    assert index.top_k({"未知": 1.0}, 5) == []
+
+
+def test_top_k_matches_brute_force(tmp_path: Path) -> None:
+    rng = random.Random(0)
+    vocab = [f"t{i}" for i in range(60)]
+    vectors = [
+        {token: rng.uniform(0.01, 3.0) for token in rng.sample(vocab, rng.randint(1, 12))}
+        for _ in range(300)
+    ]
+    index = SparseIndex(
+        write_index(tmp_path, [(passage(f"p{i}"), vector) for i, vector in enumerate(vectors)])
+    )
+
+    for _ in range(20):
+        query = {token: rng.uniform(0.1, 2.0) for token in rng.sample(vocab, 5)}
+        expected = sorted(
+            (
+                (i, sum(weight * vector.get(token, 0.0) for token, weight in query.items()))
+                for i, vector in enumerate(vectors)
+            ),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        expected = [(i, score) for i, score in expected if score > 0]
+
+        for k in (1, 10, len(vectors)):
+            hits = index.top_k(query, k)
+            assert len(hits) == min(k, len(expected))
+            assert [doc_id for doc_id, _ in hits] == [doc_id for doc_id, _ in expected[:k]]
+            for (_, score), (_, want) in zip(hits, expected):
+                assert score == pytest.approx(want, rel=1e-5)
+
+
+def test_legacy_version_without_offsets(tmp_path: Path) -> None:
+    version = write_index(tmp_path, [(passage("a"), {"x": 1.0}), (passage("b"), {"y": 1.0})])
+    (version / "doc_offsets.npy").unlink()
+    index = SparseIndex(version)
+    assert len(index) == 2
+    assert index.doc(1)["title"] == "b"
+
+
+def test_current_symlink_switch(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "index_generation_check_seconds", 0.0)
+    client = EmbeddedSearchClient(str(tmp_path))
+
+    async def titles() -> list[str]:
+        return [page["title"] for page in await client.search({"共通": 1.0}, top_k=5)]
+
+    async def scenario() -> None:
+        first = write_index(tmp_path, [(passage("old"), {"共通": 1.0})])
+        assert await titles() == ["old"]
+        generation = await client.generation()
+
+        second = write_index(tmp_path, [(passage("new"), {"共通": 1.0})])
+        assert second != first
+        assert (tmp_path / CURRENT).resolve() == second
+        # The previous version keeps answering while the new one is opened in a thread
+        assert await titles() == ["old"]
+        for _ in range(200):
+            if await titles() == ["new"]:
+                break
+            await asyncio.sleep(0.01)
+        assert await titles() == ["new"]
+        assert await client.generation() != generation
+
+    asyncio.run(scenario())
+
+
+def test_missing_index(tmp_path: Path) -> None:
+    client = EmbeddedSearchClient(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        asyncio.run(client.search({"a": 1.0}))
+    assert asyncio.run(client.generation()) == ""
+
+
+class FakeEncoder:
+    async def encode(self, text: str) -> dict[str, float]:
+        return {text: 1.0}
+
+    async def encode_many(self, texts: list[str]) -> list[dict[str, float]]:
+        return [{text: 1.0} for text in texts]
+
+
+@pytest.mark.parametrize("mode", ["sparse", "hybrid", "bm25"])
+def test_retriever_uses_sparse_mode(tmp_path: Path, mode: str) -> None:
+    write_index(tmp_path, [(passage("a"), {"a": 1.0}), (passage("b"), {"b": 1.0})])
+    retriever = Retriever(FakeEncoder(), EmbeddedSearchClient(str(tmp_path)), mode=mode)
+    assert retriever.mode == "sparse"
+
+    result = asyncio.run(retriever.retrieve("b", top_k=5))
+    assert result.mode == "sparse"
+    assert [page["title"] for page in result.results] == ["b"]
+
+    results = asyncio.run(retriever.retrieve_many(["a", "b", "c"], top_k=5))
+    assert [[page["title"] for page in r.results] for r in results] == [["a"], ["b"], []]
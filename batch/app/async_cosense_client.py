@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import random
+import time
+from urllib.parse import quote
+
+import httpx
+
+from app.config import settings
+from app.cosense_client import CosensePage, CosensePageMeta
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``;
+    each acquire() takes one token, waiting if none are available.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncCosenseClient:
+    """Concurrent, rate-limited client for fetching pages from the Cosense API.
+
+    Requests share one connection pool (HTTP/2 when the server supports it),
+    at most ``concurrency`` are in flight, and they are started no faster
+    than ``rate_limit`` per second. Responses with status 429 or 5xx and
+    transport errors are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        project: str | None = None,
+        sid: str | None = None,
+        base_url: str | None = None,
+        concurrency: int | None = None,
+        rate_limit: float | None = None,
+        max_retries: int | None = None,
+    ) -> None:
+        self.project = project or settings.cosense_project
+        self.sid = sid or settings.cosense_sid
+        self.base_url = base_url or settings.cosense_base_url
+        self.max_retries = max_retries if max_retries is not None else settings.cosense_max_retries
+        self._semaphore = asyncio.Semaphore(concurrency or settings.cosense_concurrency)
+        self._bucket = TokenBucket(
+            rate_limit if rate_limit is not None else settings.cosense_rate_limit
+        )
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            cookies={"connect.sid": self.sid} if self.sid else None,
+            timeout=30.0,
+            http2=True,
+        )
+        self.failed: list[str] = []
+
+    async def _get(self, url: str) -> httpx.Response:
+        """GET a URL, retrying 429/5xx responses and transport errors with backoff."""
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                await self._bucket.acquire()
+                try:
+                    response = await self._client.get(url)
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        response.raise_for_status()
+                        return response
+                    error: Exception = httpx.HTTPStatusError(
+                        f"Retryable status {response.status_code}",
+                        request=response.request,
+                        response=response,
+                    )
+                    retry_after = response.headers.get("Retry-After")
+                except httpx.TransportError as e:
+                    error = e
+                    retry_after = None
+
+            if attempt >= self.max_retries:
+                raise error
+            delay = settings.cosense_backoff_seconds * (2**attempt)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            delay += random.uniform(0, delay / 2)
+            attempt += 1
+            logger.info(f"Retrying {url} in {delay:.1f}s ({attempt}/{self.max_retries}): {error}")
+            await asyncio.sleep(delay)
+
+    async def list_pages(self) -> list[CosensePageMeta]:
+        """Fetch all page titles and update timestamps from the project using pagination."""
+        metas: list[CosensePageMeta] = []
+        skip = 0
+        limit = 1000
+
+        while True:
+            response = await self._get(f"/api/pages/{self.project}?limit={limit}&skip={skip}")
+            pages = response.json().get("pages", [])
+
+            if not pages:
+                break
+
+            metas.extend(
+                CosensePageMeta(title=page["title"], updated=page.get("updated", 0))
+                for page in pages
+            )
+            logger.info(f"Fetched {len(metas)} page titles so far...")
+
+            if len(pages) < limit:
+                break
+            skip += limit
+
+        return metas
+
+    async def get_page_text(self, title: str) -> str:
+        """Fetch the plain text content of a page."""
+        response = await self._get(f"/api/pages/{self.project}/{quote(title, safe='')}/text")
+        return response.text
+
+    async def fetch_page(self, meta: CosensePageMeta) -> CosensePage | None:
+        """Fetch one page, returning None (and recording it in ``failed``) if it cannot be fetched."""
+        try:
+            content = await self.get_page_text(meta.title)
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to fetch '{meta.title}': {e}")
+            self.failed.append(meta.title)
+            return None
+        return CosensePage(
+            title=meta.title,
+            content=content,
+            updated=meta.updated,
+            source_url=f"{self.base_url}/{self.project}/{meta.title}",
+        )
+
+    async def close(self) -> None:
+        await self._client.aclose()
@@ -0,0 +1,96 @@
+"""Split Cosense page text into overlapping passages.
+
+Cosense pages are outlines: each line is a paragraph or bullet, and leading
+spaces/tabs mark nesting. A top-level line and the indented lines under it
+form a block, and blocks are packed into passages of up to ``max_chars``
+characters. Consecutive passages share trailing lines of up to
+``overlap_chars`` characters, so context around a boundary is retrievable
+from either side.
+"""
+
+from dataclasses import dataclass
+
+from app.config import settings
+
+
+@dataclass
+class Passage:
+    """A chunk of a page's text."""
+
+    index: int
+    text: str
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(" \t　"))
+
+
+def _blocks(lines: list[str]) -> list[list[str]]:
+    """Group lines into blocks of a top-level line followed by its indented children."""
+    blocks: list[list[str]] = []
+    for line in lines:
+        if not line.strip():
+            continue
+        if blocks and _indent(line) > 0:
+            blocks[-1].append(line)
+        else:
+            blocks.append([line])
+    return blocks
+
+
+def _split_long(lines: list[str], max_chars: int) -> list[list[str]]:
+    """Split a block that exceeds ``max_chars`` into line groups, hard-wrapping very long lines."""
+    pieces: list[str] = []
+    for line in lines:
+        while len(line) > max_chars:
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        pieces.append(line)
+
+    groups: list[list[str]] = [[]]
+    size = 0
+    for piece in pieces:
+        if groups[-1] and size + len(piece) + 1 > max_chars:
+            groups.append([])
+            size = 0
+        groups[-1].append(piece)
+        size += len(piece) + 1
+    return groups
+
+
+def chunk_text(
+    text: str, max_chars: int | None = None, overlap_chars: int | None = None
+) -> list[Passage]:
+    """Split page text into overlapping passages along line and indent boundaries."""
+    max_chars = max_chars or settings.chunk_max_chars
+    overlap_chars = overlap_chars if overlap_chars is not None else settings.chunk_overlap_chars
+
+    units: list[list[str]] = []
+    for block in _blocks(text.splitlines()):
+        if len("\n".join(block)) > max_chars:
+            units.extend(_split_long(block, max_chars))
+        else:
+            units.append(block)
+
+    passages: list[Passage] = []
+    current: list[str] = []
+    size = 0
+    for unit in units:
+        unit_size = sum(len(line) + 1 for line in unit)
+        if current and size + unit_size > max_chars:
+            passages.append(Passage(index=len(passages), text="\n".join(current)))
+            # Carry trailing lines over as overlap, without exceeding the budget
+            overlap: list[str] = []
+            overlap_size = 0
+            for line in reversed(current):
+                if overlap_size + len(line) + 1 > min(overlap_chars, max_chars - unit_size):
+                    break
+                overlap.insert(0, line)
+                overlap_size += len(line) + 1
+            current, size = overlap, overlap_size
+        current.extend(unit)
+        size += unit_size
+
+    if current:
+        passages.append(Passage(index=len(passages), text="\n".join(current)))
+    return passages
@@ -7,13 +7,58 @@ class Settings(BaseSettings):
     # Cosense
     cosense_project: str = "stacker8"
     cosense_sid: str = ""
+    cosense_base_url: str = "https://scrapbox.io"
+    # Concurrent page fetching
+    cosense_concurrency: int = 8
+    cosense_rate_limit: float = 10.0  # requests per second (0 disables)
+    cosense_max_retries: int = 5
+    cosense_backoff_seconds: float = 0.5
+    # Read pages from this project export (.json or .json.gz) instead of the API
+    cosense_export_path: str = ""
+
+    # Search backend: "elasticsearch" or "embedded" (memory-mapped sparse index files)
+    search_backend: str = "elasticsearch"
+    sparse_index_path: str = "data/sparse_index"
 
     # Elasticsearch
     elasticsearch_url: str = "http://localhost:9200"
-    elasticsearch_index: str = "cosense_pages"
+    elasticsearch_index: str = "cosense_pages"  # alias over versioned indices
+    # Full rebuilds (blue/green behind the alias)
+    rebuild_keep_versions: int = 1  # previous indices kept for rollback
+    rebuild_min_doc_ratio: float = 0.9  # vs. the live index, before switching
+    rebuild_forcemerge: bool = True
+    rebuild_warm_up_size: int = 10
 
     # Encoder API
     encoder_url: str = "http://localhost:8000"
+    # Number of texts sent per /api/encode_batch request
+    encoder_batch_size: int = 32
+    # "binary" asks for token ids + float16 weights, "json" for token-keyed objects
+    encoder_wire_format: str = "binary"
+    splade_model: str = "hotchpotch/japanese-splade-v2"
+    # Vectors of already encoded texts, reused across runs (an empty path disables it)
+    encoding_cache_path: str = "data/encoding_cache/vectors.sqlite"
+    encoding_cache_max_entries: int = 1_000_000
+
+    # Bulk indexing
+    bulk_chunk_size: int = 500  # max documents per bulk request
+    bulk_max_chunk_bytes: int = 10 * 1024 * 1024  # max payload per bulk request
+    bulk_max_retries: int = 3  # retries for items rejected with 429
+    bulk_initial_backoff_seconds: float = 2.0
+
+    # Passage chunking
+    chunk_max_chars: int = 600
+    chunk_overlap_chars: int = 150
+
+    # Ingestion pipeline
+    ingest_batch_size: int = 20  # pages per encode call and bulk request
+    encode_concurrency: int = 2
+    index_concurrency: int = 2  # bulk requests in flight
+    pipeline_queue_size: int = 200  # pages buffered between fetch and encode
+    pipeline_log_interval_seconds: float = 10.0
+
+    # Prometheus Pushgateway the run's metrics are pushed to (empty disables)
+    metrics_pushgateway_url: str = ""
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
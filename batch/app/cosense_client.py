@@ -7,7 +7,13 @@ from app.config import settings
 
 logger = logging.getLogger(__name__)
 
-BASE_URL = "https://scrapbox.io"
+
+@dataclass
+class CosensePageMeta:
+    """Represents a page entry from the Cosense page listing."""
+
+    title: str
+    updated: int
 
 
 @dataclass
@@ -27,14 +33,14 @@ class CosenseClient:
         self.project = project or settings.cosense_project
         self.sid = sid or settings.cosense_sid
         self._client = httpx.Client(
-            base_url=BASE_URL,
+            base_url=settings.cosense_base_url,
             cookies={"connect.sid": self.sid} if self.sid else None,
             timeout=30.0,
         )
 
-    def list_page_titles(self) -> list[str]:
-        """Fetch all page titles from the project using pagination."""
-        titles: list[str] = []
+    def list_pages(self) -> list[CosensePageMeta]:
+        """Fetch all page titles and update timestamps from the project using pagination."""
+        metas: list[CosensePageMeta] = []
         skip = 0
         limit = 1000
 
@@ -48,14 +54,21 @@ class CosenseClient:
             if not pages:
                 break
 
-            titles.extend(page["title"] for page in pages)
-            logger.info(f"Fetched {len(titles)} page titles so far...")
+            metas.extend(
+                CosensePageMeta(title=page["title"], updated=page.get("updated", 0))
+                for page in pages
+            )
+            logger.info(f"Fetched {len(metas)} page titles so far...")
 
             if len(pages) < limit:
                 break
             skip += limit
 
-        return titles
+        return metas
+
+    def list_page_titles(self) -> list[str]:
+        """Fetch all page titles from the project using pagination."""
+        return [meta.title for meta in self.list_pages()]
 
     def get_page_text(self, title: str) -> str:
         """Fetch the plain text content of a page."""
@@ -66,25 +79,31 @@ class CosenseClient:
 
     def fetch_all_pages(self) -> list[CosensePage]:
         """Fetch all pages with their content."""
-        titles = self.list_page_titles()
+        return self.fetch_pages(self.list_pages())
+
+    def fetch_pages(self, metas: list[CosensePageMeta]) -> list[CosensePage]:
+        """Fetch the content of the given pages."""
         pages: list[CosensePage] = []
 
-        for i, title in enumerate(titles):
+        for i, meta in enumerate(metas):
             try:
-                content = self.get_page_text(title)
+                content = self.get_page_text(meta.title)
                 page = CosensePage(
-                    title=title,
+                    title=meta.title,
                     content=content,
-                    updated=0,
-                    source_url=f"{BASE_URL}/{self.project}/{title}",
+                    updated=meta.updated,
+                    source_url=self.page_url(meta.title),
                 )
                 pages.append(page)
-                logger.info(f"[{i + 1}/{len(titles)}] Fetched: {title}")
+                logger.info(f"[{i + 1}/{len(metas)}] Fetched: {meta.title}")
             except httpx.HTTPStatusError as e:
-                logger.warning(f"Failed to fetch '{title}': {e}")
+                logger.warning(f"Failed to fetch '{meta.title}': {e}")
                 continue
 
         return pages
 
+    def page_url(self, title: str) -> str:
+        return f"{settings.cosense_base_url}/{self.project}/{title}"
+
     def close(self) -> None:
         self._client.close()
@@ -0,0 +1,245 @@
+"""Read pages from a Cosense project export instead of the Cosense API.
+
+An export ("Export pages" in the project settings) is one JSON object whose
+``pages`` array holds every page with its ``title``, ``updated`` timestamp
+and ``lines``. The file is parsed incrementally: only the page being decoded
+is held in memory, so exports of any size can be read in one sequential
+pass. Plain ``.json`` and gzip-compressed ``.json.gz`` files are supported.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterable, Iterator, TextIO
+
+from app.config import settings
+from app.cosense_client import CosensePage, CosensePageMeta
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20  # characters read from the file at a time
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+
+class JSONStreamReader:
+    """Decodes a JSON document from a text stream one value at a time.
+
+    The buffer holds the unread part of the current chunk plus, when a value
+    spans chunks, just enough of the following ones to decode it.
+    """
+
+    def __init__(self, stream: TextIO, chunk_size: int = CHUNK_SIZE) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the unread part of the buffer; False at the end."""
+        if self._eof:
+            return False
+        # Read at least as much as is buffered, so a large value is re-scanned
+        # a logarithmic rather than linear number of times
+        unread = self._buffer[self._pos :]
+        chunk = self._stream.read(max(self._chunk_size, len(unread)))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = unread + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at the end of the stream)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found {found or 'end of file'!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number (or literal) ending at the end of the buffer may continue
+            # in the next chunk, and so may one cut short by it ("1." of "1.5")
+            if self._continues(value, end) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _continues(self, value: Any, end: int) -> bool:
+        """Whether the value decoded up to ``end`` may be the prefix of a longer one."""
+        if end == len(self._buffer):
+            return True
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return False
+        return all(char in _NUMBER_CHARS for char in self._buffer[end:])
+
+    def members(self, open_: str, close: str) -> Iterator[None]:
+        """Step through an object (``{``, ``}``) or array (``[``, ``]``).
+
+        Yields once before each member or element; the caller must consume
+        it (e.g. with ``value()``) before resuming the iteration.
+        """
+        self.expect(open_)
+        if self.peek() == close:
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == close:
+                self._pos += 1
+                return
+            self.expect(",")
+
+
+def iter_export_pages(
+    stream: TextIO, chunk_size: int = CHUNK_SIZE, fields: dict[str, Any] | None = None
+) -> Iterator[dict[str, Any]]:
+    """Yield the raw page objects of an export one at a time.
+
+    The other top-level members (``name``, ``displayName``, ``exported``,
+    ...) are stored in ``fields`` as they are read, if it is given.
+    """
+    reader = JSONStreamReader(stream, chunk_size)
+    for _ in reader.members("{", "}"):
+        key = reader.value()
+        reader.expect(":")
+        if key == "pages":
+            for _ in reader.members("[", "]"):
+                yield reader.value()
+        else:
+            value = reader.value()
+            if fields is not None:
+                fields[key] = value
+
+
+def page_text(page: dict[str, Any]) -> str:
+    """The page text as returned by ``/api/pages/:project/:title/text``.
+
+    Lines are plain strings, or objects with a ``text`` field in exports
+    that include metadata. The first line is the title.
+    """
+    return "\n".join(
+        line if isinstance(line, str) else line.get("text", "") for line in page.get("lines", [])
+    )
+
+
+class CosenseExport:
+    """Page source backed by a Cosense project export file.
+
+    Provides the listing and page reading of the API clients, so ingestion
+    can run offline and reproducibly from a downloaded export.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        project: str | None = None,
+        base_url: str | None = None,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> None:
+        self.path = Path(path)
+        # Replaced by the export's own ``name`` on the first read, unless given
+        self.project = project or settings.cosense_project
+        self._project_given = project is not None
+        self.base_url = base_url or settings.cosense_base_url
+        self.chunk_size = chunk_size
+        self.failed: list[str] = []
+
+    def _open(self) -> TextIO:
+        if self.path.suffix == ".gz":
+            return gzip.open(self.path, "rt", encoding="utf-8")
+        return open(self.path, encoding="utf-8")
+
+    def _raw_pages(self) -> Iterator[dict[str, Any]]:
+        fields: dict[str, Any] = {}
+        with self._open() as f:
+            for page in iter_export_pages(f, self.chunk_size, fields):
+                # Exports list the project name before the pages
+                self._set_project(fields.get("name"))
+                yield page
+        self._set_project(fields.get("name"))
+
+    def _set_project(self, name: Any) -> None:
+        if self._project_given or not isinstance(name, str) or not name:
+            return
+        if name != self.project:
+            logger.info(f"Project: {name} (from the export)")
+            self.project = name
+
+    def list_pages(self) -> list[CosensePageMeta]:
+        """Read all page titles and update timestamps from the export."""
+        metas = [
+            CosensePageMeta(title=page["title"], updated=page.get("updated", 0))
+            for page in self._raw_pages()
+        ]
+        logger.info(f"Read {len(metas)} page titles from {self.path}")
+        return metas
+
+    def read_pages(self, metas: Iterable[CosensePageMeta]) -> Iterator[CosensePage]:
+        """Yield the given pages in file order.
+
+        Pages that are no longer in the export are recorded in ``failed``.
+        """
+        wanted = {meta.title: meta for meta in metas}
+        if not wanted:
+            return
+        for page in self._raw_pages():
+            if wanted.pop(page["title"], None) is None:
+                continue
+            yield CosensePage(
+                title=page["title"],
+                content=page_text(page),
+                updated=page.get("updated", 0),
+                source_url=f"{self.base_url}/{self.project}/{page['title']}",
+            )
+        if wanted:
+            logger.warning(f"{len(wanted)} pages not found in {self.path}")
+            self.failed.extend(wanted)
+
+    async def iter_pages(self, metas: Iterable[CosensePageMeta]) -> AsyncIterator[CosensePage]:
+        """Read the given pages in a worker thread, yielding each one as it is decoded."""
+        pages = self.read_pages(metas)
+        # Closing the generator while a read is still running in its thread
+        # (after a cancellation) would fail, so both take the lock
+        lock = threading.Lock()
+
+        def read_next() -> CosensePage | None:
+            with lock:
+                return next(pages, None)
+
+        def close() -> None:
+            with lock:
+                pages.close()
+
+        try:
+            while (page := await asyncio.to_thread(read_next)) is not None:
+                yield page
+        finally:
+            await asyncio.shield(asyncio.to_thread(close))
+
+    def close(self) -> None:
+        """Nothing to release: the file is opened for each read."""
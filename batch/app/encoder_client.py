@@ -1,35 +1,138 @@
 import logging
+import threading
+from typing import Any
 
 import httpx
 
+from app import wire
 from app.config import settings
+from app.encoding_cache import EncodingCache
 
 logger = logging.getLogger(__name__)
 
 
 class EncoderClient:
-    """Client for the Sparse Encoder API service."""
+    """Client for the Sparse Encoder API service.
 
-    def __init__(self, base_url: str | None = None) -> None:
+    With ``settings.encoder_wire_format == "binary"`` vectors are requested
+    in the compact format of ``app.wire``; the encoder falls back to JSON if
+    it doesn't support it, and both are handled.
+
+    ``encode_batch`` looks texts up in the persistent encoding cache first
+    and only sends the misses to the encoder. Cached vectors are keyed on the
+    encoder's document pruning settings too, read once from its health
+    endpoint, so a rebuild after changing them doesn't reuse stale vectors.
+    """
+
+    def __init__(
+        self, base_url: str | None = None, cache: EncodingCache | None = None
+    ) -> None:
         self.base_url = base_url or settings.encoder_url
+        if cache is None and settings.encoding_cache_path:
+            cache = EncodingCache()
+        self.cache = cache
         self._client = httpx.Client(base_url=self.base_url, timeout=60.0)
+        self._headers = (
+            {"Accept": wire.MEDIA_TYPE} if settings.encoder_wire_format == "binary" else None
+        )
+        self._vocab: list[str] = []
+        self._vocab_hash = ""
+        # The pipeline encodes from several worker threads
+        self._vocab_lock = threading.Lock()
+        self._pruning: str | None = None
+        self._pruning_lock = threading.Lock()
 
     def encode(self, text: str) -> dict[str, float]:
         """Encode text to a sparse vector via the encoder API."""
         response = self._client.post(
             "/api/encode",
-            json={"text": text},
+            json={"text": text, "kind": "document"},
+            headers=self._headers,
         )
         response.raise_for_status()
-        return response.json()["vector"]
+        return self._vectors(response)[0]
+
+    def encode_batch(
+        self, texts: list[str], batch_size: int | None = None
+    ) -> list[dict[str, float]]:
+        """Encode multiple texts via the encoder API, sending them in chunks.
+
+        Texts found in the encoding cache are not sent.
+
+        Args:
+            texts: The texts to encode.
+            batch_size: Number of texts per request. Defaults to
+                ``settings.encoder_batch_size``.
+
+        Returns:
+            Sparse vectors in the same order as ``texts``.
+        """
+        batch_size = max(1, batch_size or settings.encoder_batch_size)
+        pruning = self.pruning() if self.cache else ""
+        cached = self.cache.get_many(texts, pruning) if self.cache else [None] * len(texts)
+        missing = [text for text, vector in zip(texts, cached) if vector is None]
+
+        encoded: list[dict[str, float]] = []
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start : start + batch_size]
+            response = self._client.post(
+                "/api/encode_batch",
+                json={"texts": chunk, "kind": "document"},
+                headers=self._headers,
+            )
+            response.raise_for_status()
+            vectors = self._vectors(response)
+            if self.cache:
+                self.cache.set_many(chunk, vectors, pruning)
+            encoded.extend(vectors)
+
+        new = iter(encoded)
+        return [vector if vector is not None else next(new) for vector in cached]
+
+    def pruning(self) -> str:
+        """Return the encoder's document pruning settings as reported by its health endpoint.
+
+        Read on first use and kept for the rest of the run.
+        """
+        with self._pruning_lock:
+            if self._pruning is None:
+                response = self._client.get("/api/health")
+                response.raise_for_status()
+                self._pruning = str(response.json().get("pruning", {}).get("document", ""))
+                logger.info(f"Encoder document pruning: '{self._pruning}'")
+            return self._pruning
+
+    def _vectors(self, response: httpx.Response) -> list[dict[str, float]]:
+        """Decode the vectors of a binary or JSON response."""
+        if response.headers.get("content-type", "").startswith(wire.MEDIA_TYPE):
+            tokens = self._vocabulary(response.headers.get(wire.VOCAB_HASH_HEADER, ""))
+            return wire.unpack_vectors(response.content, tokens)
+        data = response.json()
+        return data["vectors"] if "vectors" in data else [data["vector"]]
+
+    def _vocabulary(self, vocab_hash: str) -> list[str]:
+        """Return the encoder vocabulary, fetching it again only if its hash changed."""
+        with self._vocab_lock:
+            if vocab_hash != self._vocab_hash:
+                response = self._client.get("/api/vocab")
+                response.raise_for_status()
+                data = response.json()
+                self._vocab, self._vocab_hash = data["tokens"], data["hash"]
+                logger.info(f"Loaded encoder vocabulary ({len(self._vocab)} tokens)")
+            return self._vocab
 
     def health_check(self) -> bool:
-        """Check if the encoder service is healthy."""
+        """Check if the encoder service is ready, i.e. its model is loaded and warmed up."""
         try:
-            response = self._client.get("/api/health")
+            response = self._client.get("/api/ready")
             return response.status_code == 200
         except httpx.HTTPError:
             return False
 
+    def cache_stats(self) -> dict[str, Any] | None:
+        return self.cache.stats() if self.cache else None
+
     def close(self) -> None:
         self._client.close()
+        if self.cache:
+            self.cache.close()
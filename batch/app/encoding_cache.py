@@ -0,0 +1,127 @@
+"""Persistent cache of document vectors keyed by content hash.
+
+Most passages are unchanged between runs, so a rebuild mostly re-encodes
+text the encoder has already seen. Vectors are stored in SQLite under the
+SHA-256 of the encoder model name, the encoder's document pruning settings
+and the exact text sent to the encoder, and the least recently used rows are
+evicted beyond ``max_entries``.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EncodingCache:
+    """Size-bounded on-disk map from (model, pruning, text) to sparse vector."""
+
+    def __init__(
+        self,
+        path: str | None = None,
+        model: str | None = None,
+        max_entries: int | None = None,
+    ) -> None:
+        self.path = path or settings.encoding_cache_path
+        self.model = model or settings.splade_model
+        self.max_entries = max_entries or settings.encoding_cache_max_entries
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # The pipeline encodes from several worker threads
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "key TEXT PRIMARY KEY, vector TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used)"
+        )
+        self._conn.commit()
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def key(self, text: str, pruning: str = "") -> str:
+        return hashlib.sha256(f"{self.model}\0{pruning}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: list[str], pruning: str = "") -> list[dict[str, float] | None]:
+        """Return the cached vector of each text, or None where there is none.
+
+        ``pruning`` is the encoder's document pruning fingerprint.
+        """
+        keys = [self.key(text, pruning) for text in texts]
+        found: dict[str, dict[str, float]] = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update((key, json.loads(vector)) for key, vector in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE vectors SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return [found.get(key) for key in keys]
+
+    def set_many(
+        self, texts: list[str], vectors: list[dict[str, float]], pruning: str = ""
+    ) -> None:
+        """Store vectors and evict the least recently used rows beyond ``max_entries``."""
+        now = time.time()
+        rows = [
+            (self.key(text, pruning), json.dumps(vector, ensure_ascii=False), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            try:
+                before = self._conn.total_changes
+                # Same key means same text, model and pruning, so an existing row is already correct
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO vectors (key, vector, last_used) VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._rows += self._conn.total_changes - before
+                if self._rows > self.max_entries:
+                    excess = self._rows - self.max_entries
+                    self._conn.execute(
+                        "DELETE FROM vectors WHERE key IN "
+                        "(SELECT key FROM vectors ORDER BY last_used LIMIT ?)",
+                        (excess,),
+                    )
+                    self._rows -= excess
+                    self.evicted += excess
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to store encoded vectors: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        """Return the current size and hit/miss counters."""
+        total = self.hits + self.misses
+        return {
+            "size": self._rows,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self) -> None:
+        self._conn.close()
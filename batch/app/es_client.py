@@ -1,7 +1,12 @@
+import hashlib
 import logging
-from typing import Any
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
 
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import scan, streaming_bulk
 
 from app.config import settings
 
@@ -15,11 +20,31 @@ INDEX_MAPPING = {
             "content_vector": {"type": "sparse_vector"},
             "source_url": {"type": "keyword"},
             "updated_at": {"type": "date"},
+            "page_id": {"type": "keyword"},
+            "chunk_index": {"type": "integer"},
         }
     }
 }
 
 
+def document_id(project: str, title: str) -> str:
+    """Return a stable id for a Cosense page, stored as ``page_id`` on its passages."""
+    return hashlib.sha1(f"{project}/{title}".encode("utf-8")).hexdigest()
+
+
+def passage_id(page_id: str, chunk_index: int) -> str:
+    """Return the document _id of one passage of a page."""
+    return f"{page_id}_{chunk_index}"
+
+
+@dataclass
+class BulkResult:
+    """Outcome of a bulk indexing call."""
+
+    indexed: int = 0
+    errors: list[dict[str, Any]] = field(default_factory=list)
+
+
 class ESClient:
     """Elasticsearch client for indexing documents."""
 
@@ -28,9 +53,13 @@ class ESClient:
         self.index = index or settings.elasticsearch_index
         self._client = Elasticsearch(self.url)
 
+    def exists(self) -> bool:
+        """Return whether the index or alias exists."""
+        return bool(self._client.indices.exists(index=self.index))
+
     def create_index(self) -> None:
         """Create the index with sparse_vector mapping if it doesn't exist."""
-        if self._client.indices.exists(index=self.index):
+        if self.exists():
             logger.info(f"Index '{self.index}' already exists, skipping creation.")
             return
         self._client.indices.create(index=self.index, body=INDEX_MAPPING)
@@ -38,23 +67,210 @@ class ESClient:
 
     def delete_index(self) -> None:
         """Delete the index if it exists."""
-        if self._client.indices.exists(index=self.index):
+        if self.exists():
             self._client.indices.delete(index=self.index)
             logger.info(f"Index '{self.index}' deleted.")
 
-    def bulk_index(self, documents: list[dict[str, Any]]) -> None:
-        """Bulk index documents."""
+    def create_versioned_index(self) -> str:
+        """Create a new timestamped index to build behind the alias ``self.index``."""
+        name = f"{self.index}_{time.strftime('%Y%m%d%H%M%S')}"
+        self._client.indices.create(index=name, body=INDEX_MAPPING)
+        logger.info(f"Index '{name}' created successfully.")
+        return name
+
+    def aliased_indices(self) -> list[str]:
+        """Return the concrete indices currently behind the alias ``self.index``."""
+        if not self._client.indices.exists_alias(name=self.index):
+            return []
+        return list(self._client.indices.get_alias(name=self.index).body)
+
+    def versioned_indices(self) -> list[str]:
+        """Return all versioned indices for the alias, oldest first."""
+        response = self._client.indices.get(
+            index=f"{self.index}_*", expand_wildcards="open", ignore_unavailable=True
+        )
+        return sorted(response.body)
+
+    def switch_alias(self, new_index: str) -> None:
+        """Point the alias at ``new_index`` in a single atomic operation.
+
+        A legacy concrete index that has the alias name is removed in the
+        same operation so the alias can take its place.
+        """
         actions: list[dict[str, Any]] = []
-        for doc in documents:
-            actions.append({"index": {"_index": self.index}})
-            actions.append(doc)
-        if actions:
-            self._client.bulk(body=actions)
-            logger.info(f"Bulk indexed {len(documents)} documents.")
-
-    def count(self) -> int:
+        old_indices = self.aliased_indices()
+        if old_indices:
+            actions.extend(
+                {"remove": {"index": old, "alias": self.index}} for old in old_indices
+            )
+        elif self.exists():
+            actions.append({"remove_index": {"index": self.index}})
+        actions.append({"add": {"index": new_index, "alias": self.index}})
+        self._client.indices.update_aliases(actions=actions)
+        logger.info(f"Alias '{self.index}' switched from {old_indices or '-'} to '{new_index}'.")
+
+    def cleanup_old_versions(self, keep: int) -> list[str]:
+        """Delete versioned indices not behind the alias, keeping the newest ``keep``."""
+        live = set(self.aliased_indices())
+        stale = [name for name in self.versioned_indices() if name not in live]
+        to_delete = stale[: max(0, len(stale) - keep)]
+        for name in to_delete:
+            self._client.indices.delete(index=name)
+            logger.info(f"Index '{name}' deleted.")
+        return to_delete
+
+    def warm_up(self, index: str) -> None:
+        """Refresh and merge a freshly built index and run a query so it is ready to serve."""
+        self._client.indices.refresh(index=index)
+        if settings.rebuild_forcemerge:
+            self._client.indices.forcemerge(index=index, max_num_segments=1)
+        self._client.search(index=index, query={"match_all": {}}, size=1)
+        self._client.search(
+            index=index, query={"exists": {"field": "content_vector"}}, size=settings.rebuild_warm_up_size
+        )
+
+    def bulk_index(self, documents: list[dict[str, Any]]) -> BulkResult:
+        """Bulk index documents and report per-item failures.
+
+        Requests are split by both document count (``settings.bulk_chunk_size``)
+        and payload size (``settings.bulk_max_chunk_bytes``). Items rejected
+        with 429 are retried with exponential backoff; other failed items are
+        returned in the result instead of raising.
+
+        A document's ``_id`` key, if present, is used as its Elasticsearch
+        _id so that re-indexing a page replaces the existing document.
+        """
+        result = BulkResult()
+        actions = ({"_index": self.index, **doc} for doc in documents)
+        for ok, item in streaming_bulk(
+            self._client,
+            actions,
+            chunk_size=settings.bulk_chunk_size,
+            max_chunk_bytes=settings.bulk_max_chunk_bytes,
+            max_retries=settings.bulk_max_retries,
+            initial_backoff=settings.bulk_initial_backoff_seconds,
+            raise_on_error=False,
+            raise_on_exception=False,
+        ):
+            if ok:
+                result.indexed += 1
+            else:
+                result.errors.append(item.get("index", item))
+
+        if result.errors:
+            logger.warning(
+                f"Bulk indexed {result.indexed} documents, {len(result.errors)} failed: "
+                f"{result.errors[0].get('error')}"
+            )
+        else:
+            logger.info(f"Bulk indexed {result.indexed} documents.")
+        return result
+
+    @contextmanager
+    def bulk_load_mode(self) -> Iterator[None]:
+        """Disable refresh and replicas while loading, restoring them afterwards."""
+        current = self._client.indices.get_settings(
+            index=self.index, include_defaults=True, flat_settings=True
+        )
+        index_settings = next(iter(current.body.values()))
+        original = {
+            key: index_settings.get("settings", {}).get(key)
+            or index_settings.get("defaults", {}).get(key)
+            for key in ("index.refresh_interval", "index.number_of_replicas")
+        }
+
+        self._client.indices.put_settings(
+            index=self.index,
+            settings={"index.refresh_interval": "-1", "index.number_of_replicas": 0},
+        )
+        logger.info(f"Bulk-load mode enabled on '{self.index}' (was {original}).")
+        try:
+            yield
+        finally:
+            self._client.indices.put_settings(index=self.index, settings=original)
+            self._client.indices.refresh(index=self.index)
+            logger.info(f"Bulk-load mode disabled on '{self.index}', settings restored.")
+
+    def get_updated_map(self) -> dict[str, int]:
+        """Return the updated_at value (epoch millis) of every indexed page by page_id."""
+        if not self.exists():
+            return {}
+        updated: dict[str, int] = {}
+        for hit in scan(self._client, index=self.index, _source=["page_id", "updated_at"]):
+            page_id = hit["_source"].get("page_id") or hit["_id"]
+            updated[page_id] = hit["_source"].get("updated_at") or 0
+        return updated
+
+    def delete_documents(self, page_ids: list[str]) -> None:
+        """Delete every passage of the given pages."""
+        for start in range(0, len(page_ids), 1000):
+            chunk = page_ids[start : start + 1000]
+            response = self._client.delete_by_query(
+                index=self.index,
+                query={
+                    "bool": {
+                        "should": [
+                            {"terms": {"page_id": chunk}},
+                            {"ids": {"values": chunk}},
+                        ]
+                    }
+                },
+                conflicts="proceed",
+            )
+            logger.info(f"Deleted {response['deleted']} passages of {len(chunk)} pages.")
+
+    def delete_stale_passages(self, passage_counts: dict[str, int]) -> None:
+        """Delete documents left over from a previous version of each page.
+
+        A page's current documents are passages ``0 .. count - 1``, or only
+        the empty-page marker (chunk_index -1) when its count is 0. Anything
+        else with its page_id, including a marker of a page that has content
+        again, is deleted.
+        """
+        if not passage_counts:
+            return
+        self._client.delete_by_query(
+            index=self.index,
+            query={
+                "bool": {
+                    "should": [
+                        {
+                            "bool": {
+                                "filter": [{"term": {"page_id": page_id}}],
+                                "must_not": [
+                                    {
+                                        "range": {
+                                            "chunk_index": {"gte": -1, "lt": 0}
+                                            if count == 0
+                                            else {"gte": 0, "lt": count}
+                                        }
+                                    }
+                                ],
+                            }
+                        }
+                        for page_id, count in passage_counts.items()
+                    ]
+                    # Page-level documents indexed before chunking used the page id as _id
+                    + [{"ids": {"values": list(passage_counts)}}]
+                }
+            },
+            conflicts="proceed",
+        )
+
+    def mark_generation(self) -> str:
+        """Record a new index generation in the mapping's _meta.
+
+        The backend includes this marker in its response cache keys, so
+        cached answers are dropped once the index content changes.
+        """
+        generation = str(time.time_ns())
+        self._client.indices.put_mapping(index=self.index, meta={"generation": generation})
+        logger.info(f"Index '{self.index}' generation set to {generation}.")
+        return generation
+
+    def count(self, index: str | None = None) -> int:
         """Return the number of documents in the index."""
-        result = self._client.count(index=self.index)
+        result = self._client.count(index=index or self.index)
         return result["count"]
 
     def close(self) -> None:
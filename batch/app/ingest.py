@@ -1,17 +1,40 @@
 """Batch ingestion script: Fetch Cosense pages and index into Elasticsearch.
 
+By default only pages that are new or whose Cosense ``updated`` timestamp
+changed since the last run are fetched and re-encoded, and documents for
+pages that no longer exist are deleted. ``--bulk-load`` disables refresh
+and replicas while indexing and restores them afterwards.
+
+``--full`` (or a first run) builds every page into a new versioned index
+in bulk-load mode, checks it, and then atomically switches the
+``ELASTICSEARCH_INDEX`` alias to it, so searches never see a partial index.
+
+``--export PATH`` (or ``COSENSE_EXPORT_PATH``) reads the pages and their
+``updated`` timestamps from a Cosense project export file instead of the
+Cosense API, so no page is fetched over the network.
+
+With ``SEARCH_BACKEND=embedded`` a new version of the memory-mapped sparse
+index under ``SPARSE_INDEX_PATH`` is written instead, and Elasticsearch is
+not used.
+
 Usage:
-    python -m app.ingest
+    python -m app.ingest [--full] [--bulk-load] [--export PATH]
 """
 
+import argparse
+import asyncio
 import logging
 import sys
-import time
+from contextlib import nullcontext
 
+from app import metrics
 from app.config import settings
-from app.cosense_client import CosenseClient
+from app.cosense_client import CosenseClient, CosensePageMeta
+from app.cosense_export import CosenseExport
 from app.encoder_client import EncoderClient
-from app.es_client import ESClient
+from app.es_client import ESClient, document_id
+from app.pipeline import PipelineResult, run_pipeline
+from app.sparse_index import SparseIndex, SparseIndexWriter
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,94 +42,241 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-BATCH_SIZE = 20
 
+def rebuild(
+    metas: list[CosensePageMeta],
+    encoder: EncoderClient,
+    es: ESClient,
+    export: CosenseExport | None = None,
+) -> None:
+    """Build a new versioned index and switch the alias to it once it checks out.
+
+    The backend keeps searching the previous index through the alias until
+    the switch, which is a single atomic alias update.
+    """
+    new_index = es.create_versioned_index()
+    target = ESClient(index=new_index)
+    try:
+        with target.bulk_load_mode():
+            result = asyncio.run(
+                run_pipeline(metas, encoder, target, replace_existing=False, export=export)
+            )
+        _log_result(result)
+        target.mark_generation()
+
+        logger.info(f"Warming up '{new_index}'...")
+        target.warm_up(new_index)
+
+        count = target.count(new_index)
+        previous = es.count() if es.exists() else 0
+        if count != result.indexed:
+            raise RuntimeError(
+                f"'{new_index}' has {count} documents but {result.indexed} were indexed"
+            )
+        if count < previous * settings.rebuild_min_doc_ratio:
+            raise RuntimeError(
+                f"'{new_index}' has {count} documents, fewer than "
+                f"{settings.rebuild_min_doc_ratio:.0%} of the current {previous}"
+            )
+    except BaseException:
+        logger.error(f"Rebuild failed, deleting '{new_index}'. The alias was not changed.")
+        target.delete_index()
+        raise
+    finally:
+        target.close()
+
+    es.switch_alias(new_index)
+    es.cleanup_old_versions(keep=settings.rebuild_keep_versions)
+
+    logger.info("=== Rebuild complete ===")
+    logger.info(f"Total indexed: {result.indexed} documents in {result.elapsed:.1f}s")
+    logger.info(f"Index document count: {count}")
+
+
+def update(
+    metas: list[CosensePageMeta],
+    project: str,
+    encoder: EncoderClient,
+    es: ESClient,
+    bulk_load: bool = False,
+    export: CosenseExport | None = None,
+) -> None:
+    """Re-encode new and changed pages in place and delete removed ones."""
+    indexed = es.get_updated_map()
+    listed_ids = {document_id(project, meta.title) for meta in metas}
+    changed = [
+        meta
+        for meta in metas
+        if indexed.get(document_id(project, meta.title)) != meta.updated * 1000
+    ]
+    removed = [doc_id for doc_id in indexed if doc_id not in listed_ids]
+    logger.info(
+        f"{len(changed)} new or updated pages, {len(removed)} removed pages, "
+        f"{len(metas) - len(changed)} unchanged."
+    )
+
+    if removed:
+        es.delete_documents(removed)
+
+    if not changed:
+        if removed:
+            es.mark_generation()
+        logger.info("Index is up to date. Exiting.")
+        return
+
+    logger.info("Fetching, encoding and indexing pages...")
+    with es.bulk_load_mode() if bulk_load else nullcontext():
+        result = asyncio.run(run_pipeline(changed, encoder, es, export=export))
+    _log_result(result)
 
-def main() -> None:
+    if result.indexed or removed:
+        es.mark_generation()
+
+    logger.info("=== Ingestion complete ===")
+    logger.info(f"Total indexed: {result.indexed} documents in {result.elapsed:.1f}s")
+    logger.info(f"Index document count: {es.count()}")
+
+
+def build_sparse_index(
+    metas: list[CosensePageMeta],
+    project: str,
+    encoder: EncoderClient,
+    full: bool = False,
+    export: CosenseExport | None = None,
+) -> None:
+    """Write a new version of the embedded sparse index.
+
+    Passages of unchanged pages are copied from the current version with
+    their vectors, so only new and changed pages are fetched and encoded.
+    Removed pages are simply not carried over. Pages that fail to fetch or
+    encode keep their passages from the current version (also with
+    ``--full``), and the new version only replaces the current one if it
+    has at least ``settings.rebuild_min_doc_ratio`` of its documents.
+    """
+    current = SparseIndex.open_current()
+    writer = SparseIndexWriter()
+    changed = metas
+    unchanged: set[str] = set()
+
+    if current is not None and not full:
+        indexed = current.updated_map()
+        unchanged = {
+            document_id(project, meta.title)
+            for meta in metas
+            if indexed.get(document_id(project, meta.title)) == meta.updated * 1000
+        }
+        changed = [meta for meta in metas if document_id(project, meta.title) not in unchanged]
+        logger.info(
+            f"{len(changed)} new or updated pages, "
+            f"{len(set(indexed) - unchanged)} changed or removed pages dropped, "
+            f"{len(unchanged)} unchanged."
+        )
+
+    result = asyncio.run(
+        run_pipeline(changed, encoder, writer, replace_existing=False, export=export)
+    )
+    _log_result(result)
+
+    if current is not None:
+        written = {doc["page_id"] for doc in writer.docs}
+        failed = {document_id(project, title) for title in result.failed} - written
+        keep = unchanged | failed
+        for doc, vector in current.document_vectors():
+            if doc["page_id"] in keep:
+                writer.add(doc, vector)
+        if failed:
+            logger.warning(f"Kept the previous passages of {len(failed)} failed pages.")
+
+        previous = len(current.docs)
+        if len(writer.docs) < previous * settings.rebuild_min_doc_ratio:
+            raise RuntimeError(
+                f"The new sparse index has {len(writer.docs)} documents, fewer than "
+                f"{settings.rebuild_min_doc_ratio:.0%} of the current {previous}. "
+                "The current version was not changed."
+            )
+
+    version = writer.commit()
+
+    logger.info("=== Ingestion complete ===")
+    logger.info(f"Total indexed: {result.indexed} documents in {result.elapsed:.1f}s")
+    logger.info(f"Sparse index '{version}' document count: {len(writer.docs)}")
+
+
+def _log_result(result: PipelineResult) -> None:
+    if result.skipped:
+        logger.info(f"Indexed {result.skipped} empty pages as markers without passages.")
+    if result.failed:
+        logger.warning(
+            f"{len(result.failed)} pages failed and will be retried on the next run: "
+            + ", ".join(result.failed)
+        )
+
+
+def main(full: bool = False, bulk_load: bool = False, export_path: str | None = None) -> None:
+    export_path = export_path or settings.cosense_export_path
     logger.info("=== Cosense → Elasticsearch Ingestion ===")
     logger.info(f"Project: {settings.cosense_project}")
+    if export_path:
+        logger.info(f"Export: {export_path}")
     logger.info(f"Encoder: {settings.encoder_url}")
-    logger.info(f"Elasticsearch: {settings.elasticsearch_url}/{settings.elasticsearch_index}")
+    if settings.search_backend == "embedded":
+        logger.info(f"Embedded sparse index: {settings.sparse_index_path}")
+    else:
+        logger.info(f"Elasticsearch: {settings.elasticsearch_url}/{settings.elasticsearch_index}")
 
-    cosense = CosenseClient()
+    export = CosenseExport(export_path) if export_path else None
+    cosense = export or CosenseClient()
     encoder = EncoderClient()
     es = ESClient()
 
     # Check encoder health
     if not encoder.health_check():
-        logger.error("Encoder service is not available. Start it first.")
+        logger.error("Encoder service is not ready. Start it first or wait for the model to load.")
         sys.exit(1)
 
     try:
-        # 1. Create index
-        logger.info("Creating Elasticsearch index...")
-        es.create_index()
-
-        # 2. Fetch pages from Cosense
-        logger.info("Fetching pages from Cosense...")
-        pages = cosense.fetch_all_pages()
-        logger.info(f"Fetched {len(pages)} pages total.")
-
-        if not pages:
-            logger.warning("No pages found. Exiting.")
-            return
-
-        # 3. Encode and index pages in batches
-        logger.info("Encoding and indexing pages...")
-        batch: list[dict] = []
-        indexed_count = 0
-        start_time = time.time()
-
-        for i, page in enumerate(pages):
-            try:
-                if not page.content.strip():
-                    logger.info(f"[{i + 1}/{len(pages)}] Skipping empty page: {page.title}")
-                    continue
-
-                # Call encoder API
-                sparse_vector = encoder.encode(page.content)
-
-                doc = {
-                    "title": page.title,
-                    "content": page.content,
-                    "content_vector": sparse_vector,
-                    "source_url": page.source_url,
-                }
-                batch.append(doc)
-
-                if len(batch) >= BATCH_SIZE:
-                    es.bulk_index(batch)
-                    indexed_count += len(batch)
-                    elapsed = time.time() - start_time
-                    logger.info(
-                        f"[{i + 1}/{len(pages)}] Indexed {indexed_count} docs "
-                        f"({elapsed:.1f}s elapsed)"
-                    )
-                    batch = []
-
-            except Exception as e:
-                logger.error(f"Failed to process '{page.title}': {e}")
-                continue
-
-        # Index remaining batch
-        if batch:
-            es.bulk_index(batch)
-            indexed_count += len(batch)
-
-        elapsed = time.time() - start_time
-        logger.info("=== Ingestion complete ===")
-        logger.info(f"Total indexed: {indexed_count} documents in {elapsed:.1f}s")
-        logger.info(f"Index document count: {es.count()}")
+        logger.info("Listing pages from " + ("the export..." if export else "Cosense..."))
+        metas = cosense.list_pages()
+        logger.info(f"Listed {len(metas)} pages total.")
+
+        if settings.search_backend == "embedded":
+            build_sparse_index(metas, cosense.project, encoder, full=full, export=export)
+        elif full or not es.exists():
+            logger.info("Mode: full rebuild into a new index")
+            rebuild(metas, encoder, es, export=export)
+        else:
+            logger.info("Mode: incremental")
+            update(metas, cosense.project, encoder, es, bulk_load=bulk_load, export=export)
+        metrics.LAST_SUCCESS.set_to_current_time()
 
     finally:
+        metrics.push()
+        if encoder.cache_stats():
+            logger.info(f"Encoding cache: {encoder.cache_stats()}")
         cosense.close()
         encoder.close()
         es.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest Cosense pages into Elasticsearch.")
+    parser.add_argument(
+        "--full", action="store_true", help="Rebuild every page into a new index and switch the alias"
+    )
+    parser.add_argument(
+        "--bulk-load",
+        action="store_true",
+        help="Disable refresh and replicas during an incremental update",
+    )
+    parser.add_argument(
+        "--export",
+        metavar="PATH",
+        help="Read pages from a Cosense project export (.json or .json.gz) instead of the API",
+    )
+    args = parser.parse_args()
+
     try:
-        main()
+        main(full=args.full, bulk_load=args.bulk_load, export_path=args.export)
     except KeyboardInterrupt:
         logger.info("Interrupted by user.")
         sys.exit(1)
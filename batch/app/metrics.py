@@ -0,0 +1,54 @@
+"""Prometheus metrics for ingestion runs.
+
+Ingestion is a short-lived job, so metrics live in their own registry and
+are pushed to a Pushgateway at the end of a run when
+``settings.metrics_pushgateway_url`` is set.
+"""
+
+import logging
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    push_to_gateway,
+)
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+registry = CollectorRegistry()
+
+STAGE_SECONDS = Histogram(
+    "ingest_stage_call_duration_seconds",
+    "Duration of one call of a pipeline stage (a page fetch, an encode batch, a bulk request)",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+    registry=registry,
+)
+STAGE_ITEMS = Counter(
+    "ingest_stage_items_total", "Items processed by each stage", ["stage"], registry=registry
+)
+STAGE_ERRORS = Counter(
+    "ingest_stage_errors_total", "Items that failed in each stage", ["stage"], registry=registry
+)
+RUN_SECONDS = Gauge(
+    "ingest_run_duration_seconds", "Wall time of the last pipeline run", registry=registry
+)
+LAST_SUCCESS = Gauge(
+    "ingest_last_success_timestamp_seconds",
+    "When an ingestion run last finished without failing",
+    registry=registry,
+)
+
+
+def push() -> None:
+    """Push the run's metrics to the Pushgateway, if one is configured."""
+    if not settings.metrics_pushgateway_url:
+        return
+    try:
+        push_to_gateway(settings.metrics_pushgateway_url, job="cosense_ingest", registry=registry)
+    except Exception as e:
+        logger.warning(f"Failed to push metrics: {e}")
@@ -0,0 +1,332 @@
+"""Streaming fetch → chunk/encode → index pipeline.
+
+Each stage runs its own pool of asyncio workers and hands work to the next
+stage through a bounded queue, so at most a fixed number of pages is held in
+memory regardless of project size, and the network, the encoder and
+Elasticsearch are kept busy at the same time. Pages come from the Cosense
+API, fetched concurrently, or from a project export, read sequentially.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from app import metrics
+from app.async_cosense_client import AsyncCosenseClient
+from app.chunker import chunk_text
+from app.config import settings
+from app.cosense_client import CosensePage, CosensePageMeta
+from app.cosense_export import CosenseExport
+from app.encoder_client import EncoderClient
+from app.es_client import ESClient, document_id, passage_id
+from app.sparse_index import SparseIndexWriter
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+# chunk_index of the marker document indexed for a page without content
+EMPTY_PAGE_CHUNK_INDEX = -1
+
+
+def _title(doc: dict[str, Any]) -> str:
+    # Empty-page markers carry no title, only the page URL
+    return doc.get("title") or doc["source_url"]
+
+
+@dataclass
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+
+    name: str
+    items: int = 0
+    calls: int = 0
+    busy_seconds: float = 0.0
+    errors: int = 0
+
+    def record(self, items: int, seconds: float) -> None:
+        self.items += items
+        self.calls += 1
+        self.busy_seconds += seconds
+        metrics.STAGE_SECONDS.labels(self.name).observe(seconds)
+        metrics.STAGE_ITEMS.labels(self.name).inc(items)
+
+    def summary(self, wall_seconds: float) -> str:
+        rate = self.items / wall_seconds if wall_seconds > 0 else 0.0
+        return (
+            f"{self.name}: {self.items} items in {self.calls} calls, "
+            f"{rate:.1f} items/s, busy {self.busy_seconds:.1f}s, {self.errors} errors"
+        )
+
+
+@dataclass
+class PipelineResult:
+    """Outcome of a pipeline run."""
+
+    indexed: int = 0  # documents: passages, plus one marker per empty page
+    skipped: int = 0  # empty pages
+    failed: list[str] = field(default_factory=list)
+    stages: list[StageStats] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+class IngestPipeline:
+    """Fetches, encodes and indexes pages as three concurrent stages."""
+
+    def __init__(
+        self,
+        cosense: AsyncCosenseClient | CosenseExport,
+        encoder: EncoderClient,
+        es: ESClient | SparseIndexWriter,
+        batch_size: int | None = None,
+        fetch_concurrency: int | None = None,
+        encode_concurrency: int | None = None,
+        index_concurrency: int | None = None,
+        queue_size: int | None = None,
+        replace_existing: bool = True,
+    ) -> None:
+        self.cosense = cosense
+        self.encoder = encoder
+        self.es = es
+        # Remove passages left over from longer previous versions of a page
+        self.replace_existing = replace_existing
+        self.batch_size = batch_size or settings.ingest_batch_size
+        self.fetch_concurrency = fetch_concurrency or settings.cosense_concurrency
+        self.encode_concurrency = encode_concurrency or settings.encode_concurrency
+        self.index_concurrency = index_concurrency or settings.index_concurrency
+        queue_size = queue_size or settings.pipeline_queue_size
+        self._pages: asyncio.Queue[Any] = asyncio.Queue(maxsize=queue_size)
+        self._docs: asyncio.Queue[Any] = asyncio.Queue(
+            maxsize=max(1, queue_size // self.batch_size)
+        )
+        self.fetch_stats = StageStats("fetch")
+        self.encode_stats = StageStats("encode")
+        self.index_stats = StageStats("index")
+        self.result = PipelineResult(
+            stages=[self.fetch_stats, self.encode_stats, self.index_stats]
+        )
+
+    async def run(self, metas: list[CosensePageMeta]) -> PipelineResult:
+        """Run all stages over ``metas`` and wait for the last document to be indexed."""
+        start = time.perf_counter()
+        pending = iter(metas)
+        total = len(metas)
+
+        if isinstance(self.cosense, CosenseExport):
+            # An export is a single stream, read by one worker
+            fetchers = [asyncio.create_task(self._read_worker(self.cosense, metas))]
+        else:
+            fetchers = [
+                asyncio.create_task(self._fetch_worker(pending))
+                for _ in range(self.fetch_concurrency)
+            ]
+        encoders = [
+            asyncio.create_task(self._encode_worker()) for _ in range(self.encode_concurrency)
+        ]
+        indexers = [
+            asyncio.create_task(self._index_worker()) for _ in range(self.index_concurrency)
+        ]
+        reporter = asyncio.create_task(self._report(start, total))
+
+        try:
+            await self._finish(fetchers, self._pages, len(encoders))
+            await self._finish(encoders, self._docs, len(indexers))
+            await asyncio.gather(*indexers)
+        finally:
+            reporter.cancel()
+            for task in [*fetchers, *encoders, *indexers]:
+                task.cancel()
+
+        self.result.failed.extend(self.cosense.failed)
+        self.result.elapsed = time.perf_counter() - start
+        metrics.RUN_SECONDS.set(self.result.elapsed)
+        for stats in self.result.stages:
+            metrics.STAGE_ERRORS.labels(stats.name).inc(stats.errors)
+            logger.info(stats.summary(self.result.elapsed))
+        return self.result
+
+    @staticmethod
+    async def _finish(
+        workers: list[asyncio.Task[None]], queue: asyncio.Queue[Any], consumers: int
+    ) -> None:
+        """Wait for a stage's workers, then tell each downstream worker to stop."""
+        await asyncio.gather(*workers)
+        for _ in range(consumers):
+            await queue.put(_DONE)
+
+    async def _fetch_worker(self, pending: Iterator[CosensePageMeta]) -> None:
+        for meta in pending:
+            start = time.perf_counter()
+            page = await self.cosense.fetch_page(meta)
+            if page is None:
+                self.fetch_stats.errors += 1
+                continue
+            self.fetch_stats.record(1, time.perf_counter() - start)
+            await self._pages.put(page)
+
+    async def _read_worker(self, export: CosenseExport, metas: list[CosensePageMeta]) -> None:
+        start = time.perf_counter()
+        async for page in export.iter_pages(metas):
+            self.fetch_stats.record(1, time.perf_counter() - start)
+            await self._pages.put(page)
+            start = time.perf_counter()
+        self.fetch_stats.errors += len(export.failed)
+
+    async def _next_batch(self) -> tuple[list[CosensePage], bool]:
+        """Take up to ``batch_size`` pages, waiting only for the first one."""
+        batch: list[CosensePage] = []
+        item = await self._pages.get()
+        while item is not _DONE:
+            batch.append(item)
+            if len(batch) >= self.batch_size or self._pages.empty():
+                return batch, False
+            item = self._pages.get_nowait()
+        return batch, True
+
+    async def _encode_worker(self) -> None:
+        done = False
+        while not done:
+            pages, done = await self._next_batch()
+            batch = [page for page in pages if page.content.strip()]
+            empty = [self._empty_page_marker(page) for page in pages if not page.content.strip()]
+            self.result.skipped += len(empty)
+            if empty:
+                await self._docs.put(empty)
+            if not batch:
+                continue
+
+            docs: list[dict[str, Any]] = []
+            for page in batch:
+                page_id = document_id(self.cosense.project, page.title)
+                for passage in chunk_text(page.content):
+                    docs.append(
+                        {
+                            "_id": passage_id(page_id, passage.index),
+                            "page_id": page_id,
+                            "chunk_index": passage.index,
+                            "title": page.title,
+                            "content": passage.text,
+                            "source_url": page.source_url,
+                            "updated_at": page.updated * 1000,
+                        }
+                    )
+
+            start = time.perf_counter()
+            try:
+                # The title gives each passage its page's topic when encoded
+                vectors = await asyncio.to_thread(
+                    self.encoder.encode_batch,
+                    [
+                        doc["content"]
+                        if doc["content"].startswith(doc["title"])
+                        else f"{doc['title']}\n{doc['content']}"
+                        for doc in docs
+                    ],
+                )
+            except Exception as e:
+                self.encode_stats.errors += len(batch)
+                self.result.failed.extend(page.title for page in batch)
+                logger.error(f"Failed to encode {len(batch)} pages: {e}")
+                continue
+            self.encode_stats.record(len(docs), time.perf_counter() - start)
+
+            for doc, vector in zip(docs, vectors):
+                doc["content_vector"] = vector
+            await self._docs.put(docs)
+
+    def _empty_page_marker(self, page: CosensePage) -> dict[str, Any]:
+        """A document recording an empty page's ``updated`` timestamp.
+
+        It has no title, content or vector, so it never matches a search,
+        but it keeps incremental runs from fetching the page again, and
+        indexing it removes the passages of the page's previous version.
+        """
+        page_id = document_id(self.cosense.project, page.title)
+        return {
+            "_id": passage_id(page_id, EMPTY_PAGE_CHUNK_INDEX),
+            "page_id": page_id,
+            "chunk_index": EMPTY_PAGE_CHUNK_INDEX,
+            "source_url": page.source_url,
+            "updated_at": page.updated * 1000,
+        }
+
+    async def _next_docs(self) -> tuple[list[dict[str, Any]], bool]:
+        """Take encoded documents until a bulk request's worth is gathered or the queue is empty."""
+        docs: list[dict[str, Any]] = []
+        item = await self._docs.get()
+        while item is not _DONE:
+            docs.extend(item)
+            if len(docs) >= settings.bulk_chunk_size or self._docs.empty():
+                return docs, False
+            item = self._docs.get_nowait()
+        return docs, True
+
+    async def _index_worker(self) -> None:
+        done = False
+        while not done:
+            docs, done = await self._next_docs()
+            if not docs:
+                continue
+
+            start = time.perf_counter()
+            try:
+                bulk = await asyncio.to_thread(self.es.bulk_index, docs)
+            except Exception as e:
+                self.index_stats.errors += len(docs)
+                self.result.failed.extend(_title(doc) for doc in docs)
+                logger.error(f"Failed to index {len(docs)} documents: {e}")
+                continue
+            self.index_stats.record(bulk.indexed, time.perf_counter() - start)
+            self.result.indexed += bulk.indexed
+
+            if bulk.errors:
+                titles = {doc["_id"]: _title(doc) for doc in docs}
+                self.index_stats.errors += len(bulk.errors)
+                self.result.failed.extend(
+                    {titles.get(error.get("_id"), str(error.get("_id"))) for error in bulk.errors}
+                )
+
+            if self.replace_existing:
+                counts: dict[str, int] = {}
+                for doc in docs:
+                    counts[doc["page_id"]] = max(counts.get(doc["page_id"], 0), doc["chunk_index"] + 1)
+                try:
+                    await asyncio.to_thread(self.es.delete_stale_passages, counts)
+                except Exception as e:
+                    logger.warning(f"Failed to delete stale passages: {e}")
+
+    async def _report(self, start: float, total: int) -> None:
+        """Log progress and queue depths periodically."""
+        while True:
+            await asyncio.sleep(settings.pipeline_log_interval_seconds)
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"[{self.fetch_stats.items}/{total} fetched, {self.encode_stats.items} encoded, "
+                f"{self.index_stats.items} indexed] queues: pages={self._pages.qsize()} "
+                f"docs={self._docs.qsize()} ({elapsed:.1f}s elapsed)"
+            )
+
+
+async def run_pipeline(
+    metas: list[CosensePageMeta],
+    encoder: EncoderClient,
+    es: ESClient | SparseIndexWriter,
+    replace_existing: bool = True,
+    export: CosenseExport | None = None,
+) -> PipelineResult:
+    """Run the ingestion pipeline over ``metas``.
+
+    Pages are read from ``export`` when given, otherwise fetched with a fresh
+    Cosense client.
+    """
+    if export is not None:
+        pipeline = IngestPipeline(export, encoder, es, replace_existing=replace_existing)
+        return await pipeline.run(metas)
+    cosense = AsyncCosenseClient()
+    try:
+        pipeline = IngestPipeline(cosense, encoder, es, replace_existing=replace_existing)
+        return await pipeline.run(metas)
+    finally:
+        await cosense.close()
@@ -0,0 +1,182 @@
+"""Embedded sparse inverted index written as memory-mappable NumPy files.
+
+An index version is a directory containing:
+
+    vocab.json       token strings; a token's id is its position
+    indptr.npy       int64[len(vocab) + 1], CSR row pointers (one row per token)
+    doc_ids.npy      int32 postings: document ids of each token's row
+    weights.npy      float32 postings: the token's weight in each document
+    docs.jsonl       one JSON object per document (title, content, source_url, ...)
+    doc_offsets.npy  int64[documents + 1], byte offset of each line of docs.jsonl
+    meta.json        generation marker and counts
+
+Versions live next to each other under the index root, and a ``current``
+symlink is switched atomically once a version is complete, so the backend
+never reads a partially written index.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+
+from app.config import settings
+from app.es_client import BulkResult
+
+logger = logging.getLogger(__name__)
+
+CURRENT = "current"
+
+
+class SparseIndex:
+    """Read-only view of one index version, memory-mapped from disk."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with open(path / "vocab.json", encoding="utf-8") as f:
+            self.vocab: list[str] = json.load(f)
+        self.indptr = np.load(path / "indptr.npy", mmap_mode="r")
+        self.doc_ids = np.load(path / "doc_ids.npy", mmap_mode="r")
+        self.weights = np.load(path / "weights.npy", mmap_mode="r")
+        with open(path / "docs.jsonl", encoding="utf-8") as f:
+            self.docs: list[dict[str, Any]] = [json.loads(line) for line in f]
+        with open(path / "meta.json", encoding="utf-8") as f:
+            self.meta: dict[str, Any] = json.load(f)
+
+    @classmethod
+    def open_current(cls, root: str | None = None) -> "SparseIndex | None":
+        """Open the version the ``current`` symlink points to, if any."""
+        current = Path(root or settings.sparse_index_path) / CURRENT
+        if not current.exists():
+            return None
+        return cls(current.resolve())
+
+    def document_vectors(self) -> Iterator[tuple[dict[str, Any], dict[str, float]]]:
+        """Yield each document with its sparse vector, rebuilt from the postings."""
+        token_ids = np.repeat(
+            np.arange(len(self.vocab), dtype=np.int64), np.diff(self.indptr)
+        )
+        order = np.argsort(self.doc_ids, kind="stable")
+        doc_ptr = np.searchsorted(self.doc_ids[order], np.arange(len(self.docs) + 1))
+        for doc_id, doc in enumerate(self.docs):
+            rows = order[doc_ptr[doc_id] : doc_ptr[doc_id + 1]]
+            yield doc, {
+                self.vocab[t]: float(w) for t, w in zip(token_ids[rows], self.weights[rows])
+            }
+
+    def updated_map(self) -> dict[str, int]:
+        """Return the updated_at value (epoch millis) of every indexed page by page_id."""
+        return {doc["page_id"]: doc.get("updated_at") or 0 for doc in self.docs}
+
+
+class SparseIndexWriter:
+    """Builds a new index version from documents with sparse vectors.
+
+    Exposes ``bulk_index`` and ``delete_stale_passages`` like ``ESClient`` so
+    it can be the index stage of the ingestion pipeline.
+    """
+
+    def __init__(self, root: str | None = None) -> None:
+        self.root = Path(root or settings.sparse_index_path)
+        self.vocab: dict[str, int] = {}
+        self.docs: list[dict[str, Any]] = []
+        self._tokens: list[np.ndarray] = []
+        self._weights: list[np.ndarray] = []
+        self._doc_ids: list[np.ndarray] = []
+        # The pipeline calls bulk_index from several worker threads
+        self._lock = threading.Lock()
+
+    def add(self, doc: dict[str, Any], vector: dict[str, float]) -> None:
+        """Add one document and its sparse vector."""
+        with self._lock:
+            self._add(doc, vector)
+
+    def _add(self, doc: dict[str, Any], vector: dict[str, float]) -> None:
+        doc_id = len(self.docs)
+        self.docs.append({k: v for k, v in doc.items() if k not in ("_id", "content_vector")})
+        tokens = np.fromiter(
+            (self.vocab.setdefault(token, len(self.vocab)) for token in vector),
+            dtype=np.int64,
+            count=len(vector),
+        )
+        self._tokens.append(tokens)
+        self._weights.append(np.fromiter(vector.values(), dtype=np.float32, count=len(vector)))
+        self._doc_ids.append(np.full(len(vector), doc_id, dtype=np.int32))
+
+    def bulk_index(self, documents: list[dict[str, Any]]) -> BulkResult:
+        for doc in documents:
+            # Empty-page markers have no vector
+            self.add(doc, doc.get("content_vector", {}))
+        return BulkResult(indexed=len(documents))
+
+    def delete_stale_passages(self, passage_counts: dict[str, int]) -> None:
+        # Every version is built from scratch, so there is nothing to delete.
+        pass
+
+    def commit(self) -> Path:
+        """Write the version to disk, point ``current`` at it and remove old versions."""
+        tokens = np.concatenate(self._tokens) if self._tokens else np.empty(0, np.int64)
+        weights = np.concatenate(self._weights) if self._weights else np.empty(0, np.float32)
+        doc_ids = np.concatenate(self._doc_ids) if self._doc_ids else np.empty(0, np.int32)
+
+        # Sort postings by token to get the CSR layout (token rows, document columns)
+        order = np.argsort(tokens, kind="stable")
+        indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tokens, minlength=len(self.vocab)), out=indptr[1:])
+
+        stamp = time.strftime("%Y%m%d%H%M%S")
+        version = self.root / f"v{stamp}"
+        suffix = 0
+        while version.exists():  # another version was written within the same second
+            suffix += 1
+            version = self.root / f"v{stamp}_{suffix}"
+        version.mkdir(parents=True, exist_ok=False)
+        np.save(version / "indptr.npy", indptr)
+        np.save(version / "doc_ids.npy", doc_ids[order])
+        np.save(version / "weights.npy", weights[order])
+        vocab = sorted(self.vocab, key=self.vocab.__getitem__)
+        with open(version / "vocab.json", "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        offsets = np.zeros(len(self.docs) + 1, dtype=np.int64)
+        with open(version / "docs.jsonl", "wb") as f:
+            for i, doc in enumerate(self.docs):
+                offsets[i + 1] = offsets[i] + f.write(
+                    (json.dumps(doc, ensure_ascii=False) + "\n").encode("utf-8")
+                )
+        np.save(version / "doc_offsets.npy", offsets)
+        with open(version / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "generation": str(time.time_ns()),
+                    "documents": len(self.docs),
+                    "vocabulary": len(vocab),
+                    "postings": int(len(doc_ids)),
+                },
+                f,
+            )
+
+        # Atomically repoint the current symlink
+        link = self.root / f".{CURRENT}.tmp"
+        if link.is_symlink():
+            link.unlink()
+        link.symlink_to(version.name)
+        os.replace(link, self.root / CURRENT)
+        logger.info(
+            f"Sparse index '{version}' written: {len(self.docs)} documents, "
+            f"{len(vocab)} tokens, {len(doc_ids)} postings."
+        )
+
+        self._cleanup(keep=settings.rebuild_keep_versions, live=version)
+        return version
+
+    def _cleanup(self, keep: int, live: Path) -> None:
+        stale = sorted(p for p in self.root.glob("v*") if p.is_dir() and p != live)
+        for path in stale[: max(0, len(stale) - keep)]:
+            shutil.rmtree(path)
+            logger.info(f"Sparse index '{path}' deleted.")
@@ -0,0 +1,77 @@
+"""Incremental parsing of Cosense project exports."""
+
+import asyncio
+import json
+import threading
+from io import StringIO
+from pathlib import Path
+from typing import TextIO
+
+import pytest
+
+from app.cosense_export import CosenseExport, iter_export_pages
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 12))
+def test_values_split_across_chunks(chunk_size: int) -> None:
+    text = '{"pages":[1.25e10, 12345, true, null, -0.5E-3, "abc", {"a": [1, 2.5]}, 7]}'
+    pages = list(iter_export_pages(StringIO(text), chunk_size=chunk_size))
+    assert pages == json.loads(text)["pages"]
+
+
+def test_project_from_export_name(tmp_path: Path) -> None:
+    path = tmp_path / "export.json"
+    data = {"name": "exported", "pages": [{"title": "a", "updated": 1, "lines": ["a", "b"]}]}
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+    export = CosenseExport(path, chunk_size=4)
+    assert [meta.title for meta in export.list_pages()] == ["a"]
+    assert export.project == "exported"
+    [page] = export.read_pages(export.list_pages())
+    assert page.source_url.endswith("/exported/a")
+
+    given = CosenseExport(path, project="given")
+    given.list_pages()
+    assert given.project == "given"
+
+
+class SlowExport(CosenseExport):
+    """Export whose reads block until the test lets them through."""
+
+    def __init__(self, path: Path, gate: threading.Event) -> None:
+        super().__init__(path, project="test", chunk_size=16)
+        self.gate = gate
+
+    def _open(self) -> TextIO:
+        stream = super()._open()
+        read = stream.read
+
+        def slow_read(size: int = -1) -> str:
+            self.gate.wait(5)
+            return read(size)
+
+        stream.read = slow_read  # type: ignore[method-assign]
+        return stream
+
+
+def test_cancelled_while_reading(tmp_path: Path) -> None:
+    path = tmp_path / "export.json"
+    data = {"pages": [{"title": f"p{i}", "lines": [f"p{i}", "x" * 100]} for i in range(5)]}
+    path.write_text(json.dumps(data), encoding="utf-8")
+    gate = threading.Event()
+    gate.set()
+    export = SlowExport(path, gate)
+
+    async def consume() -> None:
+        async for _ in export.iter_pages(export.list_pages()):
+            gate.clear()  # the next read blocks in its thread
+
+    async def scenario() -> None:
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        asyncio.get_running_loop().call_later(0.1, gate.set)
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
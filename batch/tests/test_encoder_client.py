@@ -0,0 +1,52 @@
+"""Document encoding through the persistent encoding cache."""
+
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.encoder_client import EncoderClient
+from app.encoding_cache import EncodingCache
+
+
+class FakeEncoderAPI:
+    """Encoder endpoints whose vectors depend on the current pruning settings."""
+
+    def __init__(self, pruning: str) -> None:
+        self.pruning = pruning
+        self.encoded: list[str] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/health":
+            return httpx.Response(200, json={"pruning": {"document": self.pruning}})
+        texts = json.loads(request.content)["texts"]
+        self.encoded.extend(texts)
+        return httpx.Response(200, json={"vectors": [{self.pruning: 1.0} for _ in texts]})
+
+
+def client(api: FakeEncoderAPI, path: Path) -> EncoderClient:
+    encoder = EncoderClient(cache=EncodingCache(path=str(path), model="model"))
+    encoder._client = httpx.Client(base_url="http://encoder", transport=httpx.MockTransport(api))
+    return encoder
+
+
+def test_cache_is_keyed_on_document_pruning(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "encoder_wire_format", "json")
+    path = tmp_path / "vectors.sqlite"
+
+    api = FakeEncoderAPI("top_n=100")
+    first = client(api, path)
+    assert first.encode_batch(["a", "b"]) == [{"top_n=100": 1.0}] * 2
+    assert first.encode_batch(["a", "b"]) == [{"top_n=100": 1.0}] * 2
+    assert api.encoded == ["a", "b"]
+    first.close()
+
+    api = FakeEncoderAPI("top_n=50")
+    second = client(api, path)
+    assert second.encode_batch(["a", "c"]) == [{"top_n=50": 1.0}] * 2
+    assert api.encoded == ["a", "c"]
+    second.close()
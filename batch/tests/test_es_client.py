@@ -0,0 +1,174 @@
+"""Index alias management and document cleanup against an in-memory Elasticsearch."""
+
+import fnmatch
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.es_client import ESClient, passage_id
+
+ALIAS = "pages"
+
+
+def matches(query: dict[str, Any], doc: dict[str, Any]) -> bool:
+    """Evaluate the subset of the query DSL that delete queries use."""
+    [(kind, body)] = query.items()
+    if kind == "bool":
+        return (
+            all(matches(q, doc) for q in body.get("filter", []))
+            and not any(matches(q, doc) for q in body.get("must_not", []))
+            and (not body.get("should") or any(matches(q, doc) for q in body["should"]))
+        )
+    if kind == "term":
+        [(field_name, value)] = body.items()
+        return doc.get(field_name) == value
+    if kind == "range":
+        [(field_name, bounds)] = body.items()
+        value = doc.get(field_name)
+        return value is not None and bounds["gte"] <= value < bounds["lt"]
+    if kind == "ids":
+        return doc["_id"] in body["values"]
+    raise ValueError(f"Unsupported query: {kind}")
+
+
+class FakeIndices:
+    """The ``indices`` API over a map of index name to its aliases."""
+
+    def __init__(self, indices: dict[str, set[str]]) -> None:
+        self.indices = indices
+        self.alias_updates: list[list[dict[str, Any]]] = []
+        self.deleted: list[str] = []
+
+    def exists(self, index: str) -> bool:
+        return index in self.indices or self.exists_alias(index)
+
+    def exists_alias(self, name: str) -> bool:
+        return any(name in aliases for aliases in self.indices.values())
+
+    def get_alias(self, name: str) -> SimpleNamespace:
+        return SimpleNamespace(
+            body={index: {} for index, aliases in self.indices.items() if name in aliases}
+        )
+
+    def get(self, index: str, **kwargs: Any) -> SimpleNamespace:
+        return SimpleNamespace(body={name: {} for name in fnmatch.filter(self.indices, index)})
+
+    def update_aliases(self, actions: list[dict[str, Any]]) -> None:
+        self.alias_updates.append(actions)
+        for action in actions:
+            [(kind, target)] = action.items()
+            if kind == "add":
+                self.indices[target["index"]].add(target["alias"])
+            elif kind == "remove":
+                self.indices[target["index"]].remove(target["alias"])
+            else:
+                del self.indices[target["index"]]
+
+    def delete(self, index: str) -> None:
+        self.deleted.append(index)
+        del self.indices[index]
+
+
+class FakeElasticsearch:
+    """Documents of one index and the indices API."""
+
+    def __init__(self, indices: dict[str, set[str]], docs: list[dict[str, Any]]) -> None:
+        self.indices = FakeIndices(indices)
+        self.docs = docs
+        self.delete_queries = 0
+
+    def delete_by_query(self, index: str, query: dict[str, Any], **kwargs: Any) -> None:
+        self.delete_queries += 1
+        self.docs[:] = [doc for doc in self.docs if not matches(query, doc)]
+
+
+def client(
+    indices: dict[str, set[str]], docs: list[dict[str, Any]] | None = None
+) -> tuple[ESClient, FakeElasticsearch]:
+    es = ESClient(url="http://localhost:9200", index=ALIAS)
+    fake = FakeElasticsearch(indices, docs if docs is not None else [])
+    es._client = fake  # type: ignore[assignment]
+    return es, fake
+
+
+def test_switch_alias_moves_it_in_one_update() -> None:
+    es, fake = client({"pages_1": {ALIAS}, "pages_2": set()})
+    es.switch_alias("pages_2")
+    assert fake.indices.alias_updates == [
+        [
+            {"remove": {"index": "pages_1", "alias": ALIAS}},
+            {"add": {"index": "pages_2", "alias": ALIAS}},
+        ]
+    ]
+    assert es.aliased_indices() == ["pages_2"]
+
+
+def test_switch_alias_first_time() -> None:
+    es, fake = client({"pages_1": set()})
+    es.switch_alias("pages_1")
+    assert fake.indices.alias_updates == [[{"add": {"index": "pages_1", "alias": ALIAS}}]]
+
+
+def test_switch_alias_replaces_a_legacy_index() -> None:
+    es, fake = client({ALIAS: set(), "pages_1": set()})
+    es.switch_alias("pages_1")
+    assert fake.indices.alias_updates == [
+        [
+            {"remove_index": {"index": ALIAS}},
+            {"add": {"index": "pages_1", "alias": ALIAS}},
+        ]
+    ]
+    assert fake.indices.indices == {"pages_1": {ALIAS}}
+
+
+@pytest.mark.parametrize(
+    "keep, deleted",
+    [(0, ["pages_1", "pages_2", "pages_4"]), (1, ["pages_1", "pages_2"]), (5, [])],
+)
+def test_cleanup_keeps_the_live_and_newest_versions(keep: int, deleted: list[str]) -> None:
+    es, fake = client(
+        {
+            "pages_4": set(),  # a newer build that failed before the switch
+            "pages_3": {ALIAS},
+            "pages_2": set(),
+            "pages_1": set(),
+            "other_1": set(),
+        }
+    )
+    assert es.cleanup_old_versions(keep=keep) == deleted
+    assert fake.indices.deleted == deleted
+    assert "pages_3" in fake.indices.indices and "other_1" in fake.indices.indices
+
+
+def passage(page_id: str, chunk_index: int) -> dict[str, Any]:
+    return {"_id": passage_id(page_id, chunk_index), "page_id": page_id, "chunk_index": chunk_index}
+
+
+def test_delete_stale_passages_keeps_the_current_chunk_range() -> None:
+    docs = [
+        *(passage("shrunk", i) for i in (-1, 0, 1, 2, 3)),
+        *(passage("emptied", i) for i in (-1, 0, 1)),
+        *(passage("refilled", i) for i in (-1, 0)),
+        *(passage("untouched", i) for i in (0, 5)),
+        {"_id": "shrunk", "title": "page-level document from before chunking"},
+    ]
+    es, _ = client({}, docs)
+    es.delete_stale_passages({"shrunk": 2, "emptied": 0, "refilled": 1})
+
+    assert sorted(doc["_id"] for doc in docs) == sorted(
+        [
+            passage_id("shrunk", 0),
+            passage_id("shrunk", 1),
+            passage_id("emptied", -1),
+            passage_id("refilled", 0),
+            passage_id("untouched", 0),
+            passage_id("untouched", 5),
+        ]
+    )
+
+
+def test_delete_stale_passages_without_pages() -> None:
+    es, fake = client({}, [passage("a", 3)])
+    es.delete_stale_passages({})
+    assert fake.delete_queries == 0
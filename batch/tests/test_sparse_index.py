@@ -0,0 +1,145 @@
+"""Embedded sparse index builds from a project export, without external services."""
+
+import json
+import threading
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.config import settings
+from app.cosense_export import CosenseExport
+from app.es_client import document_id
+from app.ingest import build_sparse_index
+from app.sparse_index import SparseIndex, SparseIndexWriter
+
+PROJECT = "test"
+
+
+class FakeEncoder:
+    """Encodes a text as its words weighted by length, and records what it was sent."""
+
+    def __init__(self, fail_on: str | None = None) -> None:
+        self.fail_on = fail_on
+        self.texts: list[str] = []
+        self._lock = threading.Lock()
+
+    def encode_batch(self, texts: list[str]) -> list[dict[str, float]]:
+        if self.fail_on and any(self.fail_on in text for text in texts):
+            raise RuntimeError("encoder down")
+        with self._lock:
+            self.texts.extend(texts)
+        return [{word: float(len(word)) for word in text.split()} for text in texts]
+
+
+@pytest.fixture
+def index_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    root = tmp_path / "index"
+    monkeypatch.setattr(settings, "sparse_index_path", str(root))
+    return root
+
+
+def export(path: Path, pages: dict[str, tuple[int, str]]) -> CosenseExport:
+    """Write an export with ``title: (updated, body)`` pages and open it."""
+    data = {
+        "name": PROJECT,
+        "pages": [
+            {"title": title, "updated": updated, "lines": [title, *body.splitlines()]}
+            for title, (updated, body) in pages.items()
+        ],
+    }
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    return CosenseExport(path, project=PROJECT)
+
+
+def build(source: CosenseExport, encoder: FakeEncoder, full: bool = False) -> SparseIndex:
+    build_sparse_index(source.list_pages(), PROJECT, encoder, full=full, export=source)
+    index = SparseIndex.open_current()
+    assert index is not None
+    return index
+
+
+def pages(index: SparseIndex) -> dict[str, list[tuple[dict[str, Any], dict[str, float]]]]:
+    by_page: dict[str, list[tuple[dict[str, Any], dict[str, float]]]] = {}
+    for doc, vector in index.document_vectors():
+        by_page.setdefault(doc["page_id"], []).append((doc, vector))
+    return by_page
+
+
+def test_writer_round_trip(tmp_path: Path) -> None:
+    writer = SparseIndexWriter(str(tmp_path))
+    entries = [
+        ({"page_id": "a", "chunk_index": 0, "title": "a", "updated_at": 1}, {"x": 1.5, "y": 0.5}),
+        ({"page_id": "b", "chunk_index": 0, "title": "b", "updated_at": 2}, {"y": 2.0}),
+        ({"page_id": "c", "chunk_index": -1, "updated_at": 3}, {}),
+    ]
+    for doc, vector in entries:
+        writer.add({"_id": "ignored", **doc}, vector)
+    version = writer.commit()
+
+    index = SparseIndex.open_current(str(tmp_path))
+    assert index is not None and index.path == version
+    assert list(index.document_vectors()) == entries
+    assert index.updated_map() == {"a": 1, "b": 2, "c": 3}
+
+
+def test_unchanged_pages_are_carried_over(tmp_path: Path, index_root: Path) -> None:
+    first = build(
+        export(
+            tmp_path / "v1.json",
+            {"alpha": (100, "one two"), "beta": (100, "three"), "gamma": (100, "four")},
+        ),
+        FakeEncoder(),
+    )
+    before = pages(first)
+
+    encoder = FakeEncoder()
+    second = build(
+        export(
+            tmp_path / "v2.json",
+            {"alpha": (100, "one two"), "beta": (200, "three five"), "delta": (200, "six")},
+        ),
+        encoder,
+    )
+    after = pages(second)
+
+    assert second.path != first.path
+    assert [text.splitlines()[0] for text in encoder.texts] == ["beta", "delta"]
+    alpha = document_id(PROJECT, "alpha")
+    assert after[alpha] == before[alpha]
+    assert document_id(PROJECT, "gamma") not in after
+    assert second.updated_map()[document_id(PROJECT, "beta")] == 200_000
+
+
+def test_failed_pages_keep_their_previous_passages(
+    tmp_path: Path, index_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "ingest_batch_size", 1)  # only the failing page fails
+    first = build(
+        export(tmp_path / "v1.json", {"alpha": (100, "one"), "beta": (100, "two")}),
+        FakeEncoder(),
+    )
+    source = export(tmp_path / "v2.json", {"alpha": (200, "changed"), "beta": (200, "three")})
+
+    alpha = document_id(PROJECT, "alpha")
+    for full in (False, True):
+        index = build(source, FakeEncoder(fail_on="changed"), full=full)
+        assert pages(index)[alpha] == pages(first)[alpha]
+        assert index.updated_map()[document_id(PROJECT, "beta")] == 200_000
+
+
+def test_shrunken_index_is_not_committed(
+    tmp_path: Path, index_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "rebuild_min_doc_ratio", 0.9)
+    first = build(
+        export(tmp_path / "v1.json", {f"page{i}": (100, f"text {i}") for i in range(10)}),
+        FakeEncoder(),
+    )
+
+    source = export(tmp_path / "v2.json", {"page0": (100, "text 0")})
+    with pytest.raises(RuntimeError, match="fewer than 90%"):
+        build_sparse_index(source.list_pages(), PROJECT, FakeEncoder(), export=source)
+
+    current = SparseIndex.open_current()
+    assert current is not None and current.path == first.path
@@ -0,0 +1,149 @@
+"""Load test for the batch ingestion pipeline against local stand-ins.
+
+Starts the stand-ins of ``stubs.py`` and runs ``IngestPipeline`` over
+``--pages`` synthetic Cosense pages at each ``--concurrency`` level (the
+number of concurrent page fetches; encode and bulk workers are scaled as
+in the default settings, one per four fetchers). The encoding cache is
+disabled so every passage is encoded.
+
+One result is reported per stage: items (pages fetched, passages encoded
+or indexed) per second over the run's wall time and p50/p95/p99 of the
+stage's calls (a page fetch, an encode batch, a bulk request), plus the
+peak RSS of the process.
+
+Run with the batch dependencies installed:
+    python bench/ingest_load.py --concurrency 2 8 32 [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from report import Result, format_table, save_results, summarize
+from stubs import StubConfig, run_stubs
+
+BATCH_DIR = Path(__file__).resolve().parent.parent / "batch"
+PROJECT = "bench"
+
+
+def _configure(stub_url: str) -> None:
+    """Point the batch settings at the stand-ins (before ``app`` is imported)."""
+    os.environ.update(
+        {
+            "COSENSE_PROJECT": PROJECT,
+            "COSENSE_BASE_URL": stub_url,
+            "COSENSE_RATE_LIMIT": "0",
+            "SEARCH_BACKEND": "elasticsearch",
+            "ELASTICSEARCH_URL": stub_url,
+            "ENCODER_URL": stub_url,
+            "ENCODING_CACHE_PATH": "",
+            "METRICS_PUSHGATEWAY_URL": "",
+            "PIPELINE_LOG_INTERVAL_SECONDS": "3600",
+        }
+    )
+    sys.path.insert(0, str(BATCH_DIR))
+
+
+async def run_level(concurrency: int, pages: int) -> list[Result]:
+    from app.async_cosense_client import AsyncCosenseClient
+    from app.cosense_client import CosensePageMeta
+    from app.encoder_client import EncoderClient
+    from app.es_client import ESClient
+    from app.pipeline import IngestPipeline, StageStats
+
+    @dataclass
+    class TimedStageStats(StageStats):
+        """StageStats that also keeps every call's duration."""
+
+        durations_ms: list[float] = field(default_factory=list)
+
+        def record(self, items: int, seconds: float) -> None:
+            super().record(items, seconds)
+            self.durations_ms.append(seconds * 1000)
+
+    metas = [
+        CosensePageMeta(title=f"ページ{i}", updated=1_700_000_000 + i) for i in range(pages)
+    ]
+    workers = max(1, concurrency // 4)
+    cosense = AsyncCosenseClient(concurrency=concurrency, rate_limit=0)
+    encoder = EncoderClient()
+    es = ESClient(index=f"{PROJECT}_index")
+    try:
+        pipeline = IngestPipeline(
+            cosense,
+            encoder,
+            es,
+            fetch_concurrency=concurrency,
+            encode_concurrency=workers,
+            index_concurrency=workers,
+        )
+        stages = [TimedStageStats(name) for name in ("fetch", "encode", "index")]
+        pipeline.fetch_stats, pipeline.encode_stats, pipeline.index_stats = stages
+        pipeline.result.stages = list(stages)
+        result = await pipeline.run(metas)
+    finally:
+        await cosense.close()
+        encoder.close()
+        es.close()
+
+    return [
+        summarize(
+            f"ingest_{stats.name}",
+            concurrency,
+            stats.durations_ms,
+            stats.errors,
+            result.elapsed,
+            throughput=stats.items / result.elapsed if result.elapsed else 0.0,
+            calls=stats.calls,
+            pages=pages,
+            passages=result.indexed,
+        )
+        for stats in stages
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--pages", type=int, default=400, help="pages ingested per level")
+    parser.add_argument("--in-process-stubs", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    StubConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    config = StubConfig.from_args(args)
+    output = Path(args.output).resolve() if args.output else None
+    cwd = os.getcwd()
+    results: list[Result] = []
+    # A scratch working directory keeps a local .env and data/ caches out of the run
+    with (
+        run_stubs(config, args.in_process_stubs) as stub_url,
+        tempfile.TemporaryDirectory() as workdir,
+    ):
+        os.chdir(workdir)
+        try:
+            _configure(stub_url)
+            logging.basicConfig(level=logging.WARNING)
+            for level in args.concurrency:
+                level_results = asyncio.run(run_level(level, args.pages))
+                print(format_table(level_results), file=sys.stderr)
+                results.extend(level_results)
+        finally:
+            os.chdir(cwd)
+
+    if output:
+        save_results(results, output, meta={"stubs": asdict(config)})
+    else:
+        print(json.dumps([asdict(result) for result in results], ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Result summaries, peak memory and baseline comparison for the load scripts."""
+
+import json
+import resource
+import statistics
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+
+@dataclass
+class Result:
+    """Throughput and latency of one scenario at one concurrency level."""
+
+    scenario: str
+    concurrency: int
+    count: int  # completed operations (latency samples)
+    errors: int
+    elapsed_s: float
+    throughput: float  # operations (or items, for pipeline stages) per second
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_rss_mb: float
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return f"{self.scenario}@{self.concurrency}"
+
+
+def percentiles(latencies_ms: list[float]) -> tuple[float, float, float]:
+    """Return the p50, p95 and p99 of ``latencies_ms``."""
+    if not latencies_ms:
+        return 0.0, 0.0, 0.0
+    if len(latencies_ms) == 1:
+        return (latencies_ms[0],) * 3
+    cuts = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+    return round(cuts[49], 2), round(cuts[94], 2), round(cuts[98], 2)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(
+    scenario: str,
+    concurrency: int,
+    latencies_ms: list[float],
+    errors: int,
+    elapsed_s: float,
+    throughput: float | None = None,
+    **extra: Any,
+) -> Result:
+    """Build a result; throughput defaults to completed operations per second."""
+    p50, p95, p99 = percentiles(latencies_ms)
+    if throughput is None:
+        throughput = len(latencies_ms) / elapsed_s if elapsed_s > 0 else 0.0
+    return Result(
+        scenario=scenario,
+        concurrency=concurrency,
+        count=len(latencies_ms),
+        errors=errors,
+        elapsed_s=round(elapsed_s, 3),
+        throughput=round(throughput, 2),
+        p50_ms=p50,
+        p95_ms=p95,
+        p99_ms=p99,
+        peak_rss_mb=peak_rss_mb(),
+        extra=extra,
+    )
+
+
+def load_results(path: str | Path) -> list[Result]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return [Result(**item) for item in data["results"]]
+
+
+def save_results(
+    results: list[Result], path: str | Path, meta: dict[str, Any] | None = None
+) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {"meta": meta or {}, "results": [asdict(result) for result in results]}
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def compare(results: list[Result], baseline: list[Result], tolerance: float) -> list[str]:
+    """Return a description of every metric that regressed beyond ``tolerance``.
+
+    Throughput may drop, and p95 latency and peak memory may grow, by at most
+    ``tolerance`` (a fraction) relative to the baseline result with the same
+    scenario and concurrency.
+    """
+    previous = {result.key: result for result in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get(result.key)
+        if base is None:
+            continue
+        if base.throughput and result.throughput < base.throughput * (1 - tolerance):
+            regressions.append(
+                f"{result.key}: throughput {result.throughput}/s < baseline {base.throughput}/s"
+            )
+        if base.p95_ms and result.p95_ms > base.p95_ms * (1 + tolerance):
+            regressions.append(f"{result.key}: p95 {result.p95_ms}ms > baseline {base.p95_ms}ms")
+        if base.peak_rss_mb and result.peak_rss_mb > base.peak_rss_mb * (1 + tolerance):
+            regressions.append(
+                f"{result.key}: peak RSS {result.peak_rss_mb}MB > baseline {base.peak_rss_mb}MB"
+            )
+        if result.errors > base.errors and result.errors > result.count * tolerance:
+            regressions.append(f"{result.key}: {result.errors} errors (baseline {base.errors})")
+    return regressions
+
+
+def _delta(value: float, base: float | None) -> str:
+    if not base:
+        return f"{value:>10}"
+    return f"{value:>10} ({(value - base) / base:+.0%})"
+
+
+def format_table(results: list[Result], baseline: list[Result] | None = None) -> str:
+    """Render results as a text table, with the change from ``baseline`` when given."""
+    previous = {result.key: result for result in baseline or []}
+    header = (
+        f"{'scenario':<24} {'conc':>4} {'ok':>6} {'err':>5} "
+        f"{'ops/s':>17} {'p50 ms':>10} {'p95 ms':>17} {'p99 ms':>10} {'peak MB':>17}"
+    )
+    lines = [header, "-" * len(header)]
+    for result in results:
+        base = previous.get(result.key)
+        lines.append(
+            f"{result.scenario:<24} {result.concurrency:>4} {result.count:>6} {result.errors:>5} "
+            f"{_delta(result.throughput, base and base.throughput):>17} {result.p50_ms:>10} "
+            f"{_delta(result.p95_ms, base and base.p95_ms):>17} {result.p99_ms:>10} "
+            f"{_delta(result.peak_rss_mb, base and base.peak_rss_mb):>17}"
+        )
+    return "\n".join(lines)
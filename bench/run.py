@@ -0,0 +1,109 @@
+"""Run the offline benchmark suite and compare it with a stored baseline.
+
+Each scenario and concurrency level runs in a fresh process, so peak RSS is
+per level and no cache or connection pool carries over. Everything talks
+to the local stand-ins of ``stubs.py``; no network access is needed.
+
+    python bench/run.py                   # run, compare with bench/baseline.json
+    python bench/run.py --save-baseline   # run and store the results as the baseline
+
+The search scenarios need the backend's dependencies and the ingest
+scenario the batch's. Use ``--backend-python`` / ``--batch-python`` to
+point at the interpreter of each project's environment. Options not listed
+here (``--encode-ms 30``, ``--llm-token-ms 8``, ...) are passed to the
+stand-ins. The exit status is 1 if any result regressed by more than
+``--tolerance`` from the baseline.
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from report import Result, compare, format_table, load_results, save_results
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+SCENARIOS = ("search", "search_stream", "ingest")
+
+
+def _run_level(
+    scenario: str, level: int, args: argparse.Namespace, stub_args: list[str]
+) -> list[Result]:
+    if scenario == "ingest":
+        command = [args.batch_python, str(BENCH_DIR / "ingest_load.py"), "--pages", str(args.pages)]
+    else:
+        command = [
+            args.backend_python,
+            str(BENCH_DIR / "search_load.py"),
+            "--requests",
+            str(args.requests),
+            "--endpoint",
+            "stream" if scenario == "search_stream" else "search",
+        ]
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "results.json"
+        command += ["--concurrency", str(level), "--output", str(output), *stub_args]
+        print(f"--- {scenario} @ {level}", file=sys.stderr, flush=True)
+        subprocess.run(command, check=True)
+        return load_results(output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--search-concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--ingest-concurrency", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="searches per level")
+    parser.add_argument("--pages", type=int, default=400, help="pages ingested per level")
+    parser.add_argument("--backend-python", default=sys.executable)
+    parser.add_argument("--batch-python", default=sys.executable)
+    parser.add_argument("--baseline", default=str(BENCH_DIR / "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results" / "latest.json"))
+    parser.add_argument(
+        "--tolerance", type=float, default=0.15, help="allowed regression vs. the baseline"
+    )
+    args, stub_args = parser.parse_known_args()
+
+    results: list[Result] = []
+    for scenario in args.scenarios:
+        levels = args.ingest_concurrency if scenario == "ingest" else args.search_concurrency
+        for level in levels:
+            results.extend(_run_level(scenario, level, args, stub_args))
+
+    meta = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "stub_args": stub_args}
+    save_results(results, args.output, meta)
+    baseline_path = Path(args.baseline)
+    baseline = load_results(baseline_path) if baseline_path.exists() else None
+
+    print(file=sys.stderr)
+    print(format_table(results, baseline), file=sys.stderr)
+    print(f"\nResults written to {args.output}", file=sys.stderr)
+
+    if args.save_baseline:
+        save_results(results, baseline_path, meta)
+        print(f"Baseline saved to {baseline_path}", file=sys.stderr)
+        return
+    if baseline is None:
+        print(
+            f"No baseline at {baseline_path}; run with --save-baseline to store one.",
+            file=sys.stderr,
+        )
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regressions beyond {args.tolerance:.0%}:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance:.0%} of the baseline.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Load test for the backend's /api/search against local stand-ins.
+
+Starts the stand-ins of ``stubs.py``, serves the backend app with uvicorn on
+localhost (configured to use the stand-ins), and sends ``--requests``
+searches at each ``--concurrency`` level. Reports throughput, p50/p95/p99
+latency and peak RSS; with ``--endpoint stream`` the SSE endpoint is used
+and time to first token is reported as well. HTTP 429 responses (load
+shedding) are counted separately from errors.
+
+Run with the backend's dependencies installed:
+    python bench/search_load.py --concurrency 1 4 16 [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+import httpx
+
+from report import Result, format_table, percentiles, save_results, summarize
+from stubs import WORDS, StubConfig, run_stubs
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+def _configure(stub_url: str, args: argparse.Namespace) -> None:
+    """Point the backend settings at the stand-ins (before ``app`` is imported)."""
+    os.environ.update(
+        {
+            "SEARCH_BACKEND": "elasticsearch",
+            "ELASTICSEARCH_URL": stub_url,
+            "ENCODER_URL": stub_url,
+            "OLLAMA_BASE_URL": stub_url,
+            "RETRIEVAL_MODE": args.retrieval_mode,
+            "QUERY_VECTOR_CACHE_PATH": "",
+            "RESPONSE_CACHE_PATH": "",
+            "PROFILING_ENABLED": "false",
+        }
+    )
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def _queries(level: int, count: int, pool: int) -> list[str]:
+    """Queries for one level; unique unless ``pool`` limits them (to exercise the caches)."""
+    queries = []
+    for n in range(count):
+        i = n % pool if pool else n
+        tag = str(i) if pool else f"{level}-{i}"
+        queries.append(f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} {tag}")
+    return queries
+
+
+async def _search(
+    client: httpx.AsyncClient, query: str, stream: bool
+) -> tuple[int, float | None]:
+    """Send one search and return its status and, when streaming, the time to first token."""
+    payload = {"query": query, "top_k": 5}
+    if not stream:
+        response = await client.post("/api/search", json=payload)
+        return response.status_code, None
+
+    start = time.perf_counter()
+    first_token = None
+    event = ""
+    async with client.stream("POST", "/api/search/stream", json=payload) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line.removeprefix("event: ")
+                if event == "token" and first_token is None:
+                    first_token = (time.perf_counter() - start) * 1000
+            elif line.startswith("data: ") and event == "error":
+                # Overload after streaming started is reported in the event itself
+                return json.loads(line.removeprefix("data: ")).get("status", 500), None
+    return response.status_code, first_token
+
+
+async def run_level(
+    client: httpx.AsyncClient, concurrency: int, queries: list[str], stream: bool
+) -> Result:
+    latencies: list[float] = []
+    first_tokens: list[float] = []
+    shed = errors = 0
+    pending = iter(queries)
+
+    async def worker() -> None:
+        nonlocal shed, errors
+        for query in pending:
+            start = time.perf_counter()
+            try:
+                status, first_token = await _search(client, query, stream)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if status == 429:
+                shed += 1
+            elif status != 200:
+                errors += 1
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+                if first_token is not None:
+                    first_tokens.append(first_token)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    extra: dict[str, float | int] = {"shed": shed}
+    if stream:
+        extra["first_token_p50_ms"], extra["first_token_p95_ms"], _ = percentiles(first_tokens)
+    return summarize(
+        "search_stream" if stream else "search", concurrency, latencies, errors, elapsed, **extra
+    )
+
+
+async def run(args: argparse.Namespace) -> list[Result]:
+    import uvicorn
+
+    from app.main import app
+
+    # Per-request INFO logs would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", access_log=False)
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    stream = args.endpoint == "stream"
+    results = []
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 8)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", timeout=120.0, limits=limits
+    ) as client:
+        for query in _queries(0, args.warmup, 0):
+            await _search(client, f"warmup {query}", stream)
+        for level in args.concurrency:
+            queries = _queries(level, args.requests, args.query_pool)
+            result = await run_level(client, level, queries, stream)
+            print(format_table([result]).splitlines()[-1], file=sys.stderr)
+            results.append(result)
+
+    server.should_exit = True
+    await serving
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="requests per level")
+    parser.add_argument(
+        "--warmup", type=int, default=5, help="unmeasured requests before the first level"
+    )
+    parser.add_argument("--endpoint", choices=["search", "stream"], default="search")
+    parser.add_argument("--retrieval-mode", default="sparse", choices=["sparse", "hybrid", "bm25"])
+    parser.add_argument(
+        "--query-pool",
+        type=int,
+        default=0,
+        help="distinct queries to cycle through (0: all unique)",
+    )
+    parser.add_argument("--in-process-stubs", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    StubConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    config = StubConfig.from_args(args)
+    output = Path(args.output).resolve() if args.output else None
+    cwd = os.getcwd()
+    # A scratch working directory keeps a local .env and data/ caches out of the run
+    with (
+        run_stubs(config, args.in_process_stubs) as stub_url,
+        tempfile.TemporaryDirectory() as workdir,
+    ):
+        os.chdir(workdir)
+        try:
+            _configure(stub_url, args)
+            results = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+    print(format_table(results), file=sys.stderr)
+    if output:
+        save_results(results, output, meta={"stubs": asdict(config)})
+    else:
+        print(json.dumps([asdict(result) for result in results], ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
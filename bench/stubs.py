@@ -0,0 +1,425 @@
+"""Local stand-ins for the encoder, Elasticsearch, Ollama and Cosense.
+
+One threaded HTTP server answers the subset of each API that the backend
+and the batch pipeline use, with configurable latency, so both can be
+load-tested without a GPU, a cluster or network access:
+
+    encoder        POST /api/encode, /api/encode_batch (JSON vectors)
+    Ollama         POST /api/chat (streamed or not), /api/generate
+    Cosense        GET  /api/pages/<project>, /api/pages/<project>/<title>/text
+    Elasticsearch  POST /<index>/_search, /<index>/_msearch,
+                   POST /<index>/_delete_by_query, PUT /_bulk,
+                   GET  /<index>/_mapping, HEAD /<index>
+
+Latency is simulated with sleeps. ``*_parallelism`` caps how many requests
+a service works on at once (a single model instance serves one batch at a
+time), so queueing behind the encoder or the LLM shows up as it would in
+production. Everything is generated from the request text, so runs are
+repeatable.
+
+Run standalone (the load scripts start it in a subprocess by default):
+    python bench/stubs.py [--port 0] [--encode-ms 15] ...
+The first line written to stdout is ``{"url": "http://127.0.0.1:<port>"}``.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Shared by the synthetic pages, passages and answers
+WORDS = (
+    "検索 ベクトル 索引 文書 要約 質問 回答 設定 環境 構成 性能 遅延 "
+    "キャッシュ 並列 バッチ 推論 モデル 語彙 重み 近傍 "
+    "sparse vector index query"
+).split()
+
+
+@dataclass
+class StubConfig:
+    """Simulated service latencies and payload sizes."""
+
+    encode_ms: float = 15.0  # per encode request
+    encode_per_text_ms: float = 2.0  # added per text in a batch
+    encoder_parallelism: int = 1
+    vector_terms: int = 120  # terms per returned vector
+    search_ms: float = 8.0
+    bulk_ms: float = 20.0
+    bulk_per_doc_ms: float = 0.05
+    llm_load_ms: float = 0.0  # charged on /api/generate (warm-up)
+    llm_prefill_ms: float = 80.0
+    llm_token_ms: float = 4.0
+    llm_answer_tokens: int = 48
+    llm_parallelism: int = 2
+    cosense_ms: float = 30.0
+    page_chars: int = 2000
+
+    @classmethod
+    def add_arguments(cls, parser: argparse.ArgumentParser) -> None:
+        for f in fields(cls):
+            parser.add_argument(
+                f"--{f.name.replace('_', '-')}", type=type(f.default), default=f.default
+            )
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "StubConfig":
+        return cls(**{f.name: getattr(args, f.name) for f in fields(cls)})
+
+    def to_args(self) -> list[str]:
+        return [
+            arg
+            for name, value in asdict(self).items()
+            for arg in (f"--{name.replace('_', '-')}", str(value))
+        ]
+
+
+def _seed(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def sparse_vector(text: str, terms: int) -> dict[str, float]:
+    """A deterministic pseudo SPLADE vector for ``text``."""
+    seed = _seed(text)
+    return {
+        f"tok{(seed + i * 7919) % 32000}": round(0.1 + ((seed >> (i % 24)) % 250) / 100, 3)
+        for i in range(terms)
+    }
+
+
+def page_text(title: str, chars: int) -> str:
+    """Synthetic Cosense page body of about ``chars`` characters."""
+    seed = _seed(title)
+    lines = [title]
+    size = len(title)
+    i = 0
+    while size < chars:
+        words = [WORDS[(seed + i * 31 + j * 17) % len(WORDS)] for j in range(8)]
+        line = " ".join(words) + "。"
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    return "\n".join(lines)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    # --- plumbing ---
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _json_body(self) -> Any:
+        body = self._body()
+        return json.loads(body) if body else {}
+
+    def _send(
+        self,
+        status: int,
+        body: bytes = b"",
+        content_type: str = "application/json",
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(
+        self, data: Any, status: int = 200, headers: dict[str, str] | None = None
+    ) -> None:
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), headers=headers)
+
+    def _send_es(self, data: Any, status: int = 200) -> None:
+        # elasticsearch-py refuses servers that don't identify as Elasticsearch
+        self._send_json(data, status, headers={"X-Elastic-Product": "Elasticsearch"})
+
+    @staticmethod
+    def _sleep(ms: float) -> None:
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    # --- routing ---
+
+    def do_HEAD(self) -> None:
+        self._send_es({})
+
+    def do_GET(self) -> None:
+        path = urlsplit(self.path).path
+        if path.startswith("/api/pages/"):
+            self._cosense(path)
+        elif path == "/api/health":
+            self._send_json({"status": "ok", "service": "stub"})
+        elif path.endswith("/_mapping"):
+            index = unquote(path.strip("/").split("/")[0])
+            self._send_es({index: {"mappings": {"_meta": {"generation": "bench"}}}})
+        else:
+            self._send_es({"name": "stub", "version": {"number": "8.17.0"}})
+
+    def do_POST(self) -> None:
+        path = urlsplit(self.path).path
+        if path == "/api/encode":
+            self._encode(batch=False)
+        elif path == "/api/encode_batch":
+            self._encode(batch=True)
+        elif path == "/api/chat":
+            self._chat()
+        elif path == "/api/generate":
+            self._body()
+            self._sleep(self.server.config.llm_load_ms)
+            self._send_json({"model": "stub", "response": "", "done": True})
+        elif path.endswith("/_search"):
+            self._search()
+        elif path.endswith("/_msearch"):
+            self._msearch()
+        elif path.endswith("/_bulk"):
+            self._bulk()
+        elif path.endswith("/_delete_by_query"):
+            self._body()
+            self._send_es({"deleted": 0, "failures": []})
+        else:
+            self._body()
+            self._send_json({"error": f"no stub for {self.command} {path}"}, status=404)
+
+    def do_PUT(self) -> None:
+        if urlsplit(self.path).path.endswith("/_bulk"):
+            self._bulk()
+            return
+        self._body()
+        self._send_es({"acknowledged": True})
+
+    # --- services ---
+
+    def _encode(self, batch: bool) -> None:
+        config = self.server.config
+        data = self._json_body()
+        texts = data["texts"] if batch else [data["text"]]
+        with self.server.encoder_slots:
+            self._sleep(config.encode_ms + config.encode_per_text_ms * len(texts))
+        vectors = [sparse_vector(text, config.vector_terms) for text in texts]
+        self._send_json({"vectors": vectors} if batch else {"vector": vectors[0]})
+
+    def _search(self) -> None:
+        self._sleep(self.server.config.search_ms)
+        self._send_es(self._search_response(self._json_body()))
+
+    def _msearch(self) -> None:
+        lines = [line for line in self._body().splitlines() if line.strip()]
+        # Searches in one _msearch run in parallel on the cluster
+        self._sleep(self.server.config.search_ms)
+        self._send_es(
+            {"responses": [self._search_response(json.loads(body)) for body in lines[1::2]]}
+        )
+
+    def _search_response(self, body: dict[str, Any]) -> dict[str, Any]:
+        config = self.server.config
+        size = int(body.get("size", 10))
+        seed = _seed(json.dumps(body.get("query") or body.get("retriever"), sort_keys=True))
+        hits = []
+        for i in range(size):
+            page = (seed + i // 2) % 5000
+            title = f"ページ{page}"
+            hits.append(
+                {
+                    "_id": f"p{page}_{i % 2}",
+                    "_score": round(20.0 - i * 0.5, 3),
+                    "_source": {
+                        "title": title,
+                        "content": page_text(f"{title}-{i % 2}", 600),
+                        "source_url": f"https://scrapbox.io/bench/{title}",
+                        "page_id": f"p{page}",
+                        "chunk_index": i % 2,
+                    },
+                }
+            )
+        return {
+            "took": int(config.search_ms),
+            "timed_out": False,
+            "hits": {
+                "total": {"value": size, "relation": "eq"},
+                "max_score": 20.0,
+                "hits": hits,
+            },
+        }
+
+    def _bulk(self) -> None:
+        config = self.server.config
+        lines = [line for line in self._body().splitlines() if line.strip()]
+        items = []
+        for action_line in lines[::2]:
+            action = json.loads(action_line)
+            op, meta = next(iter(action.items()))
+            items.append(
+                {
+                    op: {
+                        "_index": meta.get("_index"),
+                        "_id": meta.get("_id"),
+                        "status": 201,
+                        "result": "created",
+                    }
+                }
+            )
+        self._sleep(config.bulk_ms + config.bulk_per_doc_ms * len(items))
+        self._send_es({"took": int(config.bulk_ms), "errors": False, "items": items})
+
+    def _chat(self) -> None:
+        config = self.server.config
+        body = self._json_body()
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        prompt_tokens = max(1, len(prompt) // 2)
+        words = [WORDS[(_seed(prompt) + i) % len(WORDS)] for i in range(config.llm_answer_tokens)]
+        ns = 1_000_000
+
+        def final(content: str) -> dict[str, Any]:
+            return {
+                "model": body.get("model", "stub"),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int(
+                    (config.llm_prefill_ms + config.llm_token_ms * len(words)) * ns
+                ),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(config.llm_prefill_ms * ns),
+                "eval_count": len(words),
+                "eval_duration": int(config.llm_token_ms * len(words) * ns),
+            }
+
+        with self.server.llm_slots:
+            if not body.get("stream", True):
+                self._sleep(config.llm_prefill_ms + config.llm_token_ms * len(words))
+                self._send_json(final("".join(words)))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self._sleep(config.llm_prefill_ms)
+            for word in words:
+                self._sleep(config.llm_token_ms)
+                self._write_chunk(
+                    {
+                        "model": body.get("model", "stub"),
+                        "message": {"role": "assistant", "content": word},
+                        "done": False,
+                    }
+                )
+            self._write_chunk(final(""))
+            self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: dict[str, Any]) -> None:
+        line = json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+    def _cosense(self, path: str) -> None:
+        config = self.server.config
+        parts = path.split("/")  # "", "api", "pages", project, [title, "text"]
+        self._sleep(config.cosense_ms)
+        if len(parts) >= 6 and parts[-1] == "text":
+            title = unquote("/".join(parts[4:-1]))
+            body = page_text(title, config.page_chars).encode("utf-8")
+            self._send(200, body, "text/plain; charset=utf-8")
+            return
+        query = parse_qs(urlsplit(self.path).query)
+        skip = int(query.get("skip", ["0"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+        count = self.server.page_count
+        pages = [
+            {"title": f"ページ{i}", "updated": 1_700_000_000 + i}
+            for i in range(skip, min(count, skip + limit))
+        ]
+        self._send_json({"count": count, "skip": skip, "limit": limit, "pages": pages})
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded server for all stand-ins, one thread per connection."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, config: StubConfig, port: int = 0, page_count: int = 1000) -> None:
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.config = config
+        self.page_count = page_count
+        self.encoder_slots = threading.BoundedSemaphore(max(1, config.encoder_parallelism))
+        self.llm_slots = threading.BoundedSemaphore(max(1, config.llm_parallelism))
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+@contextmanager
+def run_stubs(config: StubConfig, in_process: bool = False) -> Iterator[str]:
+    """Serve the stand-ins for the duration of the block and yield their base URL.
+
+    By default they run in a child process, so their threads and memory are
+    not counted against the process being measured.
+    """
+    if in_process:
+        server = StubServer(config)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield server.url
+        finally:
+            server.shutdown()
+            server.server_close()
+        return
+
+    process = subprocess.Popen(
+        [sys.executable, __file__, *config.to_args()], stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert process.stdout
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("Stub server failed to start")
+        yield json.loads(line)["url"]
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--pages", type=int, default=1000, help="pages in the Cosense listing")
+    StubConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer(StubConfig.from_args(args), port=args.port, page_count=args.pages)
+    print(json.dumps({"url": server.url}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
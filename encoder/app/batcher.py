@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from app import metrics
+from app.config import settings
+from app.sparse_encoder import encode_texts
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingRequest:
+    """Texts waiting to be encoded and the future that receives their vectors."""
+
+    texts: list[str]
+    future: asyncio.Future[list[dict[str, float]]] = field(repr=False)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """Groups concurrent encode requests into shared model calls.
+
+    Requests are queued and collected until either ``max_batch_size`` texts
+    are pending or ``max_wait_ms`` has passed since the first one arrived.
+    The collected texts are encoded in a worker thread so the event loop
+    stays responsive, and each caller receives only its own vectors.
+    """
+
+    def __init__(
+        self, max_batch_size: int | None = None, max_wait_ms: float | None = None
+    ) -> None:
+        self.max_batch_size = max(1, max_batch_size or settings.batch_max_size)
+        self.max_wait = (
+            max_wait_ms if max_wait_ms is not None else settings.batch_max_wait_ms
+        ) / 1000
+        self._queue: asyncio.Queue[_PendingRequest] = asyncio.Queue()
+        self._worker: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        """Start the background batching loop."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the batching loop and fail any requests still queued."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Encoder is shutting down"))
+        metrics.QUEUE_DEPTH.set(0)
+
+    async def encode(self, text: str) -> dict[str, float]:
+        """Encode a single text, sharing a model call with concurrent requests."""
+        return (await self.encode_many([text]))[0]
+
+    async def encode_many(self, texts: list[str]) -> list[dict[str, float]]:
+        """Encode several texts, sharing a model call with concurrent requests."""
+        if not texts:
+            return []
+        future: asyncio.Future[list[dict[str, float]]] = (
+            asyncio.get_running_loop().create_future()
+        )
+        await self._queue.put(_PendingRequest(texts=texts, future=future))
+        # Set explicitly rather than with set_function, which multiprocess mode can't export
+        metrics.QUEUE_DEPTH.set(self._queue.qsize())
+        return await future
+
+    async def _collect(self) -> list[_PendingRequest]:
+        """Wait for the first request, then gather more until the batch is full or the deadline passes."""
+        batch = [await self._queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(pending)
+            size += len(pending.texts)
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            metrics.QUEUE_DEPTH.set(self._queue.qsize())
+            texts = [text for pending in batch for text in pending.texts]
+            start = time.perf_counter()
+            for pending in batch:
+                metrics.QUEUE_WAIT_SECONDS.observe(start - pending.enqueued_at)
+            metrics.BATCH_TEXTS.observe(len(texts))
+            try:
+                vectors = await asyncio.to_thread(encode_texts, texts)
+            except Exception as e:
+                logger.error(f"Batch of {len(texts)} texts failed: {e}")
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+            metrics.INFERENCE_SECONDS.observe(time.perf_counter() - start)
+
+            offset = 0
+            for pending in batch:
+                count = len(pending.texts)
+                if not pending.future.done():
+                    pending.future.set_result(vectors[offset : offset + count])
+                offset += count
+            logger.debug(f"Encoded {len(texts)} texts from {len(batch)} requests")
@@ -6,6 +6,36 @@ class Settings(BaseSettings):
 
     splade_model: str = "hotchpotch/japanese-splade-v2"
 
+    # Inference backend: "torch" (default), "quantized" (int8 dynamic
+    # quantization of the Linear layers) or "onnx" (ONNX Runtime)
+    inference_backend: str = "torch"
+    # Intra-op threads used by the backend, per worker (0 keeps the library
+    # default with one worker and divides the CPUs between several)
+    inference_threads: int = 0
+    # Where the exported ONNX model is cached (empty exports on every start)
+    onnx_model_path: str = ""
+
+    # Server started by "python -m app.serve". With more than one worker the
+    # model is loaded once and shared copy-on-write by forked workers.
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 1
+
+    # Maximum number of texts passed to the model in one forward pass
+    encode_batch_size: int = 32
+
+    # Dynamic micro-batching of concurrent requests
+    batch_max_size: int = 32
+    batch_max_wait_ms: float = 5.0
+
+    # Sparse vector pruning (0 / 0.0 / 1.0 disable top-N / min weight / mass)
+    doc_prune_top_n: int = 0
+    doc_prune_min_weight: float = 0.0
+    doc_prune_mass: float = 1.0
+    query_prune_top_n: int = 0
+    query_prune_min_weight: float = 0.0
+    query_prune_mass: float = 1.0
+
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
 
@@ -1,11 +1,16 @@
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
 from pydantic import BaseModel
 
-from app.sparse_encoder import encode_text, get_encoder
+from app import metrics, wire
+from app.batcher import MicroBatcher
+from app.pruning import VectorKind, prune_vector, pruning_for
+from app.sparse_encoder import get_encoder, warm_up
 
 logger = logging.getLogger(__name__)
 
@@ -14,14 +19,50 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
 )
 
+# Set once the model is loaded and warmed up; encode requests get 503 until then
+batcher: MicroBatcher | None = None
+vocab: list[str] = []
+vocab_hash = ""
+token_ids: dict[str, int] = {}
+load_error: str | None = None
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    """Pre-load the SPLADE model at startup."""
-    logger.info("Pre-loading SPLADE model...")
-    get_encoder()
-    logger.info("Encoder service ready")
+    """Load the SPLADE model in the background and start the request batcher when it is ready.
+
+    The server accepts connections right away, so /api/health (liveness)
+    answers during loading while /api/ready (readiness) reports 503.
+    """
+    global batcher
+    loading = asyncio.create_task(_load_model())
     yield
+    loading.cancel()
+    if batcher:
+        await batcher.stop()
+        batcher = None
+
+
+async def _load_model() -> None:
+    global batcher, vocab, vocab_hash, token_ids, load_error
+    start = time.perf_counter()
+    try:
+        logger.info("Loading SPLADE model...")
+        encoder = await asyncio.to_thread(get_encoder)
+        metrics.STARTUP_SECONDS.labels("load").set(time.perf_counter() - start)
+        vocab = list(encoder.id_to_token)
+        vocab_hash = wire.vocab_hash(vocab)
+        token_ids = {token: i for i, token in enumerate(vocab)}
+        warm_up_seconds = await asyncio.to_thread(warm_up)
+        logger.info(f"Warmed up in {warm_up_seconds:.2f}s")
+    except Exception as e:
+        load_error = f"{type(e).__name__}: {e}"
+        logger.exception("Failed to load the SPLADE model")
+        return
+    batcher = MicroBatcher()
+    batcher.start()
+    metrics.STARTUP_SECONDS.labels("ready").set(time.perf_counter() - start)
+    logger.info(f"Encoder service ready in {time.perf_counter() - start:.2f}s")
 
 
 app = FastAPI(
@@ -34,23 +75,147 @@ app = FastAPI(
 
 class EncodeRequest(BaseModel):
     text: str
+    kind: VectorKind = "query"
 
 
 class EncodeResponse(BaseModel):
     vector: dict[str, float]
 
 
+class EncodeBatchRequest(BaseModel):
+    texts: list[str]
+    kind: VectorKind = "document"
+
+
+class EncodeBatchResponse(BaseModel):
+    vectors: list[dict[str, float]]
+
+
+class VocabResponse(BaseModel):
+    hash: str
+    tokens: list[str]
+
+
+def _wants_binary(accept: str | None) -> bool:
+    return accept is not None and wire.MEDIA_TYPE in accept
+
+
+def _binary_response(vectors: list[dict[str, float]], timings: dict[str, float]) -> Response:
+    return Response(
+        content=wire.pack_vectors(vectors, token_ids),
+        media_type=wire.MEDIA_TYPE,
+        headers={
+            wire.VOCAB_HASH_HEADER: vocab_hash,
+            "Server-Timing": metrics.server_timing(timings),
+        },
+    )
+
+
+def _ms_since(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _record(
+    endpoint: str, kind: str, vectors: list[dict[str, float]], start: float
+) -> None:
+    metrics.REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+    for vector in vectors:
+        metrics.VECTOR_TERMS.labels(kind).observe(len(vector))
+
+
 @app.get("/api/health")
-async def health_check() -> dict:
-    return {"status": "ok", "service": "encoder"}
+async def health_check(response: Response) -> dict:
+    """Liveness: OK while the process works, even if the model is still loading."""
+    if load_error:
+        response.status_code = 503
+        return {"status": "error", "service": "encoder", "error": load_error}
+    return {
+        "status": "ok",
+        "service": "encoder",
+        "ready": batcher is not None,
+        "pruning": {kind: pruning_for(kind).fingerprint for kind in ("query", "document")},
+    }
+
+
+@app.get("/api/ready")
+async def readiness_check(response: Response) -> dict:
+    """Readiness: OK once the model is loaded and warmed up."""
+    if batcher is None:
+        response.status_code = 503
+        return {"status": "loading", "service": "encoder"}
+    return {"status": "ready", "service": "encoder"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Prometheus metrics."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/api/vocab", response_model=VocabResponse)
+async def get_vocab() -> VocabResponse:
+    """Return the token vocabulary that binary responses index into."""
+    if not vocab:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    return VocabResponse(hash=vocab_hash, tokens=vocab)
 
 
 @app.post("/api/encode", response_model=EncodeResponse)
-async def encode(request: EncodeRequest) -> EncodeResponse:
-    """Encode text to a sparse vector."""
+async def encode(
+    request: EncodeRequest, response: Response, accept: str | None = Header(default=None)
+) -> EncodeResponse | Response:
+    """Encode text to a sparse vector.
+
+    Responds in the binary format of ``app.wire`` if the client accepts it.
+    Encode (including batching wait) and prune durations are returned in
+    the ``Server-Timing`` header.
+    """
+    if not batcher:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+
+    binary = _wants_binary(accept)
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
     try:
-        vector = encode_text(request.text)
-        return EncodeResponse(vector=vector)
+        vector = await batcher.encode(request.text)
+        timings["encode_ms"] = _ms_since(start)
+        vector = prune_vector(vector, pruning_for(request.kind))
+        timings["prune_ms"] = round(_ms_since(start) - timings["encode_ms"], 1)
     except Exception as e:
+        metrics.ERRORS.labels("encode").inc()
         logger.error(f"Encoding failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    _record("encode", request.kind, [vector], start)
+    if binary:
+        return _binary_response([vector], timings)
+    response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return EncodeResponse(vector=vector)
+
+
+@app.post("/api/encode_batch", response_model=EncodeBatchResponse)
+async def encode_batch(
+    request: EncodeBatchRequest, response: Response, accept: str | None = Header(default=None)
+) -> EncodeBatchResponse | Response:
+    """Encode multiple texts to sparse vectors in as few forward passes as possible."""
+    if not batcher:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+
+    binary = _wants_binary(accept)
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
+    try:
+        vectors = await batcher.encode_many(request.texts)
+        timings["encode_ms"] = _ms_since(start)
+        pruning = pruning_for(request.kind)
+        vectors = [prune_vector(v, pruning) for v in vectors]
+        timings["prune_ms"] = round(_ms_since(start) - timings["encode_ms"], 1)
+    except Exception as e:
+        metrics.ERRORS.labels("encode_batch").inc()
+        logger.error(f"Batch encoding failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    _record("encode_batch", request.kind, vectors, start)
+    if binary:
+        return _binary_response(vectors, timings)
+    response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return EncodeBatchResponse(vectors=vectors)
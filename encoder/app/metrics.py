@@ -0,0 +1,76 @@
+"""Prometheus metrics for the encoder service.
+
+With several workers (``app.serve``), ``PROMETHEUS_MULTIPROC_DIR`` is set
+before this module is imported, every worker writes its values to files
+there, and ``render`` aggregates all of them, so a scrape answered by any
+worker reports the whole service.
+"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = Histogram(
+    "encoder_request_duration_seconds",
+    "Time to answer an encode request",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "encoder_queue_wait_seconds",
+    "Time a request waits in the micro-batcher before its batch starts",
+    buckets=LATENCY_BUCKETS,
+)
+INFERENCE_SECONDS = Histogram(
+    "encoder_inference_duration_seconds",
+    "Model time per micro-batch",
+    buckets=LATENCY_BUCKETS,
+)
+BATCH_TEXTS = Histogram(
+    "encoder_batch_texts",
+    "Texts per micro-batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+VECTOR_TERMS = Histogram(
+    "encoder_vector_terms",
+    "Terms per returned vector after pruning",
+    ["kind"],
+    buckets=(8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+)
+ERRORS = Counter("encoder_errors_total", "Failed encode requests", ["endpoint"])
+QUEUE_DEPTH = Gauge(
+    "encoder_queue_depth",
+    "Requests waiting in the micro-batcher (summed over live workers)",
+    multiprocess_mode="livesum",
+)
+STARTUP_SECONDS = Gauge(
+    "encoder_startup_seconds",
+    "Time from the start of model loading until it was loaded and until the service was ready "
+    "(one series per live worker pid with several workers)",
+    ["phase"],
+    multiprocess_mode="liveall",
+)
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    """Render ``<stage>_ms`` durations as a ``Server-Timing`` header value."""
+    return ", ".join(f"{key.removesuffix('_ms')};dur={ms}" for key, ms in timings.items())
+
+
+def render() -> tuple[bytes, str]:
+    """Return the exposition-format metrics and their content type."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,74 @@
+import logging
+from dataclasses import dataclass
+from typing import Literal
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+VectorKind = Literal["query", "document"]
+
+
+@dataclass(frozen=True)
+class PruningConfig:
+    """Limits applied to a sparse vector after encoding.
+
+    Attributes:
+        top_n: Keep at most this many highest-weighted terms (0 disables).
+        min_weight: Drop terms whose weight is below this value (0 disables).
+        mass: Keep the highest-weighted terms that together hold this fraction
+            of the total weight (1.0 disables).
+    """
+
+    top_n: int = 0
+    min_weight: float = 0.0
+    mass: float = 1.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_n > 0 or self.min_weight > 0 or self.mass < 1.0
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable description of the limits, for clients that cache pruned vectors."""
+        return f"top_n={self.top_n},min_weight={self.min_weight},mass={self.mass}"
+
+
+def pruning_for(kind: VectorKind) -> PruningConfig:
+    """Return the configured pruning for query or document vectors."""
+    if kind == "document":
+        return PruningConfig(
+            top_n=settings.doc_prune_top_n,
+            min_weight=settings.doc_prune_min_weight,
+            mass=settings.doc_prune_mass,
+        )
+    return PruningConfig(
+        top_n=settings.query_prune_top_n,
+        min_weight=settings.query_prune_min_weight,
+        mass=settings.query_prune_mass,
+    )
+
+
+def prune_vector(vector: dict[str, float], config: PruningConfig) -> dict[str, float]:
+    """Prune a sparse vector by minimum weight, cumulative mass and top-N, in that order."""
+    if not config.enabled:
+        return vector
+
+    terms = sorted(vector.items(), key=lambda item: item[1], reverse=True)
+
+    if config.min_weight > 0:
+        terms = [(token, weight) for token, weight in terms if weight >= config.min_weight]
+
+    if config.mass < 1.0 and terms:
+        target = sum(weight for _, weight in terms) * config.mass
+        cumulative = 0.0
+        for i, (_, weight) in enumerate(terms):
+            cumulative += weight
+            if cumulative >= target:
+                terms = terms[: i + 1]
+                break
+
+    if config.top_n > 0:
+        terms = terms[: config.top_n]
+
+    return dict(terms)
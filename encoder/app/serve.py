@@ -0,0 +1,196 @@
+"""Start the encoder API, optionally as several pre-forked worker processes.
+
+``uvicorn --workers N`` starts every worker from scratch, so each one
+imports torch and loads its own copy of the model. With
+``settings.workers > 1`` this launcher instead loads and warms the model
+once, then forks the workers. They share the model weights copy-on-write
+and accept connections from one listening socket. Each worker sets its own
+torch thread count (``settings.inference_threads``, or the CPUs divided
+between the workers) and reports ready once its own warm-up is done.
+Workers that exit are replaced by forking again, without reloading the
+model.
+
+The parent warms the model up with a single thread, so no OpenMP thread
+pool exists when it forks (a pool does not survive fork). The ``onnx``
+backend's sessions do not survive fork either, so with that backend every
+worker loads its own model after the fork.
+
+Prometheus metrics are kept in multiprocess mode: every worker writes its
+values to files in ``PROMETHEUS_MULTIPROC_DIR`` (a temporary directory
+unless set), so ``/metrics`` served by any worker reports the sum over all
+of them. ``encoder_startup_seconds`` has one series per worker pid.
+
+Usage:
+    python -m app.serve
+"""
+
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+import uvicorn
+
+from app.config import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# A worker that exits sooner than this after starting is restarted with a delay
+MIN_WORKER_UPTIME_SECONDS = 10.0
+
+
+def _worker_threads() -> int:
+    if settings.inference_threads > 0:
+        return settings.inference_threads
+    return max(1, (os.cpu_count() or 1) // settings.workers)
+
+
+def _bind() -> socket.socket:
+    family = socket.AF_INET6 if ":" in settings.host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((settings.host, settings.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _metrics_dir() -> str | None:
+    """Point prometheus_client at an empty multiprocess directory.
+
+    Must run before prometheus_client is imported. Returns the directory if
+    it was created here and should be removed on exit.
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        Path(path).mkdir(parents=True, exist_ok=True)
+        for stale in Path(path).glob("*.db"):
+            stale.unlink()
+        return None
+    path = tempfile.mkdtemp(prefix="encoder-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def _preload() -> None:
+    """Load and warm the model in the parent so forked workers share it."""
+    from app.sparse_encoder import get_encoder, warm_up
+
+    start = time.perf_counter()
+    get_encoder(threads=1)
+    warm_up()
+    logger.info(f"Model preloaded and warmed up in {time.perf_counter() - start:.2f}s")
+    # Import the app before forking too, and move everything allocated so far
+    # out of the garbage collector's reach, so collections in the workers
+    # don't write to (and un-share) the parent's pages
+    import app.main  # noqa: F401
+
+    gc.collect()
+    gc.freeze()
+
+
+def _run_worker(sock: socket.socket, index: int) -> None:
+    from app.main import app
+    from app.sparse_encoder import set_threads
+
+    # The parent's handlers would stop the other workers; uvicorn installs its own
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    threads = _worker_threads()
+    # Used by the onnx backend, which loads its model in the worker
+    settings.inference_threads = threads
+    set_threads(threads)
+    logger.info(f"Worker {index} started (pid {os.getpid()}, {threads} threads)")
+    server = uvicorn.Server(uvicorn.Config(app, log_config=None))
+    server.run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, index: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, index)
+        except BaseException:
+            logger.exception(f"Worker {index} failed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve_workers() -> None:
+    """Preload the model, fork ``settings.workers`` workers and keep them running."""
+    sock = _bind()
+    created_metrics_dir = _metrics_dir()
+    if settings.inference_backend == "onnx":
+        logger.info("ONNX Runtime sessions can't be shared across fork; workers load their own")
+    else:
+        _preload()
+
+    workers: dict[int, tuple[int, float]] = {}  # pid -> (index, start time)
+    stopping = False
+
+    def stop(signum: int, frame: object) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    from prometheus_client import multiprocess
+
+    for index in range(settings.workers):
+        workers[_spawn(sock, index)] = (index, time.monotonic())
+    logger.info(f"Serving on {settings.host}:{settings.port} with {settings.workers} workers")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        multiprocess.mark_process_dead(pid)
+        index, started = workers.pop(pid, (None, 0.0))
+        if index is None or stopping:
+            continue
+        logger.warning(
+            f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, "
+            "restarting"
+        )
+        if time.monotonic() - started < MIN_WORKER_UPTIME_SECONDS:
+            time.sleep(1.0)
+        if not stopping:
+            workers[_spawn(sock, index)] = (index, time.monotonic())
+
+    sock.close()
+    if created_metrics_dir:
+        shutil.rmtree(created_metrics_dir, ignore_errors=True)
+    logger.info("All workers stopped")
+
+
+def main() -> None:
+    if settings.workers > 1 and hasattr(os, "fork"):
+        serve_workers()
+    else:
+        # One process: the model loads in the background after the server starts
+        uvicorn.run("app.main:app", host=settings.host, port=settings.port)
+
+
+if __name__ == "__main__":
+    main()
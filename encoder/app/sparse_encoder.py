@@ -1,37 +1,180 @@
 import logging
-
-from yasem import SpladeEmbedder
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 from app.config import settings
 
+# torch and yasem take seconds to import, so they are imported when the
+# model is loaded. The API (and its liveness endpoint) starts without them.
+if TYPE_CHECKING:
+    from yasem import SpladeEmbedder
+
 logger = logging.getLogger(__name__)
 
-_encoder: SpladeEmbedder | None = None
+INFERENCE_BACKENDS = ("torch", "quantized", "onnx")
+
+# Short and passage-length texts, so warm-up covers the shapes requests use
+WARM_UP_TEXTS = [
+    "検索",
+    "スパースベクトル検索と BM25 の違い",
+    "Cosense は共同編集できるナレッジベースです。" * 20,
+]
+
+_encoder: "SpladeEmbedder | None" = None
+_encoder_lock = threading.Lock()
+
+
+def load_encoder(
+    backend: str | None = None, threads: int | None = None
+) -> "SpladeEmbedder":
+    """Load the SPLADE model with the given inference backend.
+
+    ``quantized`` replaces the model's Linear layers with int8 dynamically
+    quantized ones, and ``onnx`` swaps the PyTorch model for an ONNX Runtime
+    session. Both run in fp32 on the CPU and keep SpladeEmbedder's
+    tokenization and SPLADE pooling, so vectors stay compatible with the
+    ``torch`` backend.
+
+    Args:
+        backend: One of ``INFERENCE_BACKENDS``. Defaults to
+            ``settings.inference_backend``.
+        threads: Intra-op thread count, 0 for the library default. Defaults
+            to ``settings.inference_threads``.
+    """
+    backend = backend or settings.inference_backend
+    threads = settings.inference_threads if threads is None else threads
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(
+            f"Unknown inference backend '{backend}', expected one of {INFERENCE_BACKENDS}"
+        )
+
+    start = time.perf_counter()
+    import torch
+    from yasem import SpladeEmbedder
+
+    logger.info(f"Imported torch and yasem in {time.perf_counter() - start:.2f}s")
+
+    set_threads(threads)
+
+    logger.info(f"Loading SPLADE model: {settings.splade_model} ({backend} backend)")
+    if backend == "torch":
+        # fp16 only pays off on a GPU; on the CPU it is slower than fp32
+        encoder = SpladeEmbedder(settings.splade_model, use_fp16=torch.cuda.is_available())
+    else:
+        encoder = SpladeEmbedder(settings.splade_model, device="cpu", use_fp16=False)
+        if backend == "quantized":
+            encoder.model = torch.ao.quantization.quantize_dynamic(
+                encoder.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        else:
+            encoder.model = _load_onnx_model(threads)
+    logger.info(f"SPLADE model loaded in {time.perf_counter() - start:.2f}s")
+    return encoder
+
+
+def set_threads(threads: int) -> None:
+    """Set torch's intra-op thread count (0 keeps the current setting)."""
+    if threads > 0:
+        import torch
+
+        torch.set_num_threads(threads)
+
+
+def _load_onnx_model(threads: int):
+    """Load the ONNX Runtime model, exporting and caching it on first use."""
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForMaskedLM
+
+    options = onnxruntime.SessionOptions()
+    if threads > 0:
+        options.intra_op_num_threads = threads
+
+    path = Path(settings.onnx_model_path) if settings.onnx_model_path else None
+    if path is not None and (path / "model.onnx").exists():
+        return ORTModelForMaskedLM.from_pretrained(path, session_options=options)
 
+    logger.info(f"Exporting {settings.splade_model} to ONNX")
+    model = ORTModelForMaskedLM.from_pretrained(
+        settings.splade_model, export=True, session_options=options
+    )
+    if path is not None:
+        model.save_pretrained(path)
+        logger.info(f"ONNX model saved to '{path}'")
+    return model
 
-def get_encoder() -> SpladeEmbedder:
-    """Get or create the SPLADE encoder singleton."""
+
+def get_encoder(threads: int | None = None) -> "SpladeEmbedder":
+    """Get or create the SPLADE encoder singleton.
+
+    ``threads`` is passed to ``load_encoder`` when the model is loaded.
+    """
     global _encoder
-    if _encoder is None:
-        logger.info(f"Loading SPLADE model: {settings.splade_model}")
-        _encoder = SpladeEmbedder(settings.splade_model)
-        logger.info("SPLADE model loaded successfully")
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = load_encoder(threads=threads)
     return _encoder
 
 
+def warm_up() -> float:
+    """Encode ``WARM_UP_TEXTS`` so lazy initialization happens before the first request.
+
+    Returns:
+        The warm-up time in seconds.
+    """
+    start = time.perf_counter()
+    encode_texts(WARM_UP_TEXTS)
+    return time.perf_counter() - start
+
+
 def encode_text(text: str) -> dict[str, float]:
     """Encode text into a sparse vector using japanese-splade.
 
     Returns:
         A dictionary mapping token strings to their weights.
     """
-    encoder = get_encoder()
-    # encode() expects a list of strings and returns a matrix
-    embeddings = encoder.encode([text])
-    # get_token_values() converts the matrix/array to a list of dicts or a single dict
-    result = encoder.get_token_values(embeddings)
-    
-    # If a single string was passed, it returns a single dict
-    if isinstance(result, list):
-        return result[0]
-    return result
+    return encode_texts([text])[0]
+
+
+def encode_texts(
+    texts: list[str],
+    batch_size: int | None = None,
+    encoder: "SpladeEmbedder | None" = None,
+) -> list[dict[str, float]]:
+    """Encode multiple texts into sparse vectors using japanese-splade.
+
+    Texts are sorted by length before being split into batches so that each
+    forward pass pads to a similar sequence length. Results are returned in
+    the original input order.
+
+    Args:
+        texts: The texts to encode.
+        batch_size: Maximum number of texts per forward pass. Defaults to
+            ``settings.encode_batch_size``.
+        encoder: The encoder to use instead of the singleton.
+
+    Returns:
+        A list of dictionaries mapping token strings to their weights.
+    """
+    if not texts:
+        return []
+
+    encoder = encoder or get_encoder()
+    batch_size = max(1, batch_size or settings.encode_batch_size)
+
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    results: list[dict[str, float]] = [{} for _ in texts]
+
+    for start in range(0, len(order), batch_size):
+        indices = order[start : start + batch_size]
+        # encode() expects a list of strings and returns a matrix
+        embeddings = encoder.encode([texts[i] for i in indices], batch_size=batch_size)
+        # get_token_values() returns a single dict for a single row
+        token_values = encoder.get_token_values(embeddings)
+        if not isinstance(token_values, list):
+            token_values = [token_values]
+        for i, vector in zip(indices, token_values):
+            results[i] = vector
+
+    return results
@@ -0,0 +1,68 @@
+"""Compact binary wire format for sparse vectors.
+
+Clients that send ``Accept: application/x-sparse-vectors`` get vectors as
+token ids into the model vocabulary instead of JSON objects keyed by token
+string. The vocabulary itself is served once by ``/api/vocab``, and every
+binary response carries its hash in ``X-Vocab-Hash`` so clients notice a
+model change.
+
+Layout (little-endian)::
+
+    uint32   n              number of vectors
+    uint32   lengths[n]     number of terms in each vector
+    uint32   token_ids[m]   m = sum(lengths), vector after vector
+    float16  weights[m]
+
+float16 keeps about three significant digits, which is more than the
+sparse_vector field retains once indexed.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+
+MEDIA_TYPE = "application/x-sparse-vectors"
+VOCAB_HASH_HEADER = "X-Vocab-Hash"
+
+
+def vocab_hash(tokens: list[str]) -> str:
+    """Return a short fingerprint of the vocabulary."""
+    data = json.dumps(tokens, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def pack_vectors(vectors: list[dict[str, float]], token_ids: dict[str, int]) -> bytes:
+    """Serialize sparse vectors keyed by token string into the binary format."""
+    lengths = np.fromiter((len(v) for v in vectors), dtype="<u4", count=len(vectors))
+    total = int(lengths.sum())
+    ids = np.fromiter(
+        (token_ids[token] for v in vectors for token in v), dtype="<u4", count=total
+    )
+    weights = np.fromiter(
+        (weight for v in vectors for weight in v.values()), dtype=np.float32, count=total
+    ).astype("<f2")
+    header = np.array([len(vectors)], dtype="<u4")
+    return b"".join(a.tobytes() for a in (header, lengths, ids, weights))
+
+
+def unpack_vectors(data: bytes, tokens: list[str]) -> list[dict[str, float]]:
+    """Deserialize the binary format back into vectors keyed by token string."""
+    n = int(np.frombuffer(data, dtype="<u4", count=1)[0])
+    lengths = np.frombuffer(data, dtype="<u4", count=n, offset=4)
+    total = int(lengths.sum())
+    offset = 4 * (1 + n)
+    ids = np.frombuffer(data, dtype="<u4", count=total, offset=offset).tolist()
+    weights = (
+        np.frombuffer(data, dtype="<f2", count=total, offset=offset + 4 * total)
+        .astype(np.float32)
+        .tolist()
+    )
+
+    vectors: list[dict[str, float]] = []
+    start = 0
+    for length in lengths.tolist():
+        end = start + length
+        vectors.append(dict(zip([tokens[i] for i in ids[start:end]], weights[start:end])))
+        start = end
+    return vectors
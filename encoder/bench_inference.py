@@ -0,0 +1,116 @@
+"""Benchmark SPLADE inference backends against the fp32 PyTorch model.
+
+Every backend encodes the same texts. The script reports single-text
+latency (mean and p95), batch throughput, and how closely each backend's
+vectors match the fp32 reference: the overlap of their top-k terms and the
+cosine similarity of the full vectors.
+
+Texts are read one per line from a file. Without one, a small built-in
+sample is used.
+
+Usage:
+    pip install ".[onnx]"
+    python bench_inference.py --texts pages.txt --threads 4
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+# Add the project root to sys.path to allow importing from 'app'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.sparse_encoder import INFERENCE_BACKENDS, encode_texts, load_encoder
+
+SAMPLE_TEXTS = [
+    "Cosense は共同編集できるナレッジベースです",
+    "スパースベクトル検索と BM25 の違い",
+    "Elasticsearch の sparse_vector フィールドに SPLADE の出力を格納する",
+    "ページ同士はリンクでつながり、関連ページが自動的に表示される",
+    "日本語の形態素解析には fugashi と unidic-lite を使う",
+    "RAG では検索したページを文脈として LLM に渡して回答を生成する",
+    "CPU だけのノードでは推論コストがエンコーダのボトルネックになる",
+    "int8 量子化でモデルサイズと推論時間を削減する",
+] * 8
+
+
+def top_terms(vector: dict[str, float], k: int) -> set[str]:
+    return set(sorted(vector, key=vector.__getitem__, reverse=True)[:k])
+
+
+def cosine(a: dict[str, float], b: dict[str, float]) -> float:
+    dot = sum(w * b[t] for t, w in a.items() if t in b)
+    norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", help="file with one text per line")
+    parser.add_argument("--limit", type=int, default=256, help="maximum number of texts")
+    parser.add_argument(
+        "--backends",
+        default=",".join(INFERENCE_BACKENDS),
+        help="comma-separated backends; the first one is the reference",
+    )
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = default)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--latency-runs", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=32, help="terms compared for agreement")
+    args = parser.parse_args()
+
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = SAMPLE_TEXTS
+    texts = texts[: args.limit]
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    print(f"{len(texts)} texts, backends: {', '.join(backends)}, threads: {args.threads or 'default'}")
+
+    reference: list[dict[str, float]] | None = None
+    print(
+        f"{'backend':<10} {'load_s':>7} {'mean_ms':>8} {'p95_ms':>8} "
+        f"{'texts/s':>8} {'terms':>6} {f'top{args.top_k}':>7} {'cosine':>7}"
+    )
+    for backend in backends:
+        start = time.perf_counter()
+        encoder = load_encoder(backend, args.threads)
+        load_seconds = time.perf_counter() - start
+
+        # Warm up, then time single-text (query-time) requests
+        encode_texts(texts[:4], encoder=encoder)
+        latencies = []
+        for i in range(args.latency_runs):
+            start = time.perf_counter()
+            encode_texts([texts[i % len(texts)]], encoder=encoder)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        # Batch (ingestion-time) throughput
+        start = time.perf_counter()
+        vectors = encode_texts(texts, batch_size=args.batch_size, encoder=encoder)
+        throughput = len(texts) / (time.perf_counter() - start)
+
+        if reference is None:
+            reference = vectors
+        overlap = statistics.mean(
+            len(top_terms(v, args.top_k) & top_terms(r, args.top_k))
+            / max(1, min(args.top_k, len(r)))
+            for v, r in zip(vectors, reference)
+        )
+        similarity = statistics.mean(cosine(v, r) for v, r in zip(vectors, reference))
+        terms = statistics.mean(len(v) for v in vectors)
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+
+        print(
+            f"{backend:<10} {load_seconds:>7.1f} {statistics.mean(latencies):>8.1f} {p95:>8.1f} "
+            f"{throughput:>8.1f} {terms:>6.0f} {overlap:>7.3f} {similarity:>7.3f}"
+        )
+        del encoder
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Benchmark sparse-vector pruning settings against an unpruned baseline.
+
+Documents are read from an existing Elasticsearch index (``content`` field),
+encoded once in-process without pruning, then re-indexed into one scratch
+index per setting. Page titles are used as queries unless a query file is
+given. For each setting the script reports the index store size, the mean
+and p95 query latency, and the overlap of the top-k results with the
+unpruned baseline.
+
+Usage:
+    pip install ".[bench]"
+    python bench_pruning.py --source-index cosense_pages --limit 1000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any
+
+# Add the project root to sys.path to allow importing from 'app'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk, scan
+
+from app.pruning import PruningConfig, prune_vector
+from app.sparse_encoder import encode_texts
+
+SCRATCH_PREFIX = "bench_pruning"
+
+MAPPING = {"properties": {"content_vector": {"type": "sparse_vector"}}}
+
+
+@dataclass(frozen=True)
+class Setting:
+    name: str
+    document: PruningConfig
+    query: PruningConfig
+    es_pruning: bool = False
+
+
+SETTINGS = [
+    Setting("baseline", PruningConfig(), PruningConfig()),
+    Setting("doc_top256", PruningConfig(top_n=256), PruningConfig()),
+    Setting("doc_top128", PruningConfig(top_n=128), PruningConfig()),
+    Setting("doc_top64", PruningConfig(top_n=64), PruningConfig()),
+    Setting("doc_min0.1", PruningConfig(min_weight=0.1), PruningConfig()),
+    Setting("doc_mass0.9", PruningConfig(mass=0.9), PruningConfig()),
+    Setting("doc_mass0.8", PruningConfig(mass=0.8), PruningConfig()),
+    Setting("doc_top128_q_top32", PruningConfig(top_n=128), PruningConfig(top_n=32)),
+    Setting("doc_mass0.9_q_mass0.9", PruningConfig(mass=0.9), PruningConfig(mass=0.9)),
+    Setting("es_pruning", PruningConfig(), PruningConfig(), es_pruning=True),
+]
+
+
+def load_documents(es: Elasticsearch, index: str, limit: int) -> list[dict[str, str]]:
+    docs: list[dict[str, str]] = []
+    for hit in scan(es, index=index, _source=["title", "content"]):
+        source = hit["_source"]
+        if source.get("content", "").strip():
+            docs.append({"title": source.get("title", ""), "content": source["content"]})
+        if len(docs) >= limit:
+            break
+    return docs
+
+
+def build_index(
+    es: Elasticsearch, name: str, vectors: list[dict[str, float]], config: PruningConfig
+) -> int:
+    """Index pruned vectors into a scratch index and return its store size in bytes."""
+    index = f"{SCRATCH_PREFIX}_{name}".lower()
+    if es.indices.exists(index=index):
+        es.indices.delete(index=index)
+    es.indices.create(index=index, mappings=MAPPING)
+    bulk(
+        es,
+        (
+            {"_index": index, "_id": str(i), "content_vector": prune_vector(v, config)}
+            for i, v in enumerate(vectors)
+        ),
+    )
+    es.indices.refresh(index=index)
+    es.indices.forcemerge(index=index, max_num_segments=1)
+    stats = es.indices.stats(index=index, metric="store")
+    return stats["indices"][index]["primaries"]["store"]["size_in_bytes"]
+
+
+def run_queries(
+    es: Elasticsearch,
+    name: str,
+    queries: list[dict[str, float]],
+    config: PruningConfig,
+    es_pruning: bool,
+    top_k: int,
+) -> tuple[list[float], list[list[str]]]:
+    index = f"{SCRATCH_PREFIX}_{name}".lower()
+    latencies: list[float] = []
+    rankings: list[list[str]] = []
+    for vector in queries:
+        sparse_query: dict[str, Any] = {
+            "field": "content_vector",
+            "query_vector": prune_vector(vector, config),
+        }
+        if es_pruning:
+            sparse_query["prune"] = True
+        start = time.perf_counter()
+        response = es.search(
+            index=index, query={"sparse_vector": sparse_query}, size=top_k, _source=False
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        rankings.append([hit["_id"] for hit in response["hits"]["hits"]])
+    return latencies, rankings
+
+
+def overlap(results: list[list[str]], baseline: list[list[str]], top_k: int) -> float:
+    scores = [
+        len(set(r) & set(b)) / min(top_k, len(b)) for r, b in zip(results, baseline) if b
+    ]
+    return statistics.mean(scores) if scores else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--es-url", default="http://localhost:9200")
+    parser.add_argument("--source-index", default="cosense_pages")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--queries", help="File with one query per line (default: page titles)")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--keep", action="store_true", help="Keep scratch indices")
+    args = parser.parse_args()
+
+    es = Elasticsearch(args.es_url)
+    docs = load_documents(es, args.source_index, args.limit)
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            query_texts = [line.strip() for line in f if line.strip()]
+    else:
+        query_texts = [doc["title"] for doc in docs if doc["title"]][:200]
+    if not docs or not query_texts:
+        es.close()
+        if not docs:
+            sys.exit(f"No documents found in '{args.source_index}'")
+        sys.exit(f"No queries found in '{args.queries or args.source_index}'")
+    print(f"Encoding {len(docs)} documents and {len(query_texts)} queries...")
+
+    doc_vectors = encode_texts([doc["content"] for doc in docs])
+    query_vectors = encode_texts(query_texts)
+
+    baseline_rankings: list[list[str]] = []
+    print(
+        f"{'setting':<24} {'terms/doc':>9} {'size MB':>8} {'mean ms':>8} "
+        f"{'p95 ms':>7} {'overlap@' + str(args.top_k):>10}"
+    )
+    try:
+        for setting in SETTINGS:
+            size = build_index(es, setting.name, doc_vectors, setting.document)
+            terms = statistics.mean(
+                len(prune_vector(v, setting.document)) for v in doc_vectors
+            )
+            latencies, rankings = run_queries(
+                es, setting.name, query_vectors, setting.query, setting.es_pruning, args.top_k
+            )
+            if setting.name == "baseline":
+                baseline_rankings = rankings
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+            print(
+                f"{setting.name:<24} {terms:>9.1f} {size / 1e6:>8.2f} "
+                f"{statistics.mean(latencies):>8.2f} {p95:>7.2f} "
+                f"{overlap(rankings, baseline_rankings, args.top_k):>10.3f}"
+            )
+    finally:
+        if not args.keep:
+            for setting in SETTINGS:
+                es.indices.delete(
+                    index=f"{SCRATCH_PREFIX}_{setting.name}".lower(), ignore_unavailable=True
+                )
+        es.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Measure encoder import time, startup time and memory per worker count.
+
+For the API module and for the model libraries, the script reports the
+import time from ``python -X importtime`` and the slowest modules. Then,
+for each worker count, it starts ``python -m app.serve`` and reports:
+    live:   seconds until /api/health answers
+    ready:  seconds until /api/ready answers
+    rss:    summed resident memory of all processes (counts shared pages
+            once per process)
+    pss:    summed proportional memory (shared pages split between the
+            processes sharing them), i.e. what the workers really cost
+
+Memory is read from /proc, so it is only reported on Linux.
+
+Usage:
+    python bench_startup.py --workers 1 2 4
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_time(statement: str, top: int) -> tuple[float, list[tuple[float, str]]]:
+    """Return the total import time in ms of ``statement`` and its ``top`` slowest modules."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    total = 0.0
+    for line in result.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line.removeprefix("import time:").split("|")
+        cumulative = int(cumulative_us) / 1000
+        if not name.startswith("  "):  # imported by the statement itself
+            total += cumulative
+        modules.append((cumulative, name.strip()))
+    return total, sorted(modules, reverse=True)[:top]
+
+
+def _get(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def _memory_kb(pid: int) -> tuple[int, int]:
+    """RSS and PSS of a process in kB."""
+    values = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":", 1)
+        values[key] = int(value.split()[0])
+    return values.get("Rss", 0), values.get("Pss", 0)
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        children.extend(int(child) for child in (task / "children").read_text().split())
+    return children
+
+
+def measure_startup(workers: int, port: int, timeout: float) -> dict[str, float]:
+    env = {**os.environ, "WORKERS": str(workers), "PORT": str(port), "HOST": "127.0.0.1"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.serve"],
+        cwd=PROJECT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    result: dict[str, float] = {}
+    base = f"http://127.0.0.1:{port}"
+    try:
+        while "ready" not in result:
+            if time.perf_counter() - start > timeout or process.poll() is not None:
+                raise RuntimeError(f"Encoder with {workers} workers did not become ready")
+            if "live" not in result and _get(f"{base}/api/health") == 200:
+                result["live"] = time.perf_counter() - start
+            if _get(f"{base}/api/ready") == 200:
+                result["ready"] = time.perf_counter() - start
+            time.sleep(0.05)
+        result.setdefault("live", result["ready"])
+
+        # Let every worker finish its own warm-up before reading memory
+        time.sleep(2.0)
+        if sys.platform.startswith("linux"):
+            pids = [process.pid, *_children(process.pid)]
+            usage = [_memory_kb(pid) for pid in pids]
+            result["rss_mb"] = sum(rss for rss, _ in usage) / 1024
+            result["pss_mb"] = sum(pss for _, pss in usage) / 1024
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark encoder startup")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=18001)
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to show")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    for statement in ("import app.main", "import torch, yasem"):
+        total, slowest = import_time(statement, args.top)
+        print(f"{statement}: {total:.0f} ms")
+        for ms, name in slowest:
+            print(f"  {ms:8.1f} ms  {name}")
+    print()
+
+    print(f"{'workers':>8} {'live s':>8} {'ready s':>8} {'rss MB':>9} {'pss MB':>9}")
+    for workers in args.workers:
+        result = measure_startup(workers, args.port, args.timeout)
+        print(
+            f"{workers:>8} {result['live']:>8.2f} {result['ready']:>8.2f} "
+            f"{result.get('rss_mb', 0):>9.0f} {result.get('pss_mb', 0):>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
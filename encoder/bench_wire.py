@@ -0,0 +1,78 @@
+"""Compare the binary sparse-vector wire format with JSON.
+
+Synthetic SPLADE-like vectors are serialized and parsed both ways. The
+script reports payload size, serialization and parsing time per vector, and
+the largest weight error introduced by float16. No model or running
+service is needed.
+
+Usage:
+    python bench_wire.py --vectors 500 --terms 300
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Add the project root to sys.path to allow importing from 'app'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.wire import pack_vectors, unpack_vectors
+
+VOCAB_SIZE = 32768
+
+
+def make_vectors(count: int, terms: int, seed: int) -> tuple[list[str], list[dict[str, float]]]:
+    rng = random.Random(seed)
+    vocab = [f"▁token{i}" if i % 3 else f"語彙{i}" for i in range(VOCAB_SIZE)]
+    vectors = [
+        {vocab[i]: rng.uniform(0.01, 3.0) for i in rng.sample(range(VOCAB_SIZE), terms)}
+        for _ in range(count)
+    ]
+    return vocab, vectors
+
+
+def timed(fn, repeat: int) -> tuple[float, object]:
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=500, help="vectors per response")
+    parser.add_argument("--terms", type=int, default=300, help="terms per vector")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vocab, vectors = make_vectors(args.vectors, args.terms, args.seed)
+    token_ids = {token: i for i, token in enumerate(vocab)}
+
+    json_dump, json_body = timed(
+        lambda: json.dumps({"vectors": vectors}, ensure_ascii=False).encode("utf-8"), args.repeat
+    )
+    json_load, _ = timed(lambda: json.loads(json_body)["vectors"], args.repeat)
+    bin_dump, bin_body = timed(lambda: pack_vectors(vectors, token_ids), args.repeat)
+    bin_load, decoded = timed(lambda: unpack_vectors(bin_body, vocab), args.repeat)
+
+    error = max(
+        abs(weight - d[token]) for v, d in zip(vectors, decoded) for token, weight in v.items()
+    )
+    per_vector = 1e6 / args.vectors
+    print(f"{args.vectors} vectors x {args.terms} terms")
+    print(f"{'format':<8} {'bytes':>10} {'dump_us/vec':>12} {'load_us/vec':>12}")
+    for name, body, dump, load in [
+        ("json", json_body, json_dump, json_load),
+        ("binary", bin_body, bin_dump, bin_load),
+    ]:
+        print(f"{name:<8} {len(body):>10} {dump * per_vector:>12.1f} {load * per_vector:>12.1f}")
+    print(f"size ratio: {len(bin_body) / len(json_body):.2f}, max float16 weight error: {error:.4f}")
+
+
+if __name__ == "__main__":
+    main()